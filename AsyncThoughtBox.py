@@ -0,0 +1,206 @@
+import asyncio
+import functools
+import sqlite3
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
+
+from .Name import Name
+from .Tag import Tag
+from .Thought import Thought
+from .ThoughtBox import ThoughtBox
+
+
+class AsyncThoughtBox:
+    """An asyncio version of ThoughtBox, which does the sqlite work on threads so that it does not
+    block the event loop.
+
+    A sqlite connection can only be used by the thread which opened it, so each thread has its own
+    ThoughtBox:
+    - writes run one at a time, in the order they were made, on a single writer thread.
+    - reads run on a pool of reader threads, each given to the one with the fewest reads waiting.
+      The readers open the database read only.
+    A read sees the writes committed before it started: await a write to be sure later reads see it.
+    """
+
+    def __init__(
+        self,
+        database_path: str,
+        explicitly_create_tables: bool = False,
+        readers: int = 4,
+        cache_size: int = 0,
+        wal: bool = False,
+    ):
+        """Starts opening the database, see ThoughtBox. cache_size is the size of each reader's
+        cache.
+
+        If wal is true the database is put in WAL journal mode while it is open, so that reads do
+        not wait for a write to be committed. The journal mode is stored in the database file: close
+        puts it back as it was, if no other connection is using the database then.
+        """
+        self.database_path = database_path
+        self._cache_size = cache_size
+        self._wal = wal
+        self._journal_mode = None
+        self._local = threading.local()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thoughtbox-writer")
+        self._readers = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="thoughtbox-reader")
+            for _ in range(max(1, readers))
+        ]
+        self._waiting = [0] * len(self._readers)
+        # The writer's box creates or upgrades the tables, so the readers open theirs after it.
+        self._opened = self._writer.submit(self._open, explicitly_create_tables)
+
+    def _open(self, explicitly_create_tables: bool) -> ThoughtBox:
+        tb = ThoughtBox(self.database_path, explicitly_create_tables)
+        if self._wal:
+            self._journal_mode = tb.conn.execute("PRAGMA journal_mode").fetchone()[0]
+            tb.conn.execute("PRAGMA journal_mode=WAL")
+        self._local.tb = tb
+        return tb
+
+    def _box(self) -> ThoughtBox:
+        """Returns the ThoughtBox of the current thread, opening it if needed."""
+        tb = getattr(self._local, "tb", None)
+        if tb is None:
+            self._opened.result()
+            tb = ThoughtBox(self.database_path, cache_size=self._cache_size, read_only=True)
+            self._local.tb = tb
+        return tb
+
+    def _closeBox(self):
+        tb = getattr(self._local, "tb", None)
+        if tb is not None:
+            if tb is self._opened.result() and self._journal_mode not in (None, "wal"):
+                # This fails, leaving WAL mode, if another connection has the database open.
+                try:
+                    tb.conn.execute(f"PRAGMA journal_mode={self._journal_mode}")
+                except sqlite3.OperationalError:
+                    pass
+            tb.conn.close()
+            self._local.tb = None
+
+    def _readOn(self, call: Callable, args, kwargs):
+        tb = self._box()
+        try:
+            return call(tb, *args, **kwargs)
+        finally:
+            # A failed write leaves a transaction open, whose read lock would keep the writer from
+            # committing.
+            if tb.conn.in_transaction:
+                tb.conn.rollback()
+
+    def _writeOn(self, call: Callable, args, kwargs):
+        tb = self._box()
+        with tb.transaction():
+            return call(tb, *args, **kwargs)
+
+    async def read(self, call: Callable[..., Any], *args, **kwargs) -> Any:
+        """Returns call(thought_box, *args, **kwargs), run on a reader thread.
+        The readers' boxes are read only: use write for anything which writes, such as
+        computeComponents, rank(cached=True), or tagPairs and relatedTags (which fill the tag_pairs
+        table when first used).
+        """
+        i = self._waiting.index(min(self._waiting))
+        self._waiting[i] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._readers[i], functools.partial(self._readOn, call, args, kwargs)
+            )
+        finally:
+            self._waiting[i] -= 1
+
+    async def write(self, call: Callable[..., Any], *args, **kwargs) -> Any:
+        """Returns call(thought_box, *args, **kwargs), run in a transaction on the writer thread
+        after the writes made before it.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._writer, functools.partial(self._writeOn, call, args, kwargs)
+        )
+
+    async def listTags(self) -> List[Tag]:
+        return await self.read(ThoughtBox.listTags)
+
+    async def listThoughts(self, **selection) -> List[Thought]:
+        """Lists the selected thoughts, see ThoughtBox.listThoughts for the selection arguments."""
+        # Selecting a component may first recompute the components, which is a write.
+        run = self.write if selection.get("component") is not None else self.read
+        return await run(ThoughtBox.listThoughts, **selection)
+
+    async def iterThoughts(
+        self, page_size: int = 100, after: Name = None, limit: int = None, **selection
+    ) -> AsyncIterator[Thought]:
+        """Yields the selected thoughts (see ThoughtBox.listThoughts), reading a page of them at a
+        time. Each page is a separate read, so writes made while iterating can show up in the later
+        pages.
+        """
+        while limit is None or limit > 0:
+            count = page_size if limit is None else min(page_size, limit)
+            page = await self.listThoughts(after=after, limit=count, **selection)
+            for thought in page:
+                yield thought
+            if len(page) < count:
+                return
+            after = Name.fromStr(str(page[-1].name))
+            if limit is not None:
+                limit -= len(page)
+
+    async def search(self, query: str, **selection) -> List[Thought]:
+        """Lists the thoughts matching a query, such as "#a & !#b & ->4" (see the query module).
+        A ValueError is raised if it is not a valid query.
+        """
+        return await self.listThoughts(where=query, **selection)
+
+    async def listThoughtsByTag(self, **selection) -> Dict[Tag, List[Thought]]:
+        run = self.write if selection.get("component") is not None else self.read
+        return await run(ThoughtBox.listThoughtsByTag, **selection)
+
+    async def listNamesByTag(self, **selection) -> Dict[str, Tuple[int, List[str]]]:
+        run = self.write if selection.get("component") is not None else self.read
+        return await run(ThoughtBox.listNamesByTag, **selection)
+
+    async def subtree(self, name: Name) -> List[Thought]:
+        return await self.read(ThoughtBox.subtree, name)
+
+    async def similar(self, name: Name, k: int = 10) -> List[Tuple[str, float]]:
+        return await self.read(ThoughtBox.similar, name, k)
+
+    async def addOrUpdate(self, thought: Thought):
+        await self.write(ThoughtBox.addOrUpdate, thought)
+
+    async def addOrUpdateMany(self, thoughts: List[Thought]):
+        """Adds or updates the thoughts in a single transaction."""
+
+        def add_all(tb: ThoughtBox):
+            for thought in thoughts:
+                tb.addOrUpdate(thought)
+
+        await self.write(add_all)
+
+    async def delete(self, name: Name):
+        await self.write(ThoughtBox.delete, name)
+
+    async def rename(self, name: Name, new_name: Name) -> List[Name]:
+        return await self.write(ThoughtBox.rename, name, new_name)
+
+    async def moveSubtree(
+        self, src: Name, dst: Name, update_links: bool = False
+    ) -> Tuple[Dict[str, str], List[str]]:
+        return await self.write(ThoughtBox.moveSubtree, src, dst, update_links)
+
+    async def close(self):
+        """Waits for the reads and writes already made, then closes the connections and stops the
+        threads. The writer is closed last, so that it can put the journal mode back.
+        """
+        loop = asyncio.get_running_loop()
+        for executor in self._readers + [self._writer]:
+            await loop.run_in_executor(executor, self._closeBox)
+            executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> "AsyncThoughtBox":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,83 @@
+import asyncio
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+from os import PathLike
+from typing import Dict, List, Tuple, Union
+
+from .Name import Name
+from .Thought import Thought
+from .ThoughtBoxDir import ThoughtBoxDir
+
+
+class AsyncThoughtBoxDir:
+    """An asyncio version of ThoughtBoxDir, which does the file io on threads so that it does not
+    block the event loop.
+
+    Reads run concurrently on a pool of threads. Changes run one at a time, in the order they were
+    made, on another thread, so that for example two createNew calls do not pick the same name.
+    """
+
+    def __init__(self, thought_dir: PathLike, workers: int = 8):
+        self.tbd = ThoughtBoxDir(thought_dir)
+        self.dir = thought_dir
+        self._readers = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="thoughtboxdir-reader"
+        )
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thoughtboxdir-writer")
+
+    async def _run(self, executor: ThreadPoolExecutor, call, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(call, *args)
+        )
+
+    def getName(self, path: PathLike) -> Name:
+        return self.tbd.getName(path)
+
+    def getPath(self, name: Name) -> PathLike:
+        return self.tbd.getPath(name)
+
+    async def listNames(self) -> List[Name]:
+        return await self._run(self._readers, self.tbd.listNames)
+
+    async def findNames(self, patterns: List[str]) -> List[Name]:
+        return await self._run(self._readers, self.tbd.findNames, patterns)
+
+    async def read(self, name: Name) -> Thought:
+        return await self._run(self._readers, self.tbd.read, name)
+
+    async def readMany(self, names: List[Name]) -> List[Tuple[Name, Union[Thought, Exception]]]:
+        """Reads and parses many thought files concurrently.
+
+        Returns the name and either the thought, or the exception raised reading it, for each name
+        in order.
+        """
+        results = await asyncio.gather(*[self.read(name) for name in names], return_exceptions=True)
+        return list(zip(names, results))
+
+    async def createNew(self, name: Name, force_override=False) -> Name:
+        return await self._run(self._writer, self.tbd.createNew, name, force_override)
+
+    async def rename(self, src: Name, to: Name) -> None:
+        await self._run(self._writer, self.tbd.rename, src, to)
+
+    async def delete(self, name: Name) -> None:
+        await self._run(self._writer, self.tbd.delete, name)
+
+    async def moveSubtree(self, src: Name, to: Name) -> Dict[str, str]:
+        return await self._run(self._writer, self.tbd.moveSubtree, src, to)
+
+    async def rewriteLinks(self, names: List[str], mapping: Dict[str, str]) -> List[str]:
+        return await self._run(self._writer, self.tbd.rewriteLinks, names, mapping)
+
+    async def close(self):
+        """Waits for the reads and changes already made, then stops the threads."""
+        loop = asyncio.get_running_loop()
+        for executor in (self._readers, self._writer):
+            await loop.run_in_executor(None, executor.shutdown)
+
+    async def __aenter__(self) -> "AsyncThoughtBoxDir":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
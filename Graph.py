@@ -0,0 +1,244 @@
+from array import array
+
+from typing import Callable, Dict, Hashable, Iterable, List, Set, Tuple
+
+
+class Graph:
+    """A snapshot of the links between thoughts, held in compact integer arrays.
+
+    Each thought is given an id, 0..len(names)-1, in name order. Link targets which are not
+    thoughts (broken links) are given the ids after the thoughts, so that ids < thought_count are
+    thoughts.
+
+    The links are stored in compressed sparse row form, in both directions:
+    the targets of the links out of id i are out_targets[out_offsets[i]:out_offsets[i + 1]], and
+    the sources of the links into id i are in_sources[in_offsets[i]:in_offsets[i + 1]].
+    """
+
+    def __init__(self, names: List[str], links: Iterable[Tuple[str, str]]):
+        """Builds the graph of the named thoughts and the (source, target) links between them."""
+        self.names = list(names)
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.thought_count = len(self.names)
+
+        sources = array("i")
+        targets = array("i")
+        for source, target in links:
+            sources.append(self._id(source))
+            targets.append(self._id(target))
+
+        self.out_offsets, self.out_targets = Graph._compress(len(self.names), sources, targets)
+        self.in_offsets, self.in_sources = Graph._compress(len(self.names), targets, sources)
+
+    def _id(self, name: str) -> int:
+        i = self.index.get(name)
+        if i is None:
+            i = len(self.names)
+            self.names.append(name)
+            self.index[name] = i
+        return i
+
+    @staticmethod
+    def _compress(count: int, rows: array, columns: array) -> Tuple[array, array]:
+        """Sorts the (row, column) pairs by row (a counting sort) and returns the row offsets and
+        columns."""
+        offsets = array("i", [0]) * (count + 1)
+        for row in rows:
+            offsets[row + 1] += 1
+        for i in range(count):
+            offsets[i + 1] += offsets[i]
+
+        next_slot = array("i", offsets[:-1])
+        sorted_columns = array("i", [0]) * len(columns)
+        for row, column in zip(rows, columns):
+            sorted_columns[next_slot[row]] = column
+            next_slot[row] += 1
+        return offsets, sorted_columns
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def link_count(self) -> int:
+        return len(self.out_targets)
+
+    def id(self, name: str) -> int:
+        """Returns the id of the named thought. Raises a KeyError if it is not in the graph."""
+        return self.index[str(name)]
+
+    def name(self, i: int) -> str:
+        return self.names[i]
+
+    def exists(self, i: int) -> bool:
+        """Returns true if id i is a thought, rather than the target of a broken link."""
+        return i < self.thought_count
+
+    def successors(self, i: int) -> array:
+        """Returns the ids that id i links to."""
+        return self.out_targets[self.out_offsets[i] : self.out_offsets[i + 1]]
+
+    def predecessors(self, i: int) -> array:
+        """Returns the ids that link to id i."""
+        return self.in_sources[self.in_offsets[i] : self.in_offsets[i + 1]]
+
+    def outDegree(self, i: int) -> int:
+        return self.out_offsets[i + 1] - self.out_offsets[i]
+
+    def inDegree(self, i: int) -> int:
+        return self.in_offsets[i + 1] - self.in_offsets[i]
+
+    def reachable(self, name: str, reverse: bool = False) -> Set[str]:
+        """Returns the names reachable by following links from the named thought (including itself).
+        If reverse is true links are followed backwards, giving the thoughts that lead to it.
+        """
+        if reverse:
+            offsets, columns = self.in_offsets, self.in_sources
+        else:
+            offsets, columns = self.out_offsets, self.out_targets
+
+        start = self.id(name)
+        seen = bytearray(len(self.names))
+        seen[start] = 1
+        frontier = [start]
+        found = [start]
+        while frontier:
+            next_frontier = []
+            for i in frontier:
+                for j in columns[offsets[i] : offsets[i + 1]]:
+                    if not seen[j]:
+                        seen[j] = 1
+                        next_frontier.append(j)
+            found.extend(next_frontier)
+            frontier = next_frontier
+        return {self.names[i] for i in found}
+
+    def _neighbours(self, i: int, forward: bool, directed: bool):
+        if not directed:
+            return self.successors(i) + self.predecessors(i)
+        if forward:
+            return self.successors(i)
+        return self.predecessors(i)
+
+    def shortestPaths(
+        self,
+        source: str,
+        target: str,
+        max_depth: int = None,
+        directed: bool = True,
+        all_paths: bool = False,
+    ) -> List[List[str]]:
+        """Finds the shortest chains of links from source to target, as lists of names.
+
+        This searches breadth first from both ends at once, expanding the smaller frontier each
+        step. If directed is false links are followed in either direction.
+        Only paths of at most max_depth links are found, if it is given.
+        Returns one shortest path, or all of them if all_paths is true (there can be very many),
+        or an empty list if there is no path (or either name is not in the graph).
+        """
+        if source not in self.index or target not in self.index:
+            return []
+
+        def expand(frontier: List[int], forward: bool) -> Iterable[Tuple[int, int]]:
+            for i in frontier:
+                for j in self._neighbours(i, forward, directed):
+                    yield i, j
+
+        paths = shortest_paths(
+            self.index[source],
+            self.index[target],
+            expand,
+            max_depth=max_depth,
+            all_paths=all_paths,
+        )
+        return [[self.names[i] for i in path] for path in paths]
+
+    def numpy(self) -> Dict[str, "numpy.ndarray"]:
+        """Returns the arrays as numpy arrays (without copying). This requires numpy."""
+        import numpy
+
+        return {
+            "out_offsets": numpy.frombuffer(self.out_offsets, dtype=numpy.intc),
+            "out_targets": numpy.frombuffer(self.out_targets, dtype=numpy.intc),
+            "in_offsets": numpy.frombuffer(self.in_offsets, dtype=numpy.intc),
+            "in_sources": numpy.frombuffer(self.in_sources, dtype=numpy.intc),
+        }
+
+
+def shortest_paths(
+    source: Hashable,
+    target: Hashable,
+    expand: Callable[[List[Hashable], bool], Iterable[Tuple[Hashable, Hashable]]],
+    max_depth: int = None,
+    all_paths: bool = False,
+) -> List[List[Hashable]]:
+    """Finds the shortest chains from source to target, searching breadth first from both ends.
+
+    expand(frontier, forward) returns the (node, neighbour) pairs of the nodes in frontier, in
+    frontier order: their successors if forward is true, otherwise their predecessors.
+    See Graph.shortestPaths for the other arguments and the result.
+    """
+    if source == target:
+        return [[source]]
+
+    # For each side: the distance to each reached node, and the nodes it was reached from.
+    distances = [{source: 0}, {target: 0}]
+    parents = [{source: []}, {target: []}]
+    frontiers = [[source], [target]]
+    depths = [0, 0]
+    meeting: List[Hashable] = []
+    length = None
+
+    while frontiers[0] and frontiers[1]:
+        if max_depth is not None and depths[0] + depths[1] >= max_depth:
+            break
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        other = 1 - side
+        distance = distances[side]
+        parent = parents[side]
+        depth = depths[side] + 1
+
+        next_frontier = []
+        for i, j in expand(frontiers[side], side == 0):
+            if j not in distance:
+                distance[j] = depth
+                parent[j] = [i]
+                next_frontier.append(j)
+            elif distance[j] == depth:
+                if all_paths and i not in parent[j]:
+                    parent[j].append(i)
+        frontiers[side] = next_frontier
+        depths[side] = depth
+
+        for j in next_frontier:
+            if j in distances[other]:
+                total = depth + distances[other][j]
+                if length is None or total < length:
+                    length = total
+                    meeting = [j]
+                elif total == length:
+                    meeting.append(j)
+        if length is not None:
+            break
+
+    if length is None or (max_depth is not None and length > max_depth):
+        return []
+    if not all_paths:
+        meeting = meeting[:1]
+
+    paths = []
+    for m in meeting:
+        for head in _walk(parents[0], m, all_paths):
+            for tail in _walk(parents[1], m, all_paths):
+                paths.append(list(reversed(head)) + tail[1:])
+    return paths
+
+
+def _walk(parents: Dict[Hashable, List[Hashable]], i: Hashable, all_paths: bool) -> List[List]:
+    """Returns the chains of nodes from i back to the start of a search."""
+    if len(parents[i]) == 0:
+        return [[i]]
+    walks = []
+    for p in parents[i] if all_paths else parents[i][:1]:
+        for walk in _walk(parents, p, all_paths):
+            walks.append([i] + walk)
+    return walks
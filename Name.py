@@ -1,6 +1,6 @@
 import string
 
-from typing import List
+from typing import List, Tuple
 
 
 class Name:
@@ -74,6 +74,60 @@ class Name:
             new_parts[-1] = Name._incPart(new_parts[-1])
         return Name(new_parts)
 
+    def key(self) -> str:
+        """Returns an order preserving string encoding of this name.
+
+        Comparing two keys as plain strings gives the same result as comparing the names.
+        Each part is prefixed by its length, so the key of a name is a prefix of the keys
+        of all of its sub-names. Parts are limited to 999 characters.
+        """
+        return "".join(["%03d%s" % (len(p), p) for p in self.parts])
+
+    def keyRange(self) -> Tuple[str, str]:
+        """Returns the half open range of keys, [low, high), covering this name and all its
+        sub-names."""
+        key = self.key()
+        return (key, key + "~")
+
+    @staticmethod
+    def fromKey(key: str) -> "Name":
+        """Returns the name whose key (see key) is key."""
+        parts = []
+        i = 0
+        while i < len(key):
+            length = int(key[i : i + 3])
+            parts.append(key[i + 3 : i + 3 + length])
+            i += 3 + length
+        return Name(parts)
+
+    def isUnder(self, other: "Name") -> bool:
+        """Returns true if this name is other, or a sub-name of other."""
+        return self.parts[0 : len(other.parts)] == other.parts
+
+    def moved(self, src: "Name", dst: "Name") -> "Name":
+        """Returns the name this would have if the subtree at src were moved to dst.
+
+        This name must be under src.
+        """
+        return Name(dst.parts + self.parts[len(src.parts) :])
+
+    @staticmethod
+    def checkMove(src: "Name", dst: "Name") -> None:
+        """Raises a ValueError if the subtree at src can not be moved to dst.
+
+        Both names must be non-empty and end in the same kind of part (letters or digits),
+        so that the sub-names keep alternating between letters and digits.
+        dst may not be under src.
+        """
+        if len(src.parts) == 0 or len(dst.parts) == 0:
+            raise ValueError("Can not move the root of the box.")
+        if src.parts[-1].isalpha() != dst.parts[-1].isalpha():
+            raise ValueError(
+                f"Can not move {src} to {dst}, the names must end in the same kind of part."
+            )
+        if dst.isUnder(src):
+            raise ValueError(f"Can not move {src} into its own subtree.")
+
     def __repr__(self) -> str:
         return "".join(self.parts)
 
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+
+from typing import Any, Dict, Hashable, Tuple
+
+
+class QueryCache:
+    """A bounded cache of query results, evicting the least recently used.
+
+    Every result is stored with the version of the data it was read from.
+    When a different version is looked up all the results are dropped, as the data has changed.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.version = None
+        self.results: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, version: Hashable) -> Tuple[bool, Any]:
+        """Returns whether the result for key is cached at version, and the result if it is."""
+        if version != self.version:
+            if len(self.results) > 0:
+                self.invalidations += 1
+            self.results.clear()
+            self.version = version
+        if key in self.results:
+            self.results.move_to_end(key)
+            self.hits += 1
+            return True, self.results[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key: Hashable, version: Hashable, result: Any):
+        """Caches the result for key, read at version."""
+        if version != self.version or self.max_size <= 0:
+            return
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.results.clear()
+        self.version = None
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the numbers of hits, misses, evictions and invalidations, the size, and the hit
+        rate."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "size": len(self.results),
+            "max_size": self.max_size,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+        }
@@ -0,0 +1,192 @@
+import logging
+import re
+import sqlite3
+import time
+
+from collections import deque
+from dataclasses import dataclass
+
+from typing import Callable, Dict, List
+
+# Literals are replaced, so that statements differing only in their values are counted together.
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalize(sql: str) -> str:
+    """Returns the statement with its string and number literals replaced by ?, and white space
+    collapsed."""
+    return " ".join(_LITERAL_RE.sub("?", sql).split())
+
+
+@dataclass
+class StatementStats:
+    """The totals for one (normalized) SQL statement."""
+
+    calls: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+@dataclass
+class SlowQuery:
+    """A statement which took longer than the slow query threshold, with its query plan."""
+
+    sql: str
+    seconds: float
+    rows: int
+    plan: List[str]
+
+
+class SqlMonitor:
+    """Records the time taken by, and rows returned or changed by, each SQL statement run on a
+    connection.
+
+    Each statement is timed from when it is executed until its last row has been read (or the cursor
+    is reused or closed). Listeners are called with (sql, seconds, rows) after each statement.
+    Statements taking at least slow_seconds are logged as warnings with their EXPLAIN QUERY PLAN,
+    and the most recent are kept in slow_queries.
+    """
+
+    def __init__(self, slow_seconds: float = None, keep_slow: int = 100):
+        self.slow_seconds = slow_seconds
+        self.statements: Dict[str, StatementStats] = {}
+        self.slow_queries: "deque[SlowQuery]" = deque(maxlen=keep_slow)
+        self.listeners: List[Callable[[str, float, int], None]] = []
+
+    def addListener(self, listener: Callable[[str, float, int], None]):
+        self.listeners.append(listener)
+
+    def removeListener(self, listener: Callable[[str, float, int], None]):
+        self.listeners.remove(listener)
+
+    def record(self, conn: sqlite3.Connection, sql: str, parameters, seconds: float, rows: int):
+        """Adds a finished statement to the statistics."""
+        stats = self.statements.setdefault(normalize(sql), StatementStats())
+        stats.calls += 1
+        stats.rows += rows
+        stats.seconds += seconds
+        stats.max_seconds = max(stats.max_seconds, seconds)
+        for listener in self.listeners:
+            listener(sql, seconds, rows)
+        if self.slow_seconds is not None and seconds >= self.slow_seconds:
+            plan = _explain(conn, sql, parameters)
+            self.slow_queries.append(SlowQuery(sql, seconds, rows, plan))
+            logging.warning(
+                f"Slow query ({seconds * 1000:.1f} ms, {rows} rows): {sql}"
+                + "".join(f"\n  {line}" for line in plan)
+            )
+
+    def top(self, count: int = 10) -> List[tuple]:
+        """Returns the statements which took the most time in all, as (sql, StatementStats)
+        pairs."""
+        ordered = sorted(self.statements.items(), key=lambda s: -s[1].seconds)
+        return ordered[:count]
+
+    def summary(self, count: int = 10) -> str:
+        """Returns a table of the statements which took the most time."""
+        lines = [f"{'ms':>9} {'calls':>7} {'rows':>8}  statement"]
+        for sql, stats in self.top(count):
+            lines.append(f"{stats.seconds * 1000:9.1f} {stats.calls:7d} {stats.rows:8d}  {sql}")
+        return "\n".join(lines) + "\n"
+
+
+def _explain(conn: sqlite3.Connection, sql: str, parameters) -> List[str]:
+    """Returns the lines of the query plan of a statement, or none if it can not be explained."""
+    try:
+        cur = sqlite3.Cursor(conn)
+        rows = cur.execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+    except sqlite3.Error:
+        return []
+    depths = {0: 0}
+    lines = []
+    for node, parent, _, detail in rows:
+        depths[node] = depths.get(parent, 0) + 1
+        lines.append("  " * (depths[node] - 1) + detail)
+    return lines
+
+
+class _MonitoredCursor(sqlite3.Cursor):
+    """A cursor which reports each statement it runs to the connection's monitor."""
+
+    _sql = None
+
+    def _finish(self):
+        if self._sql is not None:
+            seconds = self._seconds
+            rows = self._rows if self.description is not None else max(self.rowcount, 0)
+            sql, parameters = self._sql, self._parameters
+            self._sql = None
+            # The connection may have stopped being monitored since the statement was run.
+            monitor = self.connection.monitor
+            if monitor is not None:
+                monitor.record(self.connection, sql, parameters, seconds, rows)
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._seconds = time.perf_counter() - start
+        self._sql, self._parameters, self._rows = sql, parameters, 0
+        if self.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._seconds = time.perf_counter() - start
+        self._sql, self._parameters, self._rows = sql, (), 0
+        self._finish()
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._seconds += time.perf_counter() - start
+            self._finish()
+            raise
+        self._seconds += time.perf_counter() - start
+        self._rows += 1
+        return row
+
+    def fetchone(self):
+        try:
+            return next(self)
+        except StopIteration:
+            return None
+
+    def fetchmany(self, size=None):
+        rows = []
+        for row in self:
+            rows.append(row)
+            if len(rows) >= (self.arraysize if size is None else size):
+                break
+        return rows
+
+    def fetchall(self):
+        return list(self)
+
+    def close(self):
+        self._finish()
+        super().close()
+
+
+class MonitoredConnection(sqlite3.Connection):
+    """A connection whose cursors report their statements to monitor, while it is set."""
+
+    monitor: SqlMonitor = None
+
+    def cursor(self, factory=None):
+        if self.monitor is None:
+            return super().cursor() if factory is None else super().cursor(factory)
+        return super().cursor(factory or _MonitoredCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
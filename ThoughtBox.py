@@ -1,28 +1,97 @@
 import sqlite3
 import os
+import math
+import json
 
-from typing import List, Dict
+from contextlib import contextmanager
+
+from typing import List, Dict, Iterator, Tuple
 
 from .Name import Name
 from .Link import Link
 from .Tag import Tag
 from .Thought import Thought
+from .timing import timed
+from .SqlMonitor import MonitoredConnection, SqlMonitor
+
+
+# The most names looked up at once by path, well under SQLite's limit on query parameters.
+_PATH_BATCH = 500
 
 
 def sql_escape(s: str):
     return s.replace("'", "''")
 
 
+# The tables and indexes added since the first version, in the order they are created.
+_SCHEMA = [
+    ("thoughts_sort_key", "CREATE INDEX thoughts_sort_key ON thoughts (sort_key, number)"),
+    ("links_source", "CREATE INDEX links_source ON links (source, target)"),
+    ("links_target", "CREATE INDEX links_target ON links (target, source)"),
+    ("tag_links_thought", "CREATE INDEX tag_links_thought ON tag_links (thought, tag)"),
+    ("tag_links_tag", "CREATE INDEX tag_links_tag ON tag_links (tag, thought)"),
+    ("meta", "CREATE TABLE meta (key TEXT PRIMARY KEY, value)"),
+    (
+        "ranks",
+        "CREATE TABLE ranks "
+        "(thought TEXT PRIMARY KEY, pagerank REAL, in_degree INTEGER, hub REAL, authority REAL)",
+    ),
+    ("components", "CREATE TABLE components (thought TEXT PRIMARY KEY, component INTEGER)"),
+    (
+        "tag_pairs",
+        "CREATE TABLE tag_pairs (a INTEGER, b INTEGER, count INTEGER, PRIMARY KEY (a, b))",
+    ),
+    ("signatures", "CREATE TABLE signatures (thought TEXT PRIMARY KEY, signature BLOB)"),
+    ("lsh", "CREATE TABLE lsh (bucket INTEGER, thought TEXT)"),
+    ("lsh_bucket", "CREATE INDEX lsh_bucket ON lsh (bucket, thought)"),
+    ("lsh_thought", "CREATE INDEX lsh_thought ON lsh (thought)"),
+    (
+        "components_component",
+        "CREATE INDEX components_component ON components (component, thought)",
+    ),
+]
+
+
 class ThoughtBox:
-    def __init__(self, database_path: str, explicitly_create_tables: bool = False):
+    @timed("sql")
+    def __init__(
+        self,
+        database_path: str,
+        explicitly_create_tables: bool = False,
+        cache_size: int = 0,
+        read_only: bool = False,
+    ):
+        """Opens (or creates) the database.
+        If cache_size is given the results of up to that many listThoughts, listTags and
+        listNamesByTag calls are cached until the data changes, here or in another process.
+        Cached results share their Thoughts, so these should not be modified.
+        If read_only is true the database is opened read only. It must exist, with up to date
+        tables.
+        """
         create_tables = False
-        if not os.path.exists(database_path) or explicitly_create_tables:
+        if not read_only and (not os.path.exists(database_path) or explicitly_create_tables):
             create_tables = True
-        self.conn = sqlite3.connect(database_path)
+        if read_only:
+            from urllib.parse import quote
+
+            uri = f"file:{quote(os.path.abspath(database_path))}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, factory=MonitoredConnection)
+        else:
+            self.conn = sqlite3.connect(database_path, factory=MonitoredConnection)
+        self._transaction_depth = 0
+        self._writes = 0
+        self._cache = None
+        if cache_size > 0:
+            from .QueryCache import QueryCache
+
+            self._cache = QueryCache(cache_size)
 
         if create_tables:
             cur = self.conn.cursor()
-            cur.execute("CREATE TABLE thoughts (number TEXT PRIMARY KEY, title TEXT)")
+            cur.execute(
+                "CREATE TABLE thoughts "
+                "(number TEXT PRIMARY KEY, title TEXT, sort_key TEXT, depth INTEGER)"
+            )
             cur.execute(
                 "CREATE TABLE tags (number INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT UNIQUE)"
             )
@@ -30,124 +99,409 @@ class ThoughtBox:
             cur.execute("CREATE TABLE tag_links (thought TEXT, tag INTEGER)")
             self.conn.commit()
 
+        if not read_only:
+            self._upgradeTables()
+
+    def _upgradeTables(self):
+        """Brings databases created by older versions up to date with the current tables.
+        Only the missing tables and indexes are created, so opening an up to date database writes
+        nothing.
+        """
+        cur = self.conn.cursor()
+        existing = {row[0] for row in cur.execute("SELECT name FROM sqlite_master")}
+        columns = [row[1] for row in cur.execute("PRAGMA table_info(thoughts)")]
+        missing = [(name, sql) for name, sql in _SCHEMA if name not in existing]
+        if "sort_key" in columns and len(missing) == 0:
+            return
+
+        if "sort_key" not in columns:
+            cur.execute("ALTER TABLE thoughts ADD COLUMN sort_key TEXT")
+            cur.execute("ALTER TABLE thoughts ADD COLUMN depth INTEGER")
+            rows = cur.execute("SELECT number FROM thoughts").fetchall()
+            keys = []
+            for row in rows:
+                name = Name.fromStr(row[0])
+                keys.append((name.key(), len(name.parts), row[0]))
+            cur.executemany(
+                "UPDATE thoughts SET sort_key=?, depth=? WHERE number=?", keys
+            )
+        for name, sql in missing:
+            cur.execute(sql)
+            if name == "meta":
+                cur.execute("INSERT INTO meta (key, value) VALUES ('version', 0)")
+        self.conn.commit()
+
+    @contextmanager
+    def transaction(self):
+        """Groups all the writes made inside the with block into a single transaction.
+
+        The writes are committed at the end of the outermost block, or rolled back if it raises.
+        Transactions can be nested: a nested block is a savepoint, so if it raises only its own
+        writes are rolled back, and the outer block can carry on.
+        """
+        savepoint = None
+        if self._transaction_depth == 0:
+            if not self.conn.in_transaction:
+                self.conn.execute("BEGIN")
+        else:
+            savepoint = f"nested_{self._transaction_depth}"
+            self.conn.execute(f"SAVEPOINT {savepoint}")
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            self._rollback(savepoint)
+            raise
+        self._transaction_depth -= 1
+        if savepoint is None:
+            self._commit()
+        else:
+            self.conn.execute(f"RELEASE {savepoint}")
+
+    def _commit(self):
+        if self._transaction_depth == 0:
+            self.conn.commit()
+
+    def _rollback(self, savepoint: str = None):
+        if savepoint is not None:
+            self.conn.execute(f"ROLLBACK TO {savepoint}")
+            self.conn.execute(f"RELEASE {savepoint}")
+        elif self._transaction_depth == 0:
+            self.conn.rollback()
+        self._writes += 1
+
+    def _changed(self):
+        """Records that the thoughts, tags or links have changed, so that cached results are stale.
+        Write methods call this before committing.
+        """
+        self._writes += 1
+        self.conn.execute("UPDATE meta SET value=value+1 WHERE key='version'")
+
+    def _derivedChanged(self):
+        """Records that the ranks, components or tag pairs tables have changed, so that cached
+        results are stale. Unlike _changed this does not mark those tables as out of date.
+        """
+        self._writes += 1
+
+    def _cached(self, key: Tuple, compute):
+        """Returns the cached result for key, or computes and caches it.
+        The results are for the current version of the data: the writes made through this object and
+        PRAGMA data_version, which changes when other connections commit.
+        """
+        if self._cache is None:
+            return compute()
+        version = (self._writes, self.conn.execute("PRAGMA data_version").fetchone()[0])
+        found, result = self._cache.get(key, version)
+        if not found:
+            result = compute()
+            self._cache.put(key, version, result)
+        return result
+
+    def instrument(self, monitor: SqlMonitor = None) -> SqlMonitor:
+        """Records the timing and row counts of every SQL statement run from now on in monitor,
+        or a new SqlMonitor, and returns it.
+        """
+        self.conn.monitor = monitor or SqlMonitor()
+        return self.conn.monitor
+
+    def stopInstrumenting(self):
+        self.conn.monitor = None
+
+    def cacheStats(self) -> Dict[str, float]:
+        """Returns the statistics of the query cache (see QueryCache.stats), or None if there is no
+        cache."""
+        if self._cache is None:
+            return None
+        return self._cache.stats()
+
+    @staticmethod
+    def _queryKey(
+        names: List[Name],
+        tags: List[Tag],
+        linked_to: List[str],
+        under: Name,
+        after: Name,
+        limit: int,
+        component: int,
+        where: str,
+    ) -> Tuple:
+        """Returns the selection arguments as a hashable key, ignoring their order."""
+        return (
+            tuple(sorted(str(n) for n in names)),
+            tuple(sorted(str(t.title) for t in tags)),
+            tuple(sorted(str(l) for l in linked_to)),
+            None if under is None else str(under),
+            None if after is None else str(after),
+            limit,
+            component,
+            where,
+        )
+
+    def _meta(self, key: str):
+        row = self.conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def _setMeta(self, key: str, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @timed("sql")
     def listTags(self) -> List[Tag]:
         """Returns a list of all the tags in the database."""
         cur = self.conn.cursor()
-        tags = []
-        for row in cur.execute(
-            "SELECT group_concat(DISTINCT tags.title) as title FROM tags"
-        ):
-            tags.extend(
-                [Tag.fromStr(t.strip()) for t in row[0].split(",") if t.strip()]
+        return list(
+            self._cached(
+                ("listTags",),
+                lambda: [
+                    Tag.fromStr(row[0])
+                    for row in cur.execute("SELECT title FROM tags ORDER BY title")
+                ],
             )
-        return tags
+        )
 
     def listThoughts(
         self,
         names: List[Name] = [],
         tags: List[Tag] = [],
         linked_to: List[str] = [],
+        under: Name = None,
+        after: Name = None,
+        limit: int = None,
+        component: int = None,
+        where: str = None,
         print_query=False,
     ) -> List[Thought]:
         """
         Lists the specified thoughts.
         Listed thougts have names in names, tags in tags AND link to the specified thoughts.
         If any of these lists is empty, it is taken to mean all thoughts, tags or links, respectively.
+        If under is given only that thought and its sub-thoughts are listed.
+        If component is given only the thoughts in that component are listed (see
+        computeComponents). If where is given only the thoughts matching that query are listed, for
+        example "#a & !#b & ->4" (see the query module). A ValueError is raised if it is not a valid
+        query.
 
+        The thoughts are returned sorted by name, with their tags and links sorted.
+        If after is given only the thoughts with names after it are listed, and
+        if limit is given at most that many thoughts are listed.
+        Together these page through the thoughts: the next page is after the last name of this one.
         """
 
-        inner_tables = ["thoughts"]
+        def compute():
+            return list(
+                self.iterThoughts(
+                    names=names,
+                    tags=tags,
+                    linked_to=linked_to,
+                    under=under,
+                    after=after,
+                    limit=limit,
+                    component=component,
+                    where=where,
+                    print_query=print_query,
+                )
+            )
+
+        if print_query:
+            return compute()
+        key = ThoughtBox._queryKey(names, tags, linked_to, under, after, limit, component, where)
+        return list(self._cached(("listThoughts",) + key, compute))
+
+    def _selectThoughts(
+        self,
+        names: List[Name] = [],
+        tags: List[Tag] = [],
+        linked_to: List[str] = [],
+        under: Name = None,
+        after: Name = None,
+        limit: int = None,
+        component: int = None,
+        where: str = None,
+    ) -> Tuple[str, List]:
+        """Returns the query selecting the number, title and sort_key of the thoughts listThoughts
+        lists, and its parameters.
+        """
+        # The tag and link filters are subqueries rather than joins, so that no thought is listed
+        # twice and the thoughts can be read in sort_key order, from the thoughts_sort_key index.
         queries = []
+        parameters = []
         if len(tags) > 0:
-            tagQuery = " OR ".join(
-                [f"tags.title='{sql_escape(str(t.title))}'" for t in tags]
+            queries.append(
+                "thoughts.number IN (SELECT tag_links.thought FROM tag_links, tags "
+                f"WHERE tag_links.tag=tags.number AND tags.title IN ({', '.join('?' * len(tags))}))"
             )
-            tagQuery = f"tag_links.thought=thoughts.number AND tag_links.tag=tags.number AND ({tagQuery})"
-
-            inner_tables.append("tags")
-            inner_tables.append("tag_links")
-            queries.append(tagQuery)
+            parameters.extend(str(t.title) for t in tags)
 
         if len(linked_to) > 0:
-            linkQuery = " OR ".join(
-                [f"links.target={sql_escape(str(l))}" for l in linked_to]
+            queries.append(
+                "thoughts.number IN (SELECT links.source FROM links "
+                f"WHERE links.target IN ({', '.join('?' * len(linked_to))}))"
             )
-            linkQuery = f"links.source=thoughts.number AND ({linkQuery})"
-
-            inner_tables.append("links")
-            queries.append(linkQuery)
+            parameters.extend(str(l) for l in linked_to)
 
         if len(names) > 0:
-            namesQuery = " OR ".join([f"thoughts.number='{str(n)}'" for n in names])
-            queries.append(f"({namesQuery})")
+            queries.append(f"thoughts.number IN ({', '.join('?' * len(names))})")
+            parameters.extend(str(n) for n in names)
+
+        if under is not None:
+            queries.append("thoughts.sort_key >= ? AND thoughts.sort_key < ?")
+            parameters.extend(under.keyRange())
+
+        if after is not None:
+            queries.append("thoughts.sort_key > ?")
+            parameters.append(after.key())
+
+        if where is not None:
+            from . import query
+
+            where_sql, where_parameters = query.to_sql(where)
+            queries.append(where_sql)
+            parameters.extend(where_parameters)
+
+        if component is not None:
+            self._refreshStaleComponents()
+            queries.append("thoughts.number IN (SELECT thought FROM components WHERE component=?)")
+            parameters.append(int(component))
 
         if len(queries) > 0:
-            where_str = f"WHERE {' AND '.join(queries)} GROUP BY thoughts.number"
+            where_str = f"WHERE {' AND '.join(queries)}"
         else:
             where_str = ""
 
+        if limit is not None:
+            where_str += " ORDER BY thoughts.sort_key LIMIT ?"
+            parameters.append(int(limit))
+
+        return (
+            "SELECT thoughts.number as number, thoughts.title as title, "
+            f"thoughts.sort_key as sort_key FROM thoughts {where_str}",
+            parameters,
+        )
+
+    @timed("sql")
+    def iterThoughts(
+        self,
+        names: List[Name] = [],
+        tags: List[Tag] = [],
+        linked_to: List[str] = [],
+        under: Name = None,
+        after: Name = None,
+        limit: int = None,
+        component: int = None,
+        where: str = None,
+        print_query=False,
+    ) -> Iterator[Thought]:
+        """
+        The same as listThoughts, but yields the thoughts as they are read from the database.
+        """
+        selected, parameters = self._selectThoughts(
+            names=names,
+            tags=tags,
+            linked_to=linked_to,
+            under=under,
+            after=after,
+            limit=limit,
+            component=component,
+            where=where,
+        )
+
+        # The tags and links of each thought are aggregated into json arrays, sorted and without
+        # duplicates.
         query = (
-            f"SELECT tbl.number, tbl.title, grouped_tags.tags, group_concat(DISTINCT links.target) "
+            "SELECT tbl.number, tbl.title, "
+            "(SELECT json_group_array(title) FROM "
+            "(SELECT DISTINCT tags.title as title FROM tag_links, tags "
+            "WHERE tag_links.thought=tbl.number AND tags.number=tag_links.tag "
+            "ORDER BY tags.title)), "
+            "(SELECT json_group_array(target) FROM "
+            "(SELECT DISTINCT links.target as target FROM links "
+            "WHERE links.source=tbl.number ORDER BY links.target)) "
             "FROM "
-            f" (SELECT thoughts.number as number, thoughts.title as title FROM {', '.join(inner_tables)} {where_str}) as tbl "
-            "LEFT OUTER JOIN links ON links.source=tbl.number "
-            "LEFT OUTER JOIN (SELECT tag_links.thought as number, group_concat(DISTINCT tags.title) as tags FROM tags,tag_links WHERE tags.number = tag_links.tag GROUP BY tag_links.thought) as grouped_tags "
-            "ON grouped_tags.number=tbl.number "
-            "GROUP BY tbl.number "
+            f" ({selected}) as tbl "
+            "ORDER BY tbl.sort_key"
         )
 
         if print_query:
-            print(query, flush=True)
+            print(query, parameters, flush=True)
 
         cur = self.conn.cursor()
-        thoughts: List[Thought] = []
+        loads = json.loads
 
-        for row in cur.execute(query):
+        for row in cur.execute(query, parameters):
             if print_query:
                 print(row)
-            number = Name.fromStr(row[0])
-            title = Name.fromStr(row[1])
-            if row[2] is not None:
-                tag_bits = [Tag.fromStr(t.strip()) for t in row[2].split(",") if t.strip()]
-            else:
-                tag_bits=[]
-            if row[3] is not None:
-                link_bits = [
-                    Link(source=number, target=l.strip())
-                    for l in row[3].split(",")
-                    if l.strip()
-                ]
-            else:
-                link_bits = []
-            thoughts.append(
-                Thought(
-                    name=row[0],
-                    title=row[1],
-                    tags=tag_bits,
-                    links=link_bits,
-                    content=[],
-                    sources=[],
-                )
+            targets = loads(row[3])
+            if targets:
+                source = Name.fromStr(row[0])
+                targets = [Link(source=source, target=l) for l in targets]
+            yield Thought(
+                name=row[0],
+                title=row[1],
+                tags=[Tag(id=-1, title=t) for t in loads(row[2])],
+                links=targets,
+                content=[],
+                sources=[],
             )
 
-        return sorted(thoughts, key=lambda t: t.name)
+    def subtree(self, name: Name) -> List[Thought]:
+        """Lists the named thought and all of its sub-thoughts, sorted by name."""
+        return self.listThoughts(under=name)
+
+    @timed("sql")
+    def subtreeCounts(self, name: Name = Name([])) -> Dict[str, int]:
+        """
+        Counts the thoughts under each direct sub-name of name.
+        The result maps each sub-name to the number of thoughts in its subtree (including itself).
+        A sub-name is included if anything beneath it exists, even when that thought itself does
+        not. The named thought is not counted.
+        """
+        low, high = name.keyRange()
+
+        # The key of the sub-name a thought is under is the start of its key: the key of name,
+        # then the length of the next part and that part.
+        cur = self.conn.cursor()
+        return {
+            str(Name.fromKey(row[0])): row[1]
+            for row in cur.execute(
+                "SELECT substr(sort_key, 1, ? + 3 + CAST(substr(sort_key, ? + 1, 3) AS INTEGER))"
+                " AS child, COUNT(*) FROM thoughts "
+                "WHERE sort_key > ? AND sort_key < ? GROUP BY child ORDER BY child",
+                (len(low), len(low), low, high),
+            )
+        }
 
     def listThoughtsByTag(
         self,
         names: List[Name] = [],
         tags: List[Tag] = [],
         linked_to: List[str] = [],
+        under: Name = None,
+        after: Name = None,
+        limit: int = None,
+        component: int = None,
+        where: str = None,
         print_query=False,
     ) -> Dict[Tag, List[Thought]]:
         """
         Lists the specified thoughts, grouped by tag.
         Listed thougts have names in names, tags in tags AND link to the specified thoughts.
         If any of these lists is empty, it is taken to mean all thoughts, tags or links, respectively.
+        If under is given only that thought and its sub-thoughts are listed.
+        after and limit select a page of the thoughts, component a component and where a query, as
+        in listThoughts.
 
         """
 
         thoughts = self.listThoughts(
-            names=names, tags=tags, linked_to=linked_to, print_query=print_query
+            names=names,
+            tags=tags,
+            linked_to=linked_to,
+            under=under,
+            after=after,
+            limit=limit,
+            component=component,
+            where=where,
+            print_query=print_query,
         )
 
         by_tags: Dict[Tag, List[Thought]] = {}
@@ -158,10 +512,532 @@ class ThoughtBox:
                 by_tags[tag].append(thought)
         return by_tags
 
+    @timed("sql")
+    def listNamesByTag(
+        self,
+        names: List[Name] = [],
+        tags: List[Tag] = [],
+        linked_to: List[str] = [],
+        under: Name = None,
+        after: Name = None,
+        limit: int = None,
+        component: int = None,
+        where: str = None,
+        per_tag: int = None,
+    ) -> Dict[str, Tuple[int, List[str]]]:
+        """
+        Lists the names of the specified thoughts, grouped by tag, without reading the whole
+        thoughts. The thoughts are selected as in listThoughtsByTag.
+
+        Returns a dict, sorted by tag title, from each tag title to the number of selected thoughts
+        with that tag and their names, sorted by name. If per_tag is given at most that many names
+        are listed for each tag (but the count is of them all).
+        """
+        key = ThoughtBox._queryKey(names, tags, linked_to, under, after, limit, component, where)
+        return dict(
+            self._cached(
+                ("listNamesByTag", per_tag) + key,
+                lambda: self._listNamesByTag(
+                    names, tags, linked_to, under, after, limit, component, where, per_tag
+                ),
+            )
+        )
+
+    def _listNamesByTag(
+        self, names, tags, linked_to, under, after, limit, component, where, per_tag
+    ) -> Dict[str, Tuple[int, List[str]]]:
+        selected, parameters = self._selectThoughts(
+            names=names,
+            tags=tags,
+            linked_to=linked_to,
+            under=under,
+            after=after,
+            limit=limit,
+            component=component,
+            where=where,
+        )
+        per_tag_str = ""
+        if per_tag is not None:
+            per_tag_str = "WHERE position <= ? "
+            parameters.append(int(per_tag))
+        query = (
+            "SELECT title, number, total FROM "
+            "(SELECT tags.title as title, tbl.number as number, "
+            "row_number() OVER (PARTITION BY tag_links.tag ORDER BY tbl.sort_key) as position, "
+            "count(*) OVER (PARTITION BY tag_links.tag) as total "
+            f"FROM ({selected}) as tbl, tag_links, tags "
+            "WHERE tag_links.thought=tbl.number AND tags.number=tag_links.tag) "
+            f"{per_tag_str}ORDER BY title, position"
+        )
+
+        by_tags: Dict[str, Tuple[int, List[str]]] = {}
+        cur = self.conn.cursor()
+        for title, number, total in cur.execute(query, parameters):
+            if title not in by_tags:
+                by_tags[title] = (total, [])
+            by_tags[title][1].append(number)
+        return by_tags
+
+    def _updateTagPairs(self, str_name: str, change: int):
+        """Adds change to the co-occurrence counts of each pair of the thought's tags, if they are
+        being kept. Called with -1 before the thought's tags are removed, and +1 after they are
+        added.
+        """
+        if not self._meta("tag_pairs_valid"):
+            return
+        cur = self.conn.cursor()
+        cur.execute(
+            "INSERT INTO tag_pairs (a, b, count) "
+            "SELECT x.tag, y.tag, ? FROM tag_links x, tag_links y "
+            "WHERE x.thought=? AND y.thought=? AND x.tag!=y.tag "
+            "ON CONFLICT (a, b) DO UPDATE SET count=count+excluded.count",
+            (change, str_name, str_name),
+        )
+        if change < 0:
+            cur.execute(
+                "DELETE FROM tag_pairs WHERE count<=0 "
+                "AND a IN (SELECT tag FROM tag_links WHERE thought=?)",
+                (str_name,),
+            )
+
+    def _tagPairs(self):
+        """Fills the tag_pairs table, if it is not already being kept, and returns a cursor."""
+        cur = self.conn.cursor()
+        if not self._meta("tag_pairs_valid"):
+            cur.execute("DELETE FROM tag_pairs")
+            cur.execute(
+                "INSERT INTO tag_pairs (a, b, count) "
+                "SELECT x.tag, y.tag, count(*) FROM tag_links x JOIN tag_links y "
+                "ON x.thought=y.thought AND x.tag!=y.tag GROUP BY x.tag, y.tag"
+            )
+            self._setMeta("tag_pairs_valid", 1)
+            self._derivedChanged()
+            self._commit()
+        return cur
+
+    @staticmethod
+    def _pairScore(score: str, count: int, a_count: int, b_count: int, total: int) -> float:
+        if score == "count":
+            return count
+        if score == "jaccard":
+            return count / (a_count + b_count - count)
+        if score == "pmi":
+            return math.log(count * total / (a_count * b_count))
+        raise ValueError(f"Unknown score {score}, use count, jaccard or pmi.")
+
+    @timed("sql")
+    def tagPairs(self, score: str = "count") -> List[Tuple[str, str, float]]:
+        """Returns how often each pair of tags is used on the same thought, as (tag, tag, score)
+        triples, for the pairs used together at least once, sorted by title.
+
+        score is one of:
+        count:   the number of thoughts with both tags.
+        jaccard: the number of thoughts with both tags over the number with either.
+        pmi:     the pointwise mutual information, log(p(both) / (p(one) p(other))).
+
+        The pair counts are kept in the tag_pairs table, which is updated by addOrUpdate and delete.
+        """
+        cur = self._tagPairs()
+        total = cur.execute("SELECT count(DISTINCT thought) FROM tag_links").fetchone()[0]
+        uses = {
+            row[0]: row[1]
+            for row in cur.execute("SELECT tag, count(*) FROM tag_links GROUP BY tag")
+        }
+        titles = {row[0]: row[1] for row in cur.execute("SELECT number, title FROM tags")}
+        pairs = []
+        for a, b, count in cur.execute("SELECT a, b, count FROM tag_pairs").fetchall():
+            if titles[a] < titles[b]:
+                value = ThoughtBox._pairScore(score, count, uses[a], uses[b], total)
+                pairs.append((titles[a], titles[b], value))
+        return sorted(pairs)
+
+    @timed("sql")
+    def relatedTags(self, tag: Tag, k: int = 10, score: str = "count") -> List[Tuple[str, float]]:
+        """Returns the k tags most related to tag, the tags most used on the same thoughts,
+        as (title, score) pairs with the highest score first. See tagPairs for the scores.
+        """
+        cur = self._tagPairs()
+        row = cur.execute("SELECT number FROM tags WHERE title=?", (str(tag.title),)).fetchone()
+        if row is None:
+            return []
+        number = row[0]
+        total = cur.execute("SELECT count(DISTINCT thought) FROM tag_links").fetchone()[0]
+        a_count = cur.execute(
+            "SELECT count(*) FROM tag_links WHERE tag=?", (number,)
+        ).fetchone()[0]
+        related = [
+            (row[0], ThoughtBox._pairScore(score, row[1], a_count, row[2], total))
+            for row in cur.execute(
+                "SELECT tags.title, tag_pairs.count, "
+                "(SELECT count(*) FROM tag_links WHERE tag_links.tag=tag_pairs.b) "
+                "FROM tag_pairs, tags WHERE tag_pairs.a=? AND tags.number=tag_pairs.b",
+                (number,),
+            )
+        ]
+        related.sort(key=lambda r: (-r[1], r[0]))
+        return related[:k]
+
+    def _updateSignature(self, str_name: str, thought: Thought = None):
+        """Replaces the MinHash signature and LSH buckets of the named thought with those of
+        thought, or just removes them if thought is None.
+        A thought with no features is stored with a NULL signature and no buckets, so that every
+        thought written since signatures were added has a row.
+        """
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM signatures WHERE thought=?", (str_name,))
+        cur.execute("DELETE FROM lsh WHERE thought=?", (str_name,))
+        if thought is None:
+            return
+
+        from . import minhash
+
+        sig = minhash.signature(minhash.features(thought))
+        cur.execute(
+            "INSERT INTO signatures (thought, signature) VALUES (?, ?)",
+            (str_name, None if sig is None else minhash.to_bytes(sig)),
+        )
+        if sig is None:
+            return
+        cur.executemany(
+            "INSERT INTO lsh (bucket, thought) VALUES (?, ?)",
+            [(bucket, str_name) for bucket in minhash.buckets(sig)],
+        )
+
+    @timed("sql")
+    def similar(self, name: Name, k: int = 10) -> List[Tuple[str, float]]:
+        """Returns up to k thoughts similar to the named one, as (name, similarity) pairs, most
+        similar first.
+
+        Thoughts are similar if they share tags, link targets or wording. The candidates are the
+        thoughts sharing an LSH bucket with the named one, and the similarity is estimated from
+        their MinHash signatures.
+
+        Only thoughts written (or parsed) since signatures were added have one. A ValueError is
+        raised if the named thought exists but has none: parse all the thoughts again to add them.
+        """
+        from . import minhash
+
+        str_name = str(name)
+        cur = self.conn.cursor()
+        row = cur.execute(
+            "SELECT signature FROM signatures WHERE thought=?", (str_name,)
+        ).fetchone()
+        if row is None:
+            if cur.execute("SELECT 1 FROM thoughts WHERE number=?", (str_name,)).fetchone():
+                raise ValueError(
+                    f"{str_name} has no similarity signature, as the database was made by an older"
+                    " version. Parse all the thoughts again (parse --all) to add the signatures."
+                )
+            return []
+        if row[0] is None:
+            return []
+        sig = minhash.from_bytes(row[0])
+
+        similar = [
+            (row[0], minhash.similarity(sig, minhash.from_bytes(row[1])))
+            for row in cur.execute(
+                "SELECT signatures.thought, signatures.signature FROM signatures "
+                "WHERE signatures.thought IN "
+                "(SELECT candidates.thought FROM lsh, lsh AS candidates "
+                "WHERE lsh.thought=? AND candidates.bucket=lsh.bucket AND candidates.thought!=?)",
+                (str_name, str_name),
+            )
+        ]
+        similar.sort(key=lambda s: (-s[1], Name.fromStr(s[0])))
+        return similar[:k]
+
+    @timed("sql")
+    def graphSnapshot(self) -> "Graph":
+        """Loads all the links into an in memory Graph, for fast traversal and analysis.
+        The graph is a snapshot, it does not change when the database does.
+        """
+        from .Graph import Graph
+
+        cur = self.conn.cursor()
+        names = [row[0] for row in cur.execute("SELECT number FROM thoughts ORDER BY sort_key")]
+        return Graph(names, cur.execute("SELECT DISTINCT source, target FROM links"))
+
+    @timed("sql")
+    def path(
+        self,
+        source: Name,
+        target: Name,
+        max_depth: int = None,
+        directed: bool = True,
+        all_paths: bool = False,
+    ) -> List[List[str]]:
+        """Finds the shortest chain of links from source to target, as a list of names.
+        See Graph.shortestPaths for the arguments.
+        Returns a list of the paths found, which is empty if there are none.
+
+        Rather than loading the whole graph this looks up the links of each frontier of the search,
+        a batch at a time, using the links indexes, so it only reads the links it reaches.
+        """
+        from .Graph import shortest_paths
+
+        str_source, str_target = str(source), str(target)
+        cur = self.conn.cursor()
+        for name in (str_source, str_target):
+            # The graph has the thoughts and the targets of broken links.
+            if not cur.execute(
+                "SELECT 1 FROM thoughts WHERE number=? UNION ALL "
+                "SELECT 1 FROM links WHERE target=? LIMIT 1",
+                (name, name),
+            ).fetchone():
+                return []
+
+        if directed:
+            forward_columns = [("source", "target")]
+            backward_columns = [("target", "source")]
+        else:
+            forward_columns = backward_columns = [("source", "target"), ("target", "source")]
+
+        def expand(frontier: List[str], forward: bool) -> List[Tuple[str, str]]:
+            pairs = []
+            for start in range(0, len(frontier), _PATH_BATCH):
+                batch = frontier[start : start + _PATH_BATCH]
+                for column, other in forward_columns if forward else backward_columns:
+                    pairs += cur.execute(
+                        f"SELECT DISTINCT {column}, {other} FROM links "
+                        f"WHERE {column} IN ({', '.join('?' * len(batch))}) "
+                        f"ORDER BY {column}, {other}",
+                        batch,
+                    )
+            # In frontier order, as the search picks the first parent it finds.
+            position = {name: i for i, name in enumerate(frontier)}
+            pairs.sort(key=lambda pair: position[pair[0]])
+            return pairs
+
+        return shortest_paths(
+            str_source, str_target, expand, max_depth=max_depth, all_paths=all_paths
+        )
+
+    def rank(
+        self, method: str = "pagerank", limit: int = None, cached: bool = False
+    ) -> List[Tuple[str, float]]:
+        """Returns the most central thoughts, as (name, score) pairs, highest score first.
+
+        method is one of rank.METHODS: pagerank, in_degree, hub or authority.
+        If limit is given at most that many thoughts are returned.
+        If cached is true the scores are read from the ranks table, which is refreshed first
+        if the box has changed since it was last refreshed (see refreshRanks).
+        """
+        from . import rank
+
+        if method not in rank.METHODS:
+            raise ValueError(f"Unknown rank method {method}, use one of {', '.join(rank.METHODS)}.")
+
+        if cached:
+            if self._meta("ranks_version") != self._meta("version"):
+                self.refreshRanks()
+            cur = self.conn.cursor()
+            return [
+                (row[0], row[1])
+                for row in cur.execute(
+                    f"SELECT ranks.thought, ranks.{method} FROM ranks, thoughts "
+                    "WHERE thoughts.number=ranks.thought "
+                    f"ORDER BY ranks.{method} DESC, thoughts.sort_key LIMIT ?",
+                    (-1 if limit is None else limit,),
+                )
+            ]
+
+        graph = self.graphSnapshot()
+        scores = rank.scores(graph, method)
+        # Ids are in name order, so sorting is stable for equal scores.
+        order = sorted(range(graph.thought_count), key=lambda i: -scores[i])
+        if limit is not None:
+            order = order[:limit]
+        return [(graph.name(i), scores[i]) for i in order]
+
+    @timed("sql")
+    def refreshRanks(self):
+        """Recomputes the scores in the ranks table.
+        The power iterations start from the previous scores, so after a few writes they converge
+        quickly.
+        """
+        from . import rank
+
+        cur = self.conn.cursor()
+        graph = self.graphSnapshot()
+        previous = {
+            row[0]: row[1:]
+            for row in cur.execute("SELECT thought, pagerank, hub, authority FROM ranks")
+        }
+        names = graph.names[: graph.thought_count]
+        old = [previous.get(name, (None, None, None)) for name in names]
+
+        pageranks = rank.pagerank(graph, initial=[o[0] for o in old])
+        hubs, authorities = rank.hits(
+            graph, initial=([o[1] for o in old], [o[2] for o in old])
+        )
+        in_degrees = rank.in_degree(graph)
+
+        cur.execute("DELETE FROM ranks")
+        cur.executemany(
+            "INSERT INTO ranks (thought, pagerank, in_degree, hub, authority) "
+            "VALUES (?, ?, ?, ?, ?)",
+            zip(names, pageranks, in_degrees, hubs, authorities),
+        )
+        self._setMeta("ranks_version", self._meta("version"))
+        self._derivedChanged()
+        self._commit()
+
+    @timed("sql")
+    def computeComponents(self, clusters: bool = False) -> Dict[int, int]:
+        """Groups the thoughts that are connected by links or shared tags, and stores the group of
+        each thought.
+
+        Links and tags are read in a single scan. Links are followed in either direction, and
+        broken links are ignored. By default the groups are the connected components, found by
+        union-find. If clusters is true each component is split further into clusters, found by
+        label propagation. Groups are numbered from 0, in the order of their first thought by name.
+        The groups are recomputed (the same way) when they are next used after the box changes.
+
+        Returns the number of thoughts in each group.
+        """
+        from . import clusters as grouping
+
+        cur = self.conn.cursor()
+        names = [row[0] for row in cur.execute("SELECT number FROM thoughts ORDER BY sort_key")]
+        index = {name: i for i, name in enumerate(names)}
+        count = len(names)
+
+        # Each tag is a node after the thoughts, with an edge to each thought it tags.
+        edges = []
+        tag_ids: Dict[int, int] = {}
+        for source, target, tag in cur.execute(
+            "SELECT source, target, NULL FROM links "
+            "UNION ALL SELECT thought, NULL, tag FROM tag_links"
+        ):
+            if source not in index:
+                continue
+            if tag is None:
+                if target in index:
+                    edges.append((index[source], index[target]))
+            else:
+                if tag not in tag_ids:
+                    tag_ids[tag] = count + len(tag_ids)
+                edges.append((index[source], tag_ids[tag]))
+
+        if clusters:
+            groups = grouping.label_propagation(count + len(tag_ids), edges)
+        else:
+            groups = grouping.components(count + len(tag_ids), edges)
+
+        numbers: Dict[int, int] = {}
+        rows = []
+        for i, name in enumerate(names):
+            group = numbers.setdefault(groups[i], len(numbers))
+            rows.append((name, group))
+
+        cur.execute("DELETE FROM components")
+        cur.executemany("INSERT INTO components (thought, component) VALUES (?, ?)", rows)
+        self._setMeta("components_version", self._meta("version"))
+        self._setMeta("components_clusters", int(clusters))
+        self._derivedChanged()
+        self._commit()
+
+        sizes: Dict[int, int] = {}
+        for _, group in rows:
+            sizes[group] = sizes.get(group, 0) + 1
+        return sizes
+
+    def _refreshStaleComponents(self):
+        if self._meta("components_version") != self._meta("version"):
+            self.computeComponents(clusters=bool(self._meta("components_clusters")))
+
+    @timed("sql")
+    def brokenLinks(self) -> List[Tuple[str, str]]:
+        """Returns the links to thoughts that do not exist, as (source, target) pairs sorted by
+        source."""
+        cur = self.conn.cursor()
+        return [
+            (row[0], row[1])
+            for row in cur.execute(
+                "SELECT links.source, links.target FROM links "
+                "LEFT JOIN thoughts ON thoughts.number=links.target "
+                "LEFT JOIN thoughts AS sources ON sources.number=links.source "
+                "WHERE thoughts.number IS NULL "
+                "ORDER BY sources.sort_key, links.source, links.target"
+            )
+        ]
+
+    @timed("sql")
+    def orphans(self) -> List[str]:
+        """Returns the names of the thoughts that no other thought links to, sorted by name."""
+        cur = self.conn.cursor()
+        return [
+            row[0]
+            for row in cur.execute(
+                "SELECT thoughts.number FROM thoughts "
+                "WHERE NOT EXISTS (SELECT 1 FROM links "
+                "WHERE links.target=thoughts.number AND links.source!=thoughts.number) "
+                "ORDER BY thoughts.sort_key, thoughts.number"
+            )
+        ]
+
+    @timed("sql")
+    def stats(self, top_tags: int = 10) -> Dict:
+        """Returns aggregate metrics of the box, all computed in the database.
+
+        thoughts, tags, links, tag_links: the number of each.
+        broken_links:  the number of links to thoughts that do not exist.
+        out_degree:    maps each number of links out of a thought to how many thoughts have it.
+        in_degree:     maps each number of links into a thought to how many thoughts have it.
+        top_tags:      the most used tags, as [title, count] pairs, most used first.
+        deepest:       the name with the most parts and its depth, or None if the box is empty.
+        """
+        cur = self.conn.cursor()
+
+        def count(query):
+            return cur.execute(query).fetchone()[0]
+
+        def histogram(column):
+            return {
+                row[0]: row[1]
+                for row in cur.execute(
+                    "SELECT degree, count(*) FROM "
+                    f"(SELECT (SELECT count(*) FROM links WHERE links.{column}=thoughts.number) "
+                    "as degree FROM thoughts) "
+                    "GROUP BY degree ORDER BY degree"
+                )
+            }
+
+        deepest = cur.execute(
+            "SELECT number, depth FROM thoughts ORDER BY depth DESC, sort_key LIMIT 1"
+        ).fetchone()
+
+        return {
+            "thoughts": count("SELECT count(*) FROM thoughts"),
+            "tags": count("SELECT count(*) FROM tags"),
+            "links": count("SELECT count(*) FROM links"),
+            "tag_links": count("SELECT count(*) FROM tag_links"),
+            "broken_links": count(
+                "SELECT count(*) FROM links "
+                "WHERE NOT EXISTS (SELECT 1 FROM thoughts WHERE thoughts.number=links.target)"
+            ),
+            "out_degree": histogram("source"),
+            "in_degree": histogram("target"),
+            "top_tags": [
+                [row[0], row[1]]
+                for row in cur.execute(
+                    "SELECT tags.title, count(*) as uses FROM tag_links, tags "
+                    "WHERE tags.number=tag_links.tag "
+                    "GROUP BY tag_links.tag ORDER BY uses DESC, tags.title LIMIT ?",
+                    (top_tags,),
+                )
+            ],
+            "deepest": None
+            if deepest is None
+            else {"name": deepest[0], "depth": deepest[1]},
+        }
+
+    @timed("sql")
     def addOrUpdate(self, thought: Thought):
         """Adds a new thought to the database or overrides a previous one."""
         str_name = str(thought.name)
 
+        self._updateTagPairs(str_name, -1)
         cur = self.conn.cursor()
         cur.execute("DELETE FROM thoughts WHERE number IS '" + str_name + "'")
         cur.execute("DELETE FROM links WHERE source IS '" + str_name + "'")
@@ -176,8 +1052,11 @@ class ThoughtBox:
         )
 
         cur = self.conn.cursor()
+        name = Name.fromStr(str_name)
         cur.execute(
-            f"INSERT INTO thoughts (number, title) VALUES ('{str_name}', '{sql_escape(thought.title)}')"
+            f"INSERT INTO thoughts (number, title, sort_key, depth) "
+            f"VALUES ('{str_name}', '{sql_escape(thought.title)}', "
+            f"'{sql_escape(name.key())}', {len(name.parts)})"
         )
 
         if len(thought.links) > 0:
@@ -196,7 +1075,6 @@ class ThoughtBox:
             cur.execute(
                 f"INSERT INTO tags (title) VALUES {tagValues} ON CONFLICT DO NOTHING"
             )
-            self.conn.commit()
 
             cur = self.conn.cursor()
             tagQuery = " OR ".join(
@@ -207,8 +1085,12 @@ class ThoughtBox:
             if len(rows) > 0:
                 tagValues = ", ".join([f"('{str_name}', {row[0]})" for row in rows])
                 cur.execute(f"INSERT INTO tag_links (thought, tag) VALUES {tagValues}")
-        self.conn.commit()
+                self._updateTagPairs(str_name, 1)
+        self._updateSignature(str_name, thought)
+        self._changed()
+        self._commit()
 
+    @timed("sql")
     def delete(self, name: Name):
         """
         Deletes the named thought.
@@ -220,6 +1102,7 @@ class ThoughtBox:
 
         pointed_to = [t.name for t in self.listThoughts(linked_to=[str_name])]
 
+        self._updateTagPairs(str_name, -1)
         cur = self.conn.cursor()
         cur.execute(f"DELETE FROM thoughts WHERE number IS '{str_name}'")
         cur.execute(f"DELETE FROM links WHERE source IS '{str_name}'")
@@ -232,10 +1115,13 @@ class ThoughtBox:
             "GROUP BY tags.number) "
             "DELETE FROM tags WHERE tags.number IN (SELECT tbl.number FROM tbl where tag_col IS NULL )"
         )
+        self._updateSignature(str_name)
 
-        self.conn.commit()
+        self._changed()
+        self._commit()
         return pointed_to
 
+    @timed("sql")
     def rename(self, name: Name, new_name: Name) -> List[Name]:
         """Changes the name of a thought.
         This updates the links out of the thought (the link src is updated).
@@ -251,7 +1137,9 @@ class ThoughtBox:
 
         cur = self.conn.cursor()
         cur.execute(
-            f"UPDATE thoughts SET number='{str_new_name}' WHERE number='{str_name}'"
+            f"UPDATE thoughts SET number='{str_new_name}', "
+            f"sort_key='{sql_escape(new_name.key())}', depth={len(new_name.parts)} "
+            f"WHERE number='{str_name}'"
         )
         cur.execute(
             f"UPDATE tag_links SET thought='{str_new_name}' WHERE thought='{str_name}'"
@@ -259,6 +1147,97 @@ class ThoughtBox:
         cur.execute(
             f"UPDATE links SET source='{str_new_name}' WHERE source='{str_name}'"
         )
-        self.conn.commit()
+        cur.execute(
+            "UPDATE signatures SET thought=? WHERE thought=?", (str_new_name, str_name)
+        )
+        cur.execute("UPDATE lsh SET thought=? WHERE thought=?", (str_new_name, str_name))
+        self._changed()
+        self._commit()
 
         return [t.name for t in self.listThoughts(linked_to=[str_name])]
+
+    @timed("sql")
+    def moveSubtree(
+        self, src: Name, dst: Name, update_links: bool = False
+    ) -> Tuple[Dict[str, str], List[str]]:
+        """Moves a thought and all its sub-thoughts so that src becomes dst.
+        For example moving 2 to 5c1 renames 2a to 5c1a and 2a1 to 5c1a1.
+        Everything is updated in a single transaction.
+
+        Links out of the moved thoughts are kept. If update_links is true links into the moved
+        thoughts are changed to point at the new names, otherwise they are left broken (as with
+        rename).
+
+        Raises a ValueError if the move is invalid (see Name.checkMove) or if anything already
+        exists at dst.
+
+        Returns the mapping from old to new names, and the (new) names of all the thoughts that link
+        into the moved thoughts. Unless update_links is true these need to be updated.
+        """
+        Name.checkMove(src, dst)
+
+        cur = self.conn.cursor()
+        low, high = dst.keyRange()
+        existing = cur.execute(
+            "SELECT number FROM thoughts WHERE sort_key >= ? AND sort_key < ? LIMIT 1",
+            (low, high),
+        ).fetchall()
+        if len(existing) > 0:
+            raise ValueError(f"Can not move {src} to {dst}, {existing[0][0]} already exists.")
+
+        low, high = src.keyRange()
+        mapping: Dict[str, str] = {}
+        rows = []
+        for row in cur.execute(
+            "SELECT number FROM thoughts WHERE sort_key >= ? AND sort_key < ?",
+            (low, high),
+        ).fetchall():
+            new_name = Name.fromStr(row[0]).moved(src, dst)
+            mapping[row[0]] = str(new_name)
+            rows.append((row[0], str(new_name), new_name.key(), len(new_name.parts)))
+
+        with self.transaction():
+            cur.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS move_map "
+                "(old TEXT PRIMARY KEY, new TEXT, sort_key TEXT, depth INTEGER)"
+            )
+            cur.execute("DELETE FROM move_map")
+            cur.executemany("INSERT INTO move_map VALUES (?, ?, ?, ?)", rows)
+
+            cur.execute(
+                "UPDATE thoughts SET "
+                "number=(SELECT new FROM move_map WHERE old=thoughts.number), "
+                "sort_key=(SELECT sort_key FROM move_map WHERE old=thoughts.number), "
+                "depth=(SELECT depth FROM move_map WHERE old=thoughts.number) "
+                "WHERE number IN (SELECT old FROM move_map)"
+            )
+            cur.execute(
+                "UPDATE tag_links "
+                "SET thought=(SELECT new FROM move_map WHERE old=tag_links.thought) "
+                "WHERE thought IN (SELECT old FROM move_map)"
+            )
+            cur.execute(
+                "UPDATE links SET source=(SELECT new FROM move_map WHERE old=links.source) "
+                "WHERE source IN (SELECT old FROM move_map)"
+            )
+            for table in ["signatures", "lsh"]:
+                cur.execute(
+                    f"UPDATE {table} "
+                    f"SET thought=(SELECT new FROM move_map WHERE old={table}.thought) "
+                    "WHERE thought IN (SELECT old FROM move_map)"
+                )
+            pointed_to = [
+                row[0]
+                for row in cur.execute(
+                    "SELECT DISTINCT source FROM links WHERE target IN (SELECT old FROM move_map)"
+                )
+            ]
+            if update_links:
+                cur.execute(
+                    "UPDATE links SET target=(SELECT new FROM move_map WHERE old=links.target) "
+                    "WHERE target IN (SELECT old FROM move_map)"
+                )
+            cur.execute("DELETE FROM move_map")
+            self._changed()
+
+        return mapping, [str(n) for n in sorted([Name.fromStr(p) for p in pointed_to])]
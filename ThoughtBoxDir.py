@@ -3,10 +3,14 @@ import shutil
 import pathlib
 
 from os import PathLike
+from typing import Dict, List, Tuple, Union, TYPE_CHECKING
 
-from .ThoughtBox import ThoughtBox
-from .Thought import Thought
 from .Name import Name
+from .timing import timed, phase
+
+if TYPE_CHECKING:
+    from .ThoughtBox import ThoughtBox
+    from .Thought import Thought
 
 
 class ThoughtBoxDir:
@@ -25,6 +29,66 @@ class ThoughtBoxDir:
         """Converts a thought name into a path pointing into this directory."""
         return pathlib.Path(os.path.join(self.dir, str(name) + ".tb"))
 
+    @timed("file io")
+    def listNames(self) -> List[Name]:
+        """Lists the names of all the thoughts in this directory, sorted."""
+        names = []
+        with os.scandir(self.dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".tb") and entry.is_file():
+                    names.append(Name.fromStr(entry.name[:-3]))
+        return sorted(names)
+
+    def findNames(self, patterns: List[str]) -> List[Name]:
+        """Finds the names matching any of the patterns, sorted and without duplicates.
+
+        A pattern can be:
+            a name, which is returned whether or not the thought exists,
+            a shell-style glob over the names in this directory, such as 2* or 3?,
+            a range of names, such as 3a..3f, which matches the existing thoughts from 3a to 3f
+            inclusive.
+        """
+        import fnmatch
+
+        found = {}
+        existing = None
+        for pattern in patterns:
+            if ".." in pattern or any([c in pattern for c in "*?["]):
+                if existing is None:
+                    existing = self.listNames()
+                if ".." in pattern:
+                    low, high = [Name.fromStr(p) for p in pattern.split("..", 1)]
+                    matches = [n for n in existing if low <= n and n <= high]
+                else:
+                    matches = [n for n in existing if fnmatch.fnmatchcase(str(n), pattern)]
+            else:
+                matches = [Name.fromStr(pattern)]
+            for name in matches:
+                found[str(name)] = name
+        return sorted(found.values())
+
+    def readMany(
+        self, names: List[Name], workers: int = 8
+    ) -> List[Tuple[Name, Union["Thought", Exception]]]:
+        """Reads and parses many thought files concurrently.
+
+        Returns the name and either the thought, or the exception raised reading it, for each name
+        in order.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        def read_one(name):
+            try:
+                return (name, self.read(name))
+            except Exception as e:
+                return (name, e)
+
+        if len(names) <= 1 or workers <= 1:
+            return [read_one(name) for name in names]
+        with ThreadPoolExecutor(max_workers=min(workers, len(names))) as pool:
+            return list(pool.map(read_one, names))
+
+    @timed("file io")
     def createNew(self, name: Name, force_override=False) -> Name:
         """
         Creates a new empty thought.
@@ -58,17 +122,22 @@ class ThoughtBoxDir:
             tf.write("# tags\n")
         return current_name
 
-    def read(self, name: Name) -> Thought:
+    @timed("file io")
+    def read(self, name: Name) -> "Thought":
         """Read and parse the thought file in this directory."""
+        with phase("import"):
+            from .Thought import Thought
+
         lines = []
         with open(self.getPath(name), "r") as thought_file:
             lines = [l.strip() for l in thought_file.readlines()]
 
-        return Thought.parse(lines, name)
+        with phase("parse"):
+            return Thought.parse(lines, name)
 
     def writeDotGraph(
         self,
-        box: ThoughtBox,
+        box: "ThoughtBox",
         file: PathLike,
         use_links=True,
         link_tags=False,
@@ -85,6 +154,7 @@ class ThoughtBoxDir:
         """
         raise NotImplementedError()
 
+    @timed("file io")
     def rename(self, src: Name, to: Name) -> None:
         """Rename the specified thought on disk."""
         src_path = self.getPath(src)
@@ -93,6 +163,67 @@ class ThoughtBoxDir:
             raise FileExistsError()
         shutil.move(src_path, to_path)
 
+    @timed("file io")
     def delete(self, name: Name) -> None:
         """Delete the specified thought off disk."""
         os.remove(self.getPath(name))
+
+    @timed("file io")
+    def moveSubtree(self, src: Name, to: Name) -> Dict[str, str]:
+        """Move the specified thought and all its sub-thoughts on disk, so that src becomes to.
+
+        Nothing is moved if any of the new files already exist (FileExistsError),
+        or if there are no files to move (FileNotFoundError).
+        Raises a ValueError if the move is invalid (see Name.checkMove).
+        If moving a file fails the files already moved are moved back before the error is raised.
+
+        Returns the mapping from old to new names.
+        """
+        Name.checkMove(src, to)
+        mapping = {
+            str(n): str(n.moved(src, to)) for n in self.listNames() if n.isUnder(src)
+        }
+        if len(mapping) == 0:
+            raise FileNotFoundError()
+        for new_name in mapping.values():
+            if os.path.exists(self.getPath(Name.fromStr(new_name))):
+                raise FileExistsError()
+        moved = []
+        try:
+            for old_name, new_name in mapping.items():
+                old_path = self.getPath(Name.fromStr(old_name))
+                new_path = self.getPath(Name.fromStr(new_name))
+                os.rename(old_path, new_path)
+                moved.append((old_path, new_path))
+        except OSError:
+            for old_path, new_path in reversed(moved):
+                os.rename(new_path, old_path)
+            raise
+        return mapping
+
+    @timed("file io")
+    def rewriteLinks(self, names: List[str], mapping: Dict[str, str]) -> List[str]:
+        """Rewrites the [[links]] in the named thoughts, according to mapping.
+
+        Returns the names of the thoughts that were changed. Missing files are skipped.
+        """
+        import re
+
+        link_re = re.compile(r"\[\[(.*?)\]\]")
+
+        def replace(match):
+            return "[[" + mapping.get(match.group(1), match.group(1)) + "]]"
+
+        changed = []
+        for name in names:
+            path = self.getPath(Name.fromStr(name))
+            if not os.path.exists(path):
+                continue
+            with open(path, "r") as thought_file:
+                text = thought_file.read()
+            new_text = link_re.sub(replace, text)
+            if new_text != text:
+                with open(path, "w") as thought_file:
+                    thought_file.write(new_text)
+                changed.append(name)
+        return changed
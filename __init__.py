@@ -1,10 +1,44 @@
-from .Name import Name
-from .Link import Link
-from .Tag import Tag
-from .Thought import Thought
-from .ThoughtBox import ThoughtBox
-from .cli import parse
+import sys
+import types
 
 __doc__ = "A module for managing a thoughtbox database and files."
 
-__all__ = ["Name", "Link", "Tag", "Thought", "ThoughtBox"]
+__all__ = ["Name", "Link", "Tag", "Thought", "ThoughtBox", "AsyncThoughtBox", "AsyncThoughtBoxDir"]
+
+# The public names are imported lazily, on first use, so that importing the package
+# (and running the command line tools) does not import sqlite3, argparse and friends
+# unless they are needed.
+_LAZY = {
+    "Name": ".Name",
+    "Link": ".Link",
+    "Tag": ".Tag",
+    "Thought": ".Thought",
+    "ThoughtBox": ".ThoughtBox",
+    "AsyncThoughtBox": ".AsyncThoughtBox",
+    "AsyncThoughtBoxDir": ".AsyncThoughtBoxDir",
+    "parse": ".cli",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+
+        return getattr(importlib.import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_LAZY.keys()))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a submodule binds it on the package, which would hide the class of the same
+        # name.
+        if name in _LAZY and isinstance(value, types.ModuleType):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
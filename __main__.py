@@ -1,3 +1,14 @@
-from pythoughts.cli import parse
+import time
 
-parse()
+_start = time.perf_counter()
+
+from pythoughts import client
+
+# A command forwarded to a running server only needs the client.
+if not client.forward_command():
+    from pythoughts.cli import run
+    from pythoughts import timing
+
+    timing.record_import(time.perf_counter() - _start)
+
+    run()
@@ -0,0 +1,147 @@
+"""The parts the benchmarks share: the generated boxes they run on, the command line, and the
+comparison with a baseline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+
+from typing import Callable, Dict, List
+
+from . import synthetic
+from ..Tag import Tag
+from ..ThoughtBox import ThoughtBox
+
+# The number of thoughts the single thought operations are run on.
+SAMPLE = 2000
+
+# The default scales, in thoughts.
+SCALES = [10000, 100000, 1000000]
+
+
+class Box:
+    """A generated box: a database holding its thoughts, and the files of a sample of them.
+
+    The thoughts are streamed into the database as they are generated, so only the sample is kept
+    in memory, with the names (the generator holds those anyway).
+    """
+
+    def __init__(self, directory: str, count: int, seed: int):
+        self.directory = directory
+        self.count = count
+        self.names = []
+        self.sample = []
+        self.middle = None
+        self.files = os.path.join(directory, "files")
+        os.mkdir(self.files)
+        self.database = os.path.join(directory, "box.db")
+        self.tb = ThoughtBox(self.database, explicitly_create_tables=True)
+
+        step = max(1, count // SAMPLE)
+        tag_counts: Dict[str, int] = {}
+        with self.tb.transaction():
+            for i, thought in enumerate(synthetic.thoughts(count, seed)):
+                self.tb.addOrUpdate(thought)
+                self.names.append(thought.name)
+                if i % step == 0 and len(self.sample) < SAMPLE:
+                    self.sample.append(thought)
+                if i == count // 2:
+                    self.middle = thought.name
+                for tag in thought.tags:
+                    tag_counts[tag.title] = tag_counts.get(tag.title, 0) + 1
+        self.common_tag = Tag.fromStr(max(tag_counts, key=tag_counts.get)) if tag_counts else None
+
+        self.texts = [synthetic.to_text(t).split("\n") for t in self.sample]
+        for thought in self.sample:
+            with open(os.path.join(self.files, f"{thought.name}.tb"), "w") as f:
+                f.write(synthetic.to_text(thought))
+
+
+def compare(
+    results: Dict,
+    baseline: Dict,
+    tolerance: float,
+    measurements: List[str],
+    show: Callable[[float], str],
+) -> List[str]:
+    """Returns a line for each of the measurements of each operation, at each scale, that is in both
+    results, marked REGRESSION if it is more than tolerance (a fraction) larger than the baseline.
+    show formats a measurement.
+    """
+    report = []
+    for scale, operations in results["results"].items():
+        for operation, result in operations.items():
+            before = baseline.get("results", {}).get(scale, {}).get(operation)
+            if before is None:
+                continue
+            for measurement in measurements:
+                if not before.get(measurement):
+                    continue
+                ratio = result[measurement] / before[measurement]
+                mark = "REGRESSION" if ratio > 1 + tolerance else "ok"
+                report.append(
+                    f"{scale:>8} {operation:<24} {measurement:<8}"
+                    f" {show(before[measurement])} -> {show(result[measurement])}"
+                    f"  x{ratio:.2f}  {mark}"
+                )
+    return report
+
+
+def argument_parser(prog: str, description: str, operations: List[str]) -> argparse.ArgumentParser:
+    """Returns a parser for the options every benchmark has."""
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=description,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", choices=operations, help="The operations to run.")
+    parser.add_argument("--output", help="The file to write the json results to.")
+    parser.add_argument("--baseline", help="A previous --output to compare with.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="The fraction worse than the baseline that counts as a regression.",
+    )
+    return parser
+
+
+def run(
+    args: argparse.Namespace,
+    run_scale: Callable[[int], Dict[str, Dict]],
+    print_result: Callable[[str, Dict], None],
+    compare_results: Callable[[Dict, Dict, float], List[str]],
+) -> int:
+    """Runs run_scale at each of the scales in args, printing each operation's result, then writes
+    and compares the results as the options ask.
+    Returns the exit code: 1 if there is a regression, otherwise 0.
+    """
+    results = {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": {},
+    }
+    for scale in args.scales:
+        print(f"{scale} thoughts:", flush=True)
+        results["results"][str(scale)] = run_scale(scale)
+        for operation, result in results["results"][str(scale)].items():
+            print_result(operation, result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report = compare_results(results, baseline, args.tolerance)
+        print("\n".join(report))
+        if any(line.endswith("REGRESSION") for line in report):
+            return 1
+    return 0
@@ -0,0 +1,151 @@
+"""Measures the memory used by the listing and parsing operations on generated boxes of increasing
+size.
+
+Run from the directory containing the package:
+    python -m pythoughts.benchmarks.memory [--scales 10000 100000 1000000] [--output FILE]
+        [--baseline FILE] [--tolerance 0.2] [--only OPERATION ...]
+
+Each operation is run once on a box of each scale (see harness) under tracemalloc, which reports:
+- peak: the most memory the operation had allocated at once while it ran.
+- retained: the memory it had still allocated once it returned, which is mostly its result.
+The result is also broken down by object type: the number and (shallow) bytes of the objects of each
+type reachable from it. Memory sqlite allocates itself is not traced.
+The results are written as json to --output. With --baseline the results are compared with a
+previous output, and this exits with an error if the peak or retained memory of any operation grew
+more than --tolerance.
+"""
+
+import gc
+import sys
+import tempfile
+import tracemalloc
+
+from typing import Any, Callable, Dict, List
+
+from . import harness
+from .harness import Box
+from ..Thought import Thought
+from ..ThoughtBoxDir import ThoughtBoxDir
+
+
+def _list_thoughts(box: Box) -> Any:
+    return box.tb.listThoughts()
+
+
+def _list_thoughts_by_tag(box: Box) -> Any:
+    return box.tb.listThoughtsByTag()
+
+
+def _read(box: Box) -> Any:
+    tbd = ThoughtBoxDir(box.files)
+    return [tbd.read(thought.name) for thought in box.sample]
+
+
+def _parse(box: Box) -> Any:
+    return [Thought.parse(lines, thought.name) for thought, lines in zip(box.sample, box.texts)]
+
+
+OPERATIONS: Dict[str, Callable[[Box], Any]] = {
+    "listThoughts": _list_thoughts,
+    "listThoughtsByTag": _list_thoughts_by_tag,
+    "ThoughtBoxDir.read": _read,
+    "Thought.parse": _parse,
+}
+
+
+def footprint(obj: Any) -> Dict[str, Dict[str, int]]:
+    """Returns the count and shallow size in bytes of the objects of each type reachable from obj.
+    Objects reached more than once are counted once. Classes, and anything reachable only from them,
+    are not.
+    """
+    types: Dict[str, Dict[str, int]] = {}
+    seen = set()
+    stack = [obj]
+    while len(stack) > 0:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, type):
+            continue
+        seen.add(id(o))
+        entry = types.setdefault(type(o).__name__, {"count": 0, "bytes": 0})
+        entry["count"] += 1
+        entry["bytes"] += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(o, "__dict__"):
+            stack.append(o.__dict__)
+    return types
+
+
+def measure(operation: Callable[[Box], Any], box: Box) -> Dict:
+    """Runs an operation under tracemalloc. Returns its peak and retained bytes, and its result's
+    footprint."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = operation(box)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    types = footprint(result)
+    return {
+        "peak": peak,
+        "retained": retained,
+        "items": len(result),
+        "types": dict(sorted(types.items(), key=lambda t: -t[1]["bytes"])),
+    }
+
+
+def run_scale(count: int, operations: List[str], seed: int = 0) -> Dict[str, Dict]:
+    """Measures the operations on a generated box of count thoughts."""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        box = Box(directory, count, seed)
+        for operation in operations:
+            results[operation] = measure(OPERATIONS[operation], box)
+        box.tb.conn.close()
+    return results
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Returns a line for the peak and retained memory of each operation, at each scale, that is in
+    both results, marked REGRESSION if it is more than tolerance (a fraction) larger than the
+    baseline.
+    """
+    return harness.compare(
+        results,
+        baseline,
+        tolerance,
+        ["peak", "retained"],
+        lambda size: f"{size / 1024:10.1f} KiB",
+    )
+
+
+def main(sys_args=None) -> int:
+    parser = harness.argument_parser(
+        "python -m pythoughts.benchmarks.memory", __doc__, list(OPERATIONS)
+    )
+    parser.add_argument("--types", type=int, default=5, help="The number of object types to print.")
+    args = parser.parse_args(sys_args)
+
+    def print_result(operation: str, result: Dict):
+        print(
+            f"    {operation:<20} peak {result['peak'] / 1024:10.1f} KiB"
+            f"  retained {result['retained'] / 1024:10.1f} KiB  {result['items']:8d} items"
+        )
+        for name, entry in list(result["types"].items())[: args.types]:
+            print(
+                f"        {name:<16} {entry['count']:9d} objects"
+                f" {entry['bytes'] / 1024:10.1f} KiB"
+            )
+
+    operations = args.only or list(OPERATIONS)
+    return harness.run(
+        args, lambda scale: run_scale(scale, operations, args.seed), print_result, compare
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Measures the start up time of the command line tools.
+
+Run from the directory containing the package:
+    python -m pythoughts.benchmarks.startup [--runs N] [--budget MS]
+
+Each command is run in a fresh interpreter, timed, and the modules it imports are listed
+(using python -X importtime). This exits with an error if a command is slower than the budget,
+or imports a module that it should only load on demand.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Dict, List
+
+PACKAGE = os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules which each command should not import.
+NOT_IMPORTED = {
+    "help": ["sqlite3", "socket", "json", "dataclasses"],
+    "create": ["sqlite3", "socket", "json", "dataclasses"],
+    "read": ["socket"],
+    "write": ["socket"],
+}
+
+
+def _command_args(command: str, box_dir: str, database: str) -> List[str]:
+    if command == "help":
+        return ["help"]
+    if command == "create":
+        return ["create", "--box", box_dir]
+    if command == "read":
+        return ["read", "--by", "name", "--database", database]
+    if command == "write":
+        return ["write", "1", "title", "--tag", "a", "--database", database]
+    raise ValueError(command)
+
+
+def _environment() -> Dict[str, str]:
+    env = dict(os.environ)
+    # Never forward to a running server, that would time the server instead.
+    env["PYTHOUGHTS_SOCKET"] = ""
+    return env
+
+
+def imported_modules(args: List[str]) -> Dict[str, int]:
+    """Runs pythoughts with args in a fresh interpreter.
+    Returns the cumulative import time (in microseconds) of each module it imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", PACKAGE] + args,
+        cwd=PACKAGE_PARENT,
+        env=_environment(),
+        capture_output=True,
+        text=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative.strip())
+    return modules
+
+
+def time_command(args: List[str], runs: int) -> float:
+    """Returns the best wall clock time, in milliseconds, of running pythoughts with args."""
+    return _best_time([sys.executable, "-m", PACKAGE] + args, runs)
+
+
+def _best_time(command: List[str], runs: int) -> float:
+    best = None
+    for i in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            command, cwd=PACKAGE_PARENT, env=_environment(), capture_output=True
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(sys_args=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m pythoughts.benchmarks.startup", description=__doc__
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command.")
+    parser.add_argument(
+        "--budget", type=float, default=None, help="Maximum milliseconds per command."
+    )
+    args = parser.parse_args(sys_args)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as box_dir:
+        database = os.path.join(box_dir, "box.db")
+        interpreter = _best_time([sys.executable, "-c", "pass"], args.runs)
+        print(f"interpreter: {interpreter:.1f} ms")
+        for command in NOT_IMPORTED:
+            command_args = _command_args(command, box_dir, database)
+            elapsed = time_command(command_args, args.runs)
+            modules = imported_modules(command_args)
+            own = sorted(
+                [(t, m) for m, t in modules.items() if m.startswith(PACKAGE)],
+                reverse=True,
+            )
+            print(f"{command}: {elapsed:.1f} ms, {len(modules)} modules imported")
+            for t, m in own:
+                print(f"    {m}: {t / 1000:.1f} ms")
+
+            unwanted = [m for m in NOT_IMPORTED[command] if m in modules]
+            if len(unwanted) > 0:
+                print(f"    imports {', '.join(unwanted)}")
+                failed = True
+            if args.budget is not None and elapsed > args.budget:
+                print(f"    over budget of {args.budget:.1f} ms")
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Times the core operations on generated boxes of increasing size.
+
+Run from the directory containing the package:
+    python -m pythoughts.benchmarks.suite [--scales 10000 100000 1000000] [--output FILE]
+                                          [--baseline FILE] [--tolerance 0.2] [--only OPERATION ...]
+
+Each operation is run --repeat times on a box of each scale (see synthetic) and the best time is
+kept. Operations on single thoughts are run on a sample of the box, so large scales stay quick.
+The results are written as json to --output. With --baseline the results are compared with a
+previous output, and this exits with an error if any operation is more than --tolerance slower.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from typing import Callable, Dict, List
+
+from . import harness
+from .harness import Box
+from ..Name import Name
+from ..Thought import Thought
+from ..ThoughtBox import ThoughtBox
+from ..ThoughtBoxDir import ThoughtBoxDir
+
+
+def _add_or_update(box: Box) -> int:
+    database = os.path.join(box.directory, "write.db")
+    if os.path.exists(database):
+        os.remove(database)
+    tb = ThoughtBox(database, explicitly_create_tables=True)
+    with tb.transaction():
+        for thought in box.sample:
+            tb.addOrUpdate(thought)
+    tb.conn.close()
+    return len(box.sample)
+
+
+def _parse(box: Box) -> int:
+    for thought, lines in zip(box.sample, box.texts):
+        Thought.parse(lines, thought.name)
+    return len(box.sample)
+
+
+def _read(box: Box) -> int:
+    tbd = ThoughtBoxDir(box.files)
+    for thought in box.sample:
+        tbd.read(thought.name)
+    return len(box.sample)
+
+
+def _create_new(box: Box) -> int:
+    with tempfile.TemporaryDirectory() as directory:
+        tbd = ThoughtBoxDir(directory)
+        name = Name.fromStr("1")
+        for _ in range(len(box.sample)):
+            name = tbd.createNew(name)
+    return len(box.sample)
+
+
+def _sort_names(box: Box) -> int:
+    names = list(reversed(box.names))
+    sorted(names)
+    return len(names)
+
+
+def _list_thoughts(box: Box) -> int:
+    return len(box.tb.listThoughts())
+
+
+def _list_thoughts_page(box: Box) -> int:
+    return len(box.tb.listThoughts(after=box.middle, limit=100))
+
+
+def _list_thoughts_tag(box: Box) -> int:
+    return len(box.tb.listThoughts(tags=[box.common_tag]))
+
+
+def _list_names_by_tag(box: Box) -> int:
+    return sum(count for count, _ in box.tb.listNamesByTag().values())
+
+
+def _graph_snapshot(box: Box) -> int:
+    return box.tb.graphSnapshot().link_count
+
+
+OPERATIONS: Dict[str, Callable[[Box], int]] = {
+    "Thought.parse": _parse,
+    "ThoughtBoxDir.read": _read,
+    "ThoughtBoxDir.createNew": _create_new,
+    "Name sort": _sort_names,
+    "addOrUpdate": _add_or_update,
+    "listThoughts": _list_thoughts,
+    "listThoughts page": _list_thoughts_page,
+    "listThoughts tag": _list_thoughts_tag,
+    "listNamesByTag": _list_names_by_tag,
+    "graphSnapshot": _graph_snapshot,
+}
+
+
+def run_scale(count: int, operations: List[str], repeat: int, seed: int = 0) -> Dict[str, Dict]:
+    """Times the operations on a generated box of count thoughts.
+    Returns the best seconds, the number of items handled and the microseconds per item of each
+    operation.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        box = Box(directory, count, seed)
+        for operation in operations:
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                items = OPERATIONS[operation](box)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[operation] = {
+                "seconds": best,
+                "items": items,
+                "us_per_item": best * 1e6 / items if items else None,
+            }
+        box.tb.conn.close()
+    return results
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Returns a line for each operation, at each scale, that is in both results,
+    marked REGRESSION if it is more than tolerance (a fraction) slower than the baseline.
+    """
+    return harness.compare(
+        results, baseline, tolerance, ["seconds"], lambda seconds: f"{seconds * 1000:10.2f} ms"
+    )
+
+
+def _print_result(operation: str, result: Dict):
+    print(f"    {operation:<24} {result['seconds'] * 1000:10.2f} ms  {result['items']:8d} items")
+
+
+def main(sys_args=None) -> int:
+    parser = harness.argument_parser(
+        "python -m pythoughts.benchmarks.suite", __doc__, list(OPERATIONS)
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per operation.")
+    args = parser.parse_args(sys_args)
+
+    operations = args.only or list(OPERATIONS)
+    return harness.run(
+        args,
+        lambda scale: run_scale(scale, operations, args.repeat, args.seed),
+        _print_result,
+        compare,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Generates realistic, repeatable thought boxes of any size, for benchmarks.
+
+The same count and seed always give the same box:
+- names form a tree: about a third are top level, the rest are sub-thoughts of an earlier thought,
+  more often of a recent one, so there are deep chains as well as wide lists.
+- tags follow a Zipf like distribution over a vocabulary which grows with the box, 0 to 5 per
+  thought.
+- links (0 to 6 per thought) go to the parent or siblings, to popular thoughts (preferential
+  attachment) or to any earlier thought, and about 1% are broken.
+- content is a log-normally distributed number of lines of made up words, with the links inline.
+"""
+
+import math
+import os
+import random
+
+from typing import Iterator, List
+
+from ..Link import Link
+from ..Name import Name
+from ..Tag import Tag
+from ..Thought import Thought
+
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "an", "el", "is", "or", "un"]
+
+
+def _words(rng: random.Random, count: int) -> List[str]:
+    return [
+        "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 3))) for _ in range(count)
+    ]
+
+
+def names(count: int, seed: int = 0) -> List[Name]:
+    """Returns count hierarchical names, in the order they were created."""
+    rng = random.Random(seed)
+    result: List[Name] = []
+    last_child = {}
+    top = Name([])
+    for i in range(count):
+        if i == 0 or rng.random() < 0.3:
+            parent = top
+        elif rng.random() < 0.5:
+            parent = result[rng.randrange(max(0, i - 20), i)]
+        else:
+            parent = result[rng.randrange(i)]
+        key = str(parent)
+        if key in last_child:
+            name = last_child[key].next()
+        else:
+            first = "a" if len(parent.parts) > 0 and not parent.parts[-1].isalpha() else "1"
+            name = Name(parent.parts + [first])
+        last_child[key] = name
+        result.append(name)
+    return result
+
+
+def thoughts(count: int, seed: int = 0) -> Iterator[Thought]:
+    """Yields count thoughts, with names, titles, tags, links and content. See the module for the
+    shapes."""
+    rng = random.Random(seed)
+    all_names = names(count, seed)
+    strs = [str(n) for n in all_names]
+    index = {s: i for i, s in enumerate(strs)}
+    tag_count = max(10, int(2 * math.sqrt(count)))
+    tags = [f"{w}{i}" for i, w in enumerate(_words(rng, tag_count))]
+    # Zipf weights: the i-th tag is used about 1/(i+1) as often as the first.
+    tag_weights = [1.0 / (i + 1) for i in range(tag_count)]
+    vocabulary = _words(rng, 2000)
+    linked: List[str] = []
+
+    for i, name in enumerate(all_names):
+        str_name = strs[i]
+        thought_tags = sorted(set(rng.choices(tags, tag_weights, k=rng.randint(0, 5))))
+
+        targets = set()
+        for _ in range(rng.randint(0, 6) if i > 0 else 0):
+            r = rng.random()
+            if r < 0.01:
+                targets.add(f"{str_name}x{rng.randrange(1000)}")
+            elif r < 0.4:
+                parent = str(Name(name.parts[:-1]))
+                siblings = [s for s in (parent, strs[i - 1]) if s in index and s != str_name]
+                if siblings:
+                    targets.add(rng.choice(siblings))
+            elif r < 0.7 and linked:
+                targets.add(rng.choice(linked))
+            else:
+                targets.add(strs[rng.randrange(i)])
+        targets.discard(str_name)
+        thought_links = sorted(targets)
+        linked.extend(thought_links)
+
+        line_count = min(200, max(1, int(rng.lognormvariate(1.5, 0.8))))
+        content = [
+            " ".join(rng.choices(vocabulary, k=rng.randint(4, 16))) for _ in range(line_count)
+        ]
+        for j, target in enumerate(thought_links):
+            content[j % line_count] += f" [[{target}]]"
+
+        yield Thought(
+            name=name,
+            title=" ".join(rng.choices(vocabulary, k=rng.randint(2, 6))),
+            tags=[Tag(id=0, title=t) for t in thought_tags],
+            links=[Link(source=name, target=l) for l in thought_links],
+            content=content,
+            sources=[],
+        )
+
+
+def to_text(thought: Thought) -> str:
+    """Returns the contents of the file of a thought, in the format Thought.parse reads."""
+    lines = [f"# {thought.title}", ""]
+    lines.extend(thought.content)
+    lines.extend(["", "# sources", ""])
+    lines.extend(thought.sources)
+    lines.extend(["# tags", ", ".join(f"#{t.title}" for t in thought.tags), ""])
+    return "\n".join(lines)
+
+
+def write_box(directory: str, count: int, seed: int = 0) -> List[Name]:
+    """Writes the thought files of a generated box into directory. Returns their names."""
+    written = []
+    for thought in thoughts(count, seed):
+        with open(os.path.join(directory, f"{thought.name}.tb"), "w") as f:
+            f.write(to_text(thought))
+        written.append(thought.name)
+    return written
@@ -1,23 +1,156 @@
-import argparse
 import logging
+import os
 import sys
+import time
 
-from .ThoughtBoxDir import ThoughtBoxDir
-from .Name import Name
-from .Link import Link
-from .Tag import Tag
-from .Thought import Thought
-from .ThoughtBox import ThoughtBox
+from contextlib import contextmanager, ExitStack
 
+from .client import command_name as _command_name
+from .client import forward_command, server_socket_path, LOCAL_COMMANDS
+
+# The models, databases and server are imported where they are used,
+# so that a command only pays for importing what it needs.
+
+
+def parse(sys_args=None, session=None):
+    """Parses and runs a command.
+
+    If a server (see Serve) is running the command is forwarded to it,
+    otherwise it is run in this process.
+    If a session is given the command is always run in this process, using that session.
+    """
+    if session is None and forward_command(sys_args):
+        return
+    run(sys_args, session)
+
+
+class Session:
+    """Provides the ThoughtBox and ThoughtBoxDir objects used by the commands.
+
+    Normally every command opens its own.
+    If keep_open is true they are kept and shared between commands (by database path and directory),
+    so that long running processes do not reconnect to the database for every command,
+    and the boxes cache the results of repeated reads.
+    """
+
+    def __init__(self, keep_open=False):
+        self.keep_open = keep_open
+        self.boxes = {}
+        self.dirs = {}
+        # The ExitStacks of the open transactions, outermost first.
+        self._transactions = []
+        # Statements taking longer than this are logged, see SqlMonitor.
+        self.slow_sql_seconds = None
+
+    def box(self, database_path: str) -> "ThoughtBox":
+        from . import timing
+
+        with timing.phase("import"):
+            from .ThoughtBox import ThoughtBox
+
+        if not self.keep_open:
+            return self._watch(ThoughtBox(database_path))
+        key = os.path.abspath(database_path)
+        if key not in self.boxes:
+            self.boxes[key] = ThoughtBox(database_path, cache_size=256)
+            for stack in self._transactions:
+                stack.enter_context(self.boxes[key].transaction())
+        return self._watch(self.boxes[key])
+
+    def _watch(self, tb: "ThoughtBox") -> "ThoughtBox":
+        """Logs the slow statements run on the box, if slow_sql_seconds is set."""
+        if self.slow_sql_seconds is None:
+            if tb.conn.monitor is not None:
+                tb.stopInstrumenting()
+        elif tb.conn.monitor is None or tb.conn.monitor.slow_seconds != self.slow_sql_seconds:
+            from .SqlMonitor import SqlMonitor
+
+            tb.instrument(SqlMonitor(slow_seconds=self.slow_sql_seconds))
+        return tb
+
+    @contextmanager
+    def transaction(self):
+        """Groups the writes to every box used inside the with block into one transaction per box.
+        This requires keep_open. Transactions can be nested, see ThoughtBox.transaction.
+        """
+        with ExitStack() as stack:
+            for box in self.boxes.values():
+                stack.enter_context(box.transaction())
+            self._transactions.append(stack)
+            try:
+                yield self
+            finally:
+                self._transactions.pop()
+
+    def dir(self, thought_dir: str) -> "ThoughtBoxDir":
+        from . import timing
+
+        with timing.phase("import"):
+            from .ThoughtBoxDir import ThoughtBoxDir
+
+        if not self.keep_open:
+            return ThoughtBoxDir(thought_dir)
+        key = os.path.abspath(thought_dir)
+        if key not in self.dirs:
+            self.dirs[key] = ThoughtBoxDir(key)
+        return self.dirs[key]
+
+
+def run(sys_args=None, session=None):
+    """Parses and runs a command in this process."""
+    start = time.perf_counter()
+    import argparse
+
+    if session is None:
+        session = Session()
+
+    if sys_args is None:
+        sys_args = sys.argv[1:]
 
-def parse(sys_args=None):
     main_parser = argparse.ArgumentParser(
         prog="pythoughts",
         description="Tools for managing a thoughtbox database and files.",
     )
+    main_parser.add_argument(
+        "--profile",
+        nargs=1,
+        action="store",
+        choices=["summary", "cprofile"],
+        help=(
+            "Profile the command."
+            " summary prints the time spent importing, parsing arguments, in sql, file io"
+            " and parsing thoughts to stderr."
+            " cprofile writes python profiler stats to --profile-output."
+            " This can also be set with $PYTHOUGHTS_PROFILE, as summary, cprofile or cprofile:FILE."
+        ),
+    )
+    main_parser.add_argument(
+        "--slow-sql",
+        nargs=1,
+        type=float,
+        action="store",
+        metavar="MS",
+        help=(
+            "Log the SQL statements taking at least this many milliseconds as warnings,"
+            " with their query plans."
+            " This can also be set with $PYTHOUGHTS_SLOW_SQL."
+        ),
+    )
+    main_parser.add_argument(
+        "--profile-output",
+        nargs=1,
+        action="store",
+        default=["pythoughts.prof"],
+        help="The file to write --profile=cprofile stats to. Defaults to pythoughts.prof.",
+    )
     subparsers = main_parser.add_subparsers(dest="command", required=True)
 
-    cmds = [Create, Read, Write, Parse, Rename, Delete]
+    # Only build the parser of the command being run, unless help (or an error message) may need
+    # them all.
+    command_name = _command_name(sys_args)
+    cmds = [cmd for cmd in COMMANDS if _name(cmd) == command_name]
+    if len(cmds) == 0:
+        cmds = COMMANDS
     parsers = []
 
     for cmd in cmds:
@@ -36,9 +169,56 @@ def parse(sys_args=None):
         main_parser.print_help()
         sys.exit(0)
 
+    slow_sql = args.slow_sql[0] if args.slow_sql else os.environ.get("PYTHOUGHTS_SLOW_SQL")
+    session.slow_sql_seconds = None if slow_sql in (None, "") else float(slow_sql) / 1000
+
+    profile = args.profile[0] if args.profile else os.environ.get("PYTHOUGHTS_PROFILE")
+    if not profile:
+        _dispatch(cmds, args, session)
+        return
+
+    from . import timing
+
+    if timing.enabled():
+        # Already profiling the enclosing command, for example a batch.
+        _dispatch(cmds, args, session)
+        return
+
+    timing.enable()
+    timing.add("arguments", time.perf_counter() - start)
+    try:
+        if profile == "summary":
+            _dispatch(cmds, args, session)
+        elif profile.startswith("cprofile"):
+            import cProfile
+
+            output = profile[len("cprofile:") :] if ":" in profile else args.profile_output[0]
+            profiler = cProfile.Profile()
+            try:
+                profiler.runcall(_dispatch, cmds, args, session)
+            finally:
+                profiler.dump_stats(output)
+                sys.stderr.write(f"Wrote profile to {output}\n")
+        else:
+            logging.error(f"Unknown profile mode {profile}, use summary or cprofile.")
+            _dispatch(cmds, args, session)
+    finally:
+        if profile == "summary":
+            seconds = time.perf_counter() - start
+            seconds += timing.totals().get("import", [0.0])[0]
+            sys.stderr.write(timing.summary(seconds))
+        timing.disable()
+
+
+def _name(cmd) -> str:
+    """The command line name of a command class: its name attribute or its lower case class name."""
+    return getattr(cmd, "name", cmd.__name__.lower())
+
+
+def _dispatch(cmds, args, session):
     for cmd in cmds:
-        if cmd.__name__.lower() == args.command:
-            cmd(args).run()
+        if _name(cmd) == args.command:
+            cmd(args, session).run()
 
 
 class Create:
@@ -85,11 +265,14 @@ class Create:
         )
         return parser
 
-    def __init__(self, args):
+    def __init__(self, args, session=None):
         self.args = args
+        self.session = session or Session()
 
     def run(self):
-        tbd = ThoughtBoxDir(self.args.box[0])
+        from .Name import Name
+
+        tbd = self.session.dir(self.args.box[0])
         arg_name = self.args.name[0].strip()
         name = Name.fromStr(arg_name)
         new_name = tbd.createNew(name, force_override=self.args.overwrite)
@@ -109,12 +292,13 @@ class Read:
             nargs=1,
             required=True,
             action="store",
-            choices=["name", "tag", "detail"],
+            choices=["name", "tag", "detail", "count"],
             help=(
                 "Display the toughts as: "
                 " a list (--by=name),"
                 " grouped by tags (--by=tag), "
-                " with details (--by=detail)."
+                " with details (--by=detail),"
+                " as an outline of subtree sizes (--by=count)."
                 ""
                 "--by=name uses:"
                 " name1: title1"
@@ -131,6 +315,10 @@ class Read:
                 " name2: title2"
                 " tags: tag1, tag3"
                 " links: link2, link3"
+                ""
+                "--by=count uses (for the sub-names of --under):"
+                " name1a: count1"
+                " name1b: count2"
             ),
         )
         parser.add_argument(
@@ -163,6 +351,74 @@ class Read:
                 " given, display all the thoughts."
             ),
         )
+        parser.add_argument(
+            "-u",
+            "--under",
+            nargs=1,
+            action="store",
+            help=(
+                "Display only the given thought and its sub-thoughts. If not given,"
+                " display all the thoughts."
+            ),
+        )
+        parser.add_argument(
+            "-a",
+            "--after",
+            nargs=1,
+            action="store",
+            help="Display only the thoughts with names after this one.",
+        )
+        parser.add_argument(
+            "--limit",
+            nargs=1,
+            type=int,
+            action="store",
+            help=(
+                "Display at most this many thoughts. With --after this pages through the thoughts:"
+                " the next page is --after the last name displayed."
+            ),
+        )
+        parser.add_argument(
+            "--component",
+            nargs=1,
+            type=int,
+            action="store",
+            help="Display only the thoughts in this component (see the components command).",
+        )
+        parser.add_argument(
+            "--per-tag",
+            nargs=1,
+            type=int,
+            action="store",
+            help=(
+                "With --by=tag, display at most this many names for each tag, followed by"
+                " the number of thoughts with the tag if there are more."
+            ),
+        )
+        parser.add_argument(
+            "-w",
+            "--where",
+            nargs=1,
+            action="store",
+            help=(
+                "Display only the thoughts matching this query,"
+                " made of #tag, ->name (links to name),"
+                ' & (and), | (or), ! (not) and brackets. For example: "#a & #b & !#c & ->4".'
+            ),
+        )
+        parser.add_argument(
+            "-f",
+            "--format",
+            nargs=1,
+            action="store",
+            default=["text"],
+            choices=["text", "jsonl", "tsv"],
+            help=(
+                "The output format. text (the default) is logged as described for --by."
+                " jsonl and tsv are written to stdout as the thoughts are read, one per line,"
+                " as json objects or tab separated fields (with lists joined by commas)."
+            ),
+        )
         parser.add_argument(
             "-d",
             "--database",
@@ -173,30 +429,121 @@ class Read:
         )
         return parser
 
-    def __init__(self, args):
+    def __init__(self, args, session=None):
         self.args = args
+        self.session = session or Session()
 
     def run(self):
-        tb = ThoughtBox(self.args.database[0])
+        from .Name import Name
+        from .Tag import Tag
+
+        tb = self.session.box(self.args.database[0])
         names = [Name.fromStr(n) for n in self.args.names or []]
         links = [Name.fromStr(l) for l in self.args.links or []]
         tags = [Tag.fromStr(t) for t in self.args.tags or []]
-        if self.args.by[0] == "tag":
-            result = tb.listThoughtsByTag(names=names, tags=tags, linked_to=links)
-            res_tags = sorted(result.keys(),  key=lambda t: t.title)
-            for tag in res_tags:
-                names = [t.name for t in result[tag]]
-                logging.info(f"{tag.title}: {', '.join(names)}")
+        under = Name.fromStr(self.args.under[0]) if self.args.under else None
+        after = Name.fromStr(self.args.after[0]) if self.args.after else None
+        limit = self.args.limit[0] if self.args.limit else None
+        component = self.args.component[0] if self.args.component else None
+        where = self.args.where[0] if self.args.where else None
+        if where is not None:
+            from . import query
+
+            try:
+                query.to_sql(where)
+            except ValueError as e:
+                logging.error(f"Invalid --where query: {e}")
+                sys.exit(1)
+        write_row = _row_writer(self.args.format[0])
+        if self.args.by[0] == "count":
+            counts = tb.subtreeCounts(under or Name([]))
+            for child, count in counts.items():
+                if write_row:
+                    write_row({"name": child, "count": count})
+                else:
+                    logging.info(f"{child}: {count}")
+        elif self.args.by[0] == "tag":
+            per_tag = self.args.per_tag[0] if self.args.per_tag else None
+            result = tb.listNamesByTag(
+                names=names,
+                tags=tags,
+                linked_to=links,
+                under=under,
+                after=after,
+                limit=limit,
+                component=component,
+                where=where,
+                per_tag=per_tag,
+            )
+            for title, (count, tag_names) in result.items():
+                if write_row:
+                    row = {"tag": title, "names": tag_names}
+                    if per_tag is not None:
+                        row["count"] = count
+                    write_row(row)
+                elif count > len(tag_names):
+                    logging.info(f"{title}: {', '.join(tag_names)}, ... ({count} in all)")
+                else:
+                    logging.info(f"{title}: {', '.join(tag_names)}")
         else:
-            result = tb.listThoughts(names=names, tags=tags, linked_to=links)
+            result = tb.iterThoughts(
+                names=names,
+                tags=tags,
+                linked_to=links,
+                under=under,
+                after=after,
+                limit=limit,
+                component=component,
+                where=where,
+            )
             detail = self.args.by[0] == "detail"
             for thought in result:
+                if write_row:
+                    row = {"name": thought.name, "title": thought.title}
+                    if detail:
+                        row["tags"] = sorted([t.title for t in thought.tags])
+                        row["links"] = sorted([l.target for l in thought.links])
+                    write_row(row)
+                    continue
                 logging.info(f"{thought.name}: {thought.title}")
                 if detail:
                     str_tags = sorted([t.title for t in thought.tags])
                     str_links = sorted([l.target for l in thought.links])
                     logging.info(f"tags: {', '.join(str_tags)}")
                     logging.info(f"links: {', '.join(str_links)}")
+        if write_row:
+            sys.stdout.flush()
+
+
+def _row_writer(out_format: str):
+    """Returns a function that writes a row (a dict) straight to stdout in the given format.
+    Returns None for the text format, which is written through logging.
+
+    jsonl writes each row as a json object on its own line.
+    tsv writes the values of each row separated by tabs, with lists joined by commas.
+    """
+    write = sys.stdout.write
+    if out_format == "jsonl":
+        import json
+
+        dumps = json.dumps
+
+        def write_json(row):
+            write(dumps(row) + "\n")
+
+        return write_json
+    elif out_format == "tsv":
+
+        def field(value):
+            if isinstance(value, list):
+                value = ",".join([str(v) for v in value])
+            return str(value).replace("\t", " ").replace("\n", " ")
+
+        def write_tsv(row):
+            write("\t".join([field(v) for v in row.values()]) + "\n")
+
+        return write_tsv
+    return None
 
 
 class Write:
@@ -237,11 +584,17 @@ class Write:
         )
         return parser
 
-    def __init__(self, args):
+    def __init__(self, args, session=None):
         self.args = args
+        self.session = session or Session()
 
     def run(self):
-        name = Name.fromStr(self.args.name)
+        from .Name import Name
+        from .Link import Link
+        from .Tag import Tag
+        from .Thought import Thought
+
+        name = Name.fromStr(self.args.name[0])
         links = [Link(name, Name.fromStr(l[0])) for l in self.args.link or []]
         tags = [Tag.fromStr(t[0]) for t in self.args.tag or []]
         title = " ".join(self.args.title)
@@ -249,12 +602,18 @@ class Write:
         t = Thought(
             name=name, title=title, tags=tags, links=links, content=[], sources=[]
         )
-        tb = ThoughtBox(self.args.database[0])
+        tb = self.session.box(self.args.database[0])
         tb.addOrUpdate(t)
 
 
 class Parse:
-    """Write and update thoughts to the database from disk."""
+    """Write and update thoughts to the database from disk.
+
+    Any number of thoughts can be given, as names, shell-style globs over the names
+    in the directory (such as "2*"), or ranges of names (such as 3a..3f), or --all.
+    The files are read concurrently and written to the database in one transaction.
+    Files that fail to parse are reported and skipped, and the exit code is then 1.
+    """
 
     @staticmethod
     def parser(subparsers):
@@ -262,7 +621,15 @@ class Parse:
             "parse", help=Parse.__doc__, description=Parse.__doc__
         )
         parser.add_argument(
-            "name", nargs=1, action="store", help="The name of the thought to update."
+            "name",
+            nargs="*",
+            action="store",
+            help="The names, globs or ranges of the thoughts to update.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Update all the thoughts in the directory.",
         )
         parser.add_argument(
             "-d",
@@ -281,22 +648,59 @@ class Parse:
             required=True,
             help="The name of the ThoughtBox directory to use.",
         )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            nargs=1,
+            type=int,
+            action="store",
+            default=[8],
+            help="The number of files to read at once.",
+        )
         return parser
 
-    def __init__(self, args):
+    def __init__(self, args, session=None):
         self.args = args
+        self.session = session or Session()
 
     def run(self):
-        tbd = ThoughtBoxDir(self.args.box[0])
-        name = Name.fromStr(self.args.name)
-        thought = tbd.read(name)
+        from . import timing
 
-        tb = ThoughtBox(self.args.database[0])
-        tb.addOrUpdate(thought)
+        tbd = self.session.dir(self.args.box[0])
+        if self.args.all:
+            names = tbd.listNames()
+        else:
+            names = tbd.findNames(self.args.name)
+        if len(names) == 0:
+            logging.error("No thoughts to parse.")
+            sys.exit(1)
+
+        with timing.phase("file io"):
+            results = tbd.readMany(names, workers=self.args.jobs[0])
+
+        tb = self.session.box(self.args.database[0])
+        failed = 0
+        with tb.transaction():
+            for name, result in results:
+                if isinstance(result, Exception):
+                    failed += 1
+                    if isinstance(result, FileNotFoundError):
+                        logging.error(f"Failed to parse {name}, file not found.")
+                    else:
+                        logging.error(f"Failed to parse {name}: {result}")
+                    continue
+                tb.addOrUpdate(result)
+        if failed > 0:
+            logging.error(f"Parsed {len(results) - failed} of {len(results)} thoughts.")
+            sys.exit(1)
 
 
 class Rename:
-    """Rename thoughts in the database and on disk."""
+    """Rename thoughts in the database and on disk.
+
+    With --subtree the thought and all of its sub-thoughts are moved, so that
+    renaming 2 to 5c1 also renames 2a to 5c1a, 2a1 to 5c1a1, and so on.
+    """
 
     @staticmethod
     def parser(subparsers):
@@ -319,6 +723,22 @@ class Rename:
             required=True,
             help="The new name of the thought.",
         )
+        parser.add_argument(
+            "-s",
+            "--subtree",
+            action="store_true",
+            help="Move the thought and all of its sub-thoughts.",
+        )
+        parser.add_argument(
+            "-u",
+            "--update-links",
+            action="store_true",
+            help=(
+                "Rewrite the links into the moved thoughts (on disk and in the database)."
+                " Normally they are left as is and listed as needing updating."
+                " Only used with --subtree."
+            ),
+        )
         parser.add_argument(
             "-b",
             "--box",
@@ -338,15 +758,22 @@ class Rename:
         )
         return parser
 
-    def __init__(self, args):
+    def __init__(self, args, session=None):
         self.args = args
+        self.session = session or Session()
 
     def run(self):
+        from .Name import Name
+
         dargs = vars(self.args)
-        tbd = ThoughtBoxDir(dargs["box"][0])
+        tbd = self.session.dir(dargs["box"][0])
         src = Name.fromStr(dargs['from'][0])
         to = Name.fromStr(dargs["to"][0])
 
+        if dargs["subtree"]:
+            self.runSubtree(tbd, src, to)
+            return
+
         try:
             tbd.rename(src, to)
         except FileNotFoundError:
@@ -355,12 +782,54 @@ class Rename:
         except FileExistsError:
             logging.error(f'Failed to rename {str(src)} to {str(to)}, file already exists.')
             return
-        tb = ThoughtBox(dargs["database"][0])
+        tb = self.session.box(dargs["database"][0])
         needs_updating = tb.rename(src, to)
         logging.info(f"Successfully renamed {src} to {to}.")
         logging.info(f"The following thoughts need updating:")
         logging.info(f"{', '.join(needs_updating)}")
 
+    def runSubtree(self, tbd, src, to):
+        tb = self.session.box(self.args.database[0])
+        update_links = self.args.update_links
+        # The database is checked and moved first, in a transaction which is rolled back if the
+        # files can not be moved (moveSubtree moves back any files it had moved), so that a failure
+        # on either side leaves both as they were.
+        try:
+            with tb.transaction():
+                _, needs_updating = tb.moveSubtree(src, to, update_links=update_links)
+                mapping = tbd.moveSubtree(src, to)
+        except ValueError as e:
+            logging.error(f"Failed to move {str(src)}: {e}")
+            return
+        except FileNotFoundError:
+            logging.error(f'Failed to move {str(src)}, file not found.')
+            return
+        except FileExistsError:
+            logging.error(f'Failed to move {str(src)} to {str(to)}, file already exists.')
+            return
+        except OSError as e:
+            logging.error(f"Failed to move {str(src)} to {str(to)}: {e}")
+            return
+        logging.info(f"Successfully moved {len(mapping)} thoughts from {src} to {to}.")
+        if update_links:
+            # The moves are committed by now, so a failure here can only be reported.
+            try:
+                changed = tbd.rewriteLinks(needs_updating, mapping)
+            except OSError as e:
+                logging.error(
+                    f"Failed to update the links in the files: {e}."
+                    " The links in the database point at the new names,"
+                    " so the links in these thoughts need updating:"
+                )
+                logging.error(f"{', '.join(needs_updating)}")
+                return
+            if len(changed) > 0:
+                logging.info(f"Updated the links in:")
+                logging.info(f"{', '.join(changed)}")
+        elif len(needs_updating) > 0:
+            logging.info(f"The following thoughts need updating:")
+            logging.info(f"{', '.join(needs_updating)}")
+
 
 class Delete:
     """Delete thoughts from the database and disk."""
@@ -392,12 +861,15 @@ class Delete:
         )
         return parser
 
-    def __init__(self, args):
+    def __init__(self, args, session=None):
         self.args = args
+        self.session = session or Session()
 
     def run(self):
-        tbd = ThoughtBoxDir(self.args.box[0])
-        name = Name.fromStr(self.args.name)
+        from .Name import Name
+
+        tbd = self.session.dir(self.args.box[0])
+        name = Name.fromStr(self.args.name[0])
 
         file_error = False
 
@@ -406,7 +878,7 @@ class Delete:
         except FileNotFoundError:
             file_error=True
 
-        tb = ThoughtBox(self.args.database[0])
+        tb = self.session.box(self.args.database[0])
         pointed_to = tb.delete(name)
 
         if file_error:
@@ -418,5 +890,627 @@ class Delete:
             logging.info(f"{', '.join(pointed_to)}")
 
 
+class Stats:
+    """Show aggregate metrics of the database: counts, broken links, link degrees, top tags and the
+    deepest name."""
+
+    @staticmethod
+    def parser(subparsers):
+        parser = subparsers.add_parser(
+            "stats", help=Stats.__doc__, description=Stats.__doc__
+        )
+        parser.add_argument(
+            "-d",
+            "--database",
+            nargs=1,
+            action="store",
+            required=True,
+            help="The name of the database to use.",
+        )
+        parser.add_argument(
+            "--top",
+            nargs=1,
+            type=int,
+            action="store",
+            default=[10],
+            help="The number of most used tags to show.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Write the metrics to stdout as a json object.",
+        )
+        return parser
+
+    def __init__(self, args, session=None):
+        self.args = args
+        self.session = session or Session()
+
+    def run(self):
+        tb = self.session.box(self.args.database[0])
+        stats = tb.stats(top_tags=self.args.top[0])
+        if self.args.json:
+            import json
+
+            sys.stdout.write(json.dumps(stats) + "\n")
+            sys.stdout.flush()
+            return
+
+        for key in ["thoughts", "tags", "links", "tag_links", "broken_links"]:
+            logging.info(f"{key}: {stats[key]}")
+        for key in ["out_degree", "in_degree"]:
+            degrees = [f"{degree}: {count}" for degree, count in stats[key].items()]
+            logging.info(f"{key}: {', '.join(degrees)}")
+        top_tags = [f"{title} ({count})" for title, count in stats["top_tags"]]
+        logging.info(f"top_tags: {', '.join(top_tags)}")
+        if stats["deepest"] is not None:
+            logging.info(f"deepest: {stats['deepest']['name']} ({stats['deepest']['depth']})")
+
+
+class Tags:
+    """Show all the tags, or with --related the tags most often used with a tag, as:
+    "score tag"
+    """
+
+    @staticmethod
+    def parser(subparsers):
+        parser = subparsers.add_parser(
+            "tags", help=Tags.__doc__, description=Tags.__doc__
+        )
+        parser.add_argument(
+            "-r",
+            "--related",
+            nargs=1,
+            action="store",
+            help="Show the tags most often used on the same thoughts as this tag.",
+        )
+        parser.add_argument(
+            "--score",
+            nargs=1,
+            action="store",
+            choices=["count", "jaccard", "pmi"],
+            default=["count"],
+            help=(
+                "How to score related tags: count of shared thoughts (the default),"
+                " jaccard similarity or pointwise mutual information."
+            ),
+        )
+        parser.add_argument(
+            "--limit",
+            nargs=1,
+            type=int,
+            action="store",
+            default=[10],
+            help="The number of related tags to show. Defaults to 10.",
+        )
+        parser.add_argument(
+            "-f",
+            "--format",
+            nargs=1,
+            action="store",
+            choices=["text", "jsonl", "tsv"],
+            default=["text"],
+            help="The output format: text (the default), jsonl or tsv written to stdout.",
+        )
+        parser.add_argument(
+            "-d",
+            "--database",
+            nargs=1,
+            action="store",
+            required=True,
+            help="The name of the database to use.",
+        )
+        return parser
+
+    def __init__(self, args, session=None):
+        self.args = args
+        self.session = session or Session()
+
+    def run(self):
+        from .Tag import Tag
+
+        tb = self.session.box(self.args.database[0])
+        write = _row_writer(self.args.format[0])
+        if not self.args.related:
+            for tag in sorted(tb.listTags(), key=lambda t: t.title):
+                if write is None:
+                    logging.info(tag.title)
+                else:
+                    write({"tag": tag.title})
+            sys.stdout.flush()
+            return
+
+        related = tb.relatedTags(
+            Tag.fromStr(self.args.related[0]),
+            k=self.args.limit[0],
+            score=self.args.score[0],
+        )
+        for title, score in related:
+            if write is None:
+                logging.info(f"{score:.4g} {title}")
+            else:
+                write({"tag": title, self.args.score[0]: score})
+        sys.stdout.flush()
+
+
+class Similar:
+    """Show the thoughts most similar to a thought, sharing its tags, links or wording, as:
+    "similarity name"
+    """
+
+    @staticmethod
+    def parser(subparsers):
+        parser = subparsers.add_parser(
+            "similar", help=Similar.__doc__, description=Similar.__doc__
+        )
+        parser.add_argument(
+            "name", nargs=1, action="store", help="The thought to find similar thoughts to."
+        )
+        parser.add_argument(
+            "--limit",
+            nargs=1,
+            type=int,
+            action="store",
+            default=[10],
+            help="The number of thoughts to show. Defaults to 10.",
+        )
+        parser.add_argument(
+            "-f",
+            "--format",
+            nargs=1,
+            action="store",
+            choices=["text", "jsonl", "tsv"],
+            default=["text"],
+            help="The output format: text (the default), jsonl or tsv written to stdout.",
+        )
+        parser.add_argument(
+            "-d",
+            "--database",
+            nargs=1,
+            action="store",
+            required=True,
+            help="The name of the database to use.",
+        )
+        return parser
+
+    def __init__(self, args, session=None):
+        self.args = args
+        self.session = session or Session()
+
+    def run(self):
+        from .Name import Name
+
+        tb = self.session.box(self.args.database[0])
+        try:
+            similar = tb.similar(Name.fromStr(self.args.name[0]), k=self.args.limit[0])
+        except ValueError as e:
+            logging.error(e)
+            sys.exit(1)
+        write = _row_writer(self.args.format[0])
+        for name, similarity in similar:
+            if write is None:
+                logging.info(f"{similarity:.3g} {name}")
+            else:
+                write({"name": name, "similarity": similarity})
+        sys.stdout.flush()
+
+
+class Rank:
+    """Show the most central thoughts, as:
+    "score name"
+    """
+
+    @staticmethod
+    def parser(subparsers):
+        parser = subparsers.add_parser(
+            "rank", help=Rank.__doc__, description=Rank.__doc__
+        )
+        parser.add_argument(
+            "--by",
+            nargs=1,
+            action="store",
+            choices=["pagerank", "in_degree", "hub", "authority"],
+            default=["pagerank"],
+            help="How to score the thoughts. Defaults to pagerank.",
+        )
+        parser.add_argument(
+            "--limit",
+            nargs=1,
+            type=int,
+            action="store",
+            default=[10],
+            help="The number of thoughts to show. Defaults to 10.",
+        )
+        parser.add_argument(
+            "--cached",
+            action="store_true",
+            help=(
+                "Use the scores stored in the database,"
+                " refreshing them if the database has changed."
+            ),
+        )
+        parser.add_argument(
+            "-f",
+            "--format",
+            nargs=1,
+            action="store",
+            choices=["text", "jsonl", "tsv"],
+            default=["text"],
+            help="The output format: text (the default), jsonl or tsv written to stdout.",
+        )
+        parser.add_argument(
+            "-d",
+            "--database",
+            nargs=1,
+            action="store",
+            required=True,
+            help="The name of the database to use.",
+        )
+        return parser
+
+    def __init__(self, args, session=None):
+        self.args = args
+        self.session = session or Session()
+
+    def run(self):
+        tb = self.session.box(self.args.database[0])
+        ranked = tb.rank(self.args.by[0], limit=self.args.limit[0], cached=self.args.cached)
+        write = _row_writer(self.args.format[0])
+        for name, score in ranked:
+            if write is None:
+                logging.info(f"{score:.6g} {name}")
+            else:
+                write({"name": name, self.args.by[0]: score})
+        sys.stdout.flush()
+
+
+class Components:
+    """Group the thoughts connected by links or shared tags and show the size of each group, as:
+    "component: size"
+    The groups are stored, to be read with read --component.
+    """
+
+    @staticmethod
+    def parser(subparsers):
+        parser = subparsers.add_parser(
+            "components", help=Components.__doc__, description=Components.__doc__
+        )
+        parser.add_argument(
+            "--clusters",
+            action="store_true",
+            help="Split the connected components into clusters, by label propagation.",
+        )
+        parser.add_argument(
+            "-f",
+            "--format",
+            nargs=1,
+            action="store",
+            choices=["text", "jsonl", "tsv"],
+            default=["text"],
+            help="The output format: text (the default), jsonl or tsv written to stdout.",
+        )
+        parser.add_argument(
+            "-d",
+            "--database",
+            nargs=1,
+            action="store",
+            required=True,
+            help="The name of the database to use.",
+        )
+        return parser
+
+    def __init__(self, args, session=None):
+        self.args = args
+        self.session = session or Session()
+
+    def run(self):
+        tb = self.session.box(self.args.database[0])
+        sizes = tb.computeComponents(clusters=self.args.clusters)
+        write = _row_writer(self.args.format[0])
+        for component, size in sizes.items():
+            if write is None:
+                logging.info(f"{component}: {size}")
+            else:
+                write({"component": component, "size": size})
+        sys.stdout.flush()
+
+
+class CheckLinks:
+    """Report the links to thoughts that do not exist and the thoughts nothing links to.
+    Exits with status 1 if there are broken links.
+    """
+
+    name = "check-links"
+
+    @staticmethod
+    def parser(subparsers):
+        parser = subparsers.add_parser(
+            "check-links", help=CheckLinks.__doc__, description=CheckLinks.__doc__
+        )
+        parser.add_argument(
+            "-d",
+            "--database",
+            nargs=1,
+            action="store",
+            required=True,
+            help="The name of the database to use.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Write the report to stdout as a json object.",
+        )
+        return parser
+
+    def __init__(self, args, session=None):
+        self.args = args
+        self.session = session or Session()
+
+    def run(self):
+        tb = self.session.box(self.args.database[0])
+        broken = tb.brokenLinks()
+        orphans = tb.orphans()
+        if self.args.json:
+            import json
+
+            report = {
+                "broken_links": [[source, target] for source, target in broken],
+                "orphans": orphans,
+            }
+            sys.stdout.write(json.dumps(report) + "\n")
+            sys.stdout.flush()
+        else:
+            for source, target in broken:
+                logging.warning(f"Broken link: {source} -> {target}")
+            for name in orphans:
+                logging.info(f"Orphan: {name}")
+            logging.info(
+                f"{len(broken)} broken links, {len(orphans)} orphans."
+            )
+        if len(broken) > 0:
+            sys.exit(1)
+
+
+class Path:
+    """Show the shortest chain of links from one thought to another, as:
+    "1 -> 2 -> 4"
+    """
+
+    @staticmethod
+    def parser(subparsers):
+        parser = subparsers.add_parser(
+            "path", help=Path.__doc__, description=Path.__doc__
+        )
+        parser.add_argument(
+            "source", nargs=1, action="store", help="The thought to start from."
+        )
+        parser.add_argument(
+            "target", nargs=1, action="store", help="The thought to get to."
+        )
+        parser.add_argument(
+            "-u",
+            "--undirected",
+            action="store_true",
+            help="Follow links in either direction.",
+        )
+        parser.add_argument(
+            "-a",
+            "--all",
+            action="store_true",
+            help="Show all the shortest paths, not just one.",
+        )
+        parser.add_argument(
+            "-m",
+            "--max-depth",
+            nargs=1,
+            type=int,
+            action="store",
+            help="Only look for paths of at most this many links.",
+        )
+        parser.add_argument(
+            "-d",
+            "--database",
+            nargs=1,
+            action="store",
+            required=True,
+            help="The name of the database to use.",
+        )
+        return parser
+
+    def __init__(self, args, session=None):
+        self.args = args
+        self.session = session or Session()
+
+    def run(self):
+        from .Name import Name
+
+        tb = self.session.box(self.args.database[0])
+        source = Name.fromStr(self.args.source[0])
+        target = Name.fromStr(self.args.target[0])
+        paths = tb.path(
+            source,
+            target,
+            max_depth=self.args.max_depth[0] if self.args.max_depth else None,
+            directed=not self.args.undirected,
+            all_paths=self.args.all,
+        )
+        if len(paths) == 0:
+            logging.info(f"No path from {source} to {target}.")
+        for path in paths:
+            logging.info(" -> ".join(path))
+
+
+class Batch:
+    """Run many commands in one process.
+
+    Commands are read one per line, either as they would be typed after "pythoughts"
+    or as a json list of arguments. Empty lines and lines starting with # are ignored.
+    The databases are opened once and the writes are grouped into transactions.
+    A command that fails is reported and the rest of the commands are still run. If it raises,
+    its writes are rolled back.
+    """
+
+    @staticmethod
+    def parser(subparsers):
+        parser = subparsers.add_parser(
+            "batch", help=Batch.__doc__, description=Batch.__doc__
+        )
+        parser.add_argument(
+            "file",
+            nargs="?",
+            action="store",
+            default="-",
+            help="The file to read commands from. Defaults to stdin.",
+        )
+        parser.add_argument(
+            "-n",
+            "--transaction-size",
+            nargs=1,
+            type=int,
+            action="store",
+            default=[100],
+            help="The number of lines to group into each transaction.",
+        )
+        return parser
+
+    def __init__(self, args, session=None):
+        self.args = args
+        self.session = session or Session()
+
+    @staticmethod
+    def splitLine(line: str):
+        """Splits a line of the batch into the arguments of a command.
+        Returns None for empty and comment lines.
+        """
+        line = line.strip()
+        if not line or line.startswith("#"):
+            return None
+        if line.startswith("["):
+            import json
+
+            return [str(a) for a in json.loads(line)]
+        import shlex
+
+        return shlex.split(line)
+
+    def run(self):
+        session = Session(keep_open=True)
+        size = max(1, self.args.transaction_size[0])
+
+        if self.args.file == "-":
+            self.runLines(session, size, sys.stdin)
+        else:
+            with open(self.args.file, "r") as batch_file:
+                self.runLines(session, size, batch_file)
+
+    def runLines(self, session, size, lines):
+        transaction = None
+        try:
+            for line_number, line in enumerate(lines, start=1):
+                if transaction is None:
+                    transaction = ExitStack()
+                    transaction.enter_context(session.transaction())
+                self.runLine(session, line_number, line)
+                if line_number % size == 0:
+                    transaction.close()
+                    transaction = None
+        finally:
+            if transaction is not None:
+                transaction.close()
+
+    def runLine(self, session, line_number, line):
+        try:
+            args = Batch.splitLine(line)
+        except ValueError as e:
+            logging.error(f"Line {line_number}: could not read the command: {e}")
+            return
+        if args is None:
+            return
+        if _command_name(args) in LOCAL_COMMANDS:
+            logging.error(f"Line {line_number}: {_command_name(args)} can not be run in a batch.")
+            return
+        # Each command is a nested transaction, so that the writes of a command which raises are
+        # rolled back rather than committed with the rest. A command which exits has finished
+        # its writes, so they are kept.
+        try:
+            with session.transaction():
+                try:
+                    run(args, session)
+                except SystemExit as e:
+                    if e.code:
+                        logging.error(f"Line {line_number}: failed with exit code {e.code}.")
+        except Exception as e:
+            logging.error(f"Line {line_number}: failed: {e!r}")
+        sys.stdout.flush()
+
+
+class Serve:
+    """Run a server that keeps the databases open and runs forwarded commands.
+
+    While the server is running other pythoughts commands are sent to it over a unix socket,
+    instead of each starting from scratch. Only commands run by the same user are accepted.
+    The socket is $PYTHOUGHTS_SOCKET, or pythoughts.sock in $XDG_RUNTIME_DIR,
+    or in a private pythoughts-<user> directory in $TMPDIR (or /tmp).
+    """
+
+    @staticmethod
+    def parser(subparsers):
+        parser = subparsers.add_parser(
+            "serve", help=Serve.__doc__, description=Serve.__doc__
+        )
+        parser.add_argument(
+            "-s",
+            "--socket",
+            nargs=1,
+            action="store",
+            help="The path of the socket to listen on.",
+        )
+        return parser
+
+    def __init__(self, args, session=None):
+        self.args = args
+        self.session = session or Session()
+
+    def run(self):
+        from .server import Server, make_private_dir
+
+        if self.args.socket:
+            path = self.args.socket[0]
+        else:
+            path = server_socket_path()
+            if not os.environ.get("PYTHOUGHTS_SOCKET"):
+                make_private_dir(os.path.dirname(path))
+        from . import timing
+
+        # The commands are profiled by this process, but its start up is not part of any of them.
+        timing.record_import(None)
+        session = Session(keep_open=True)
+        with Server(path, lambda args: run(args, session)) as server:
+            logging.info(f"Serving on {path}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+
+COMMANDS = [
+    Create,
+    Read,
+    Write,
+    Parse,
+    Rename,
+    Delete,
+    Stats,
+    Tags,
+    Similar,
+    Rank,
+    Components,
+    CheckLinks,
+    Path,
+    Batch,
+    Serve,
+]
+
+
 if __name__ == "__main__":
     parse()
@@ -0,0 +1,156 @@
+"""Forwards commands to a running server (see cli.Serve) and replays their output.
+
+When a server is running this is all that is imported to run a command, so it only imports os,
+socket and json: not cli, argparse, logging or the server.
+"""
+
+import json
+import os
+import socket
+import sys
+
+from typing import List
+
+# The names of cli.COMMANDS and help, so that the command can be found without importing cli.
+# The cli tests check that these match.
+COMMAND_NAMES = [
+    "create",
+    "read",
+    "write",
+    "parse",
+    "rename",
+    "delete",
+    "stats",
+    "tags",
+    "similar",
+    "rank",
+    "components",
+    "check-links",
+    "path",
+    "batch",
+    "serve",
+    "help",
+]
+
+# Commands that are never forwarded to a server.
+LOCAL_COMMANDS = ["batch", "serve"]
+
+
+def command_name(sys_args: List[str]) -> str:
+    """Returns the name of the command in the arguments, or None."""
+    for arg in sys_args:
+        if arg in COMMAND_NAMES:
+            return arg
+    return None
+
+
+def server_socket_path() -> str:
+    """Returns the path of the socket the server listens on.
+    This is $PYTHOUGHTS_SOCKET if set (an empty value disables the server), otherwise
+    pythoughts.sock in $XDG_RUNTIME_DIR, or in a pythoughts-<uid> directory only this user can use
+    in $TMPDIR (or /tmp).
+    """
+    path = os.environ.get("PYTHOUGHTS_SOCKET")
+    if path is not None:
+        return path
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "pythoughts.sock")
+    # Not tempfile.gettempdir(), which is slow to import, as this is checked by every command.
+    tmp_dir = os.environ.get("TMPDIR") or os.environ.get("TMP") or "/tmp"
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return os.path.join(tmp_dir, f"pythoughts-{uid}", "pythoughts.sock")
+
+
+def environment_args() -> List[str]:
+    """Returns the options set by environment variables as arguments, for the server, which can not
+    see them. They go before the command's own arguments, which take precedence as they do when run
+    here.
+    """
+    args = []
+    profile = os.environ.get("PYTHOUGHTS_PROFILE")
+    if profile:
+        if profile.startswith("cprofile:"):
+            args += ["--profile", "cprofile", "--profile-output", profile[len("cprofile:") :]]
+        else:
+            args += ["--profile", profile]
+    slow_sql = os.environ.get("PYTHOUGHTS_SLOW_SQL")
+    if slow_sql:
+        args += ["--slow-sql", slow_sql]
+    return args
+
+
+def peer_uid(sock: socket.socket) -> int:
+    """Returns the user id of the process at the other end of a unix socket, or None where that is
+    not known."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    # struct ucred: pid, uid and gid, as native ints.
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, 12)
+    return int.from_bytes(credentials[4:8], sys.byteorder, signed=True)
+
+
+def _log(level: int, message: str):
+    """Logs a message from the server.
+    logging is slow to import, so unless something has already imported (and maybe configured) it
+    this does what its default configuration would: write warnings and errors to stderr.
+    """
+    logging = sys.modules.get("logging")
+    if logging is not None:
+        logging.log(level, message)
+    elif level >= 30:
+        sys.stderr.write(message + "\n")
+
+
+def forward(path: str, args: List[str]) -> bool:
+    """Sends the command to the server listening on path, and replays its output.
+
+    Log messages are re-logged (so the local logging configuration applies),
+    and output is written to stdout and stderr.
+    Returns false if no server is listening on path.
+    Raises SystemExit if the command exited on the server,
+    and PermissionError if the server is run by another user.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return False
+    uid = peer_uid(sock)
+    if uid is None:
+        uid = os.stat(path).st_uid
+    if uid != os.getuid():
+        sock.close()
+        raise PermissionError(f"The server on {path} is run by another user.")
+
+    with sock, sock.makefile("rb") as replies:
+        request = {"args": list(args), "cwd": os.getcwd()}
+        sock.sendall((json.dumps(request) + "\n").encode())
+        for line in replies:
+            reply = json.loads(line)
+            if "log" in reply:
+                _log(reply["log"][0], reply["log"][1])
+            elif "stdout" in reply:
+                sys.stdout.write(reply["stdout"])
+            elif "stderr" in reply:
+                sys.stderr.write(reply["stderr"])
+            elif "exit" in reply:
+                if reply["exit"] is not None:
+                    sys.exit(reply["exit"])
+                break
+    return True
+
+
+def forward_command(sys_args: List[str] = None) -> bool:
+    """Forwards the command to a running server.
+    Returns false if there is no server running, in which case nothing is done.
+    """
+    if sys_args is None:
+        sys_args = sys.argv[1:]
+    if command_name(sys_args) in LOCAL_COMMANDS:
+        return False
+    path = server_socket_path()
+    if not path or not os.path.exists(path):
+        return False
+    return forward(path, environment_args() + list(sys_args))
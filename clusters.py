@@ -0,0 +1,75 @@
+"""Finds groups of connected nodes, for grouping thoughts by their links and shared tags.
+
+The functions take the number of nodes and the (a, b) edges between node ids, and return
+a group for each node: the smallest id in its group. Edges are treated as undirected.
+"""
+
+import random
+
+from array import array
+
+from typing import Iterable, List, Tuple
+
+
+def components(count: int, edges: Iterable[Tuple[int, int]]) -> List[int]:
+    """Returns the connected component of each node, using union-find with path compression."""
+    parent = array("i", range(count))
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    for a, b in edges:
+        root_a = find(a)
+        root_b = find(b)
+        if root_a < root_b:
+            parent[root_b] = root_a
+        elif root_b < root_a:
+            parent[root_a] = root_b
+    return [find(i) for i in range(count)]
+
+
+def label_propagation(
+    count: int, edges: Iterable[Tuple[int, int]], max_iterations: int = 20, seed: int = 0
+) -> List[int]:
+    """Returns a cluster for each node, found by label propagation.
+
+    Each node starts in its own cluster. In each pass the nodes, in a random order, join the cluster
+    most of their neighbours are in (chosen at random on a tie, unless they are already in one of
+    them), until no node changes or after max_iterations passes. The random choices are seeded so
+    the result is repeatable.
+    Clusters are always within a connected component, but a component can be split into several
+    clusters.
+    """
+    rng = random.Random(seed)
+    neighbours: List[List[int]] = [[] for _ in range(count)]
+    for a, b in edges:
+        if a != b:
+            neighbours[a].append(b)
+            neighbours[b].append(a)
+
+    labels = list(range(count))
+    order = [i for i in range(count) if len(neighbours[i]) > 0]
+    for _ in range(max_iterations):
+        changed = False
+        rng.shuffle(order)
+        for i in order:
+            votes = {}
+            for j in neighbours[i]:
+                votes[labels[j]] = votes.get(labels[j], 0) + 1
+            best = max(votes.values())
+            if votes.get(labels[i], 0) < best:
+                labels[i] = rng.choice(sorted(l for l, v in votes.items() if v == best))
+                changed = True
+        if not changed:
+            break
+
+    # Number each cluster after its smallest member, as with components.
+    first = {}
+    for i, label in enumerate(labels):
+        first.setdefault(label, i)
+    return [first[label] for label in labels]
@@ -0,0 +1,97 @@
+"""MinHash signatures of thoughts, for finding similar thoughts without comparing every pair.
+
+A thought's features are its tags, its link targets and the three word shingles of its title and
+content. The fraction of equal values in two signatures estimates the Jaccard similarity of the two
+feature sets. Signatures use one permutation hashing: each feature is hashed once, into one of
+NUM_HASHES bins by its low bits, and each bin keeps its smallest hash. Empty bins borrow from the
+next full bin. The signatures are split into bands for locality sensitive hashing: thoughts which
+share a band bucket are candidates, and pairs with a similarity above about (1 / BANDS) ** (1 / rows
+per band) almost always share one.
+"""
+
+import hashlib
+import re
+
+from array import array
+
+from typing import List, Set
+
+from .Thought import Thought
+
+NUM_HASHES = 64
+BANDS = 16
+SHINGLE_SIZE = 3
+
+# NUM_HASHES is a power of two, and bins hold the hash bits above the bin number.
+_BIN_BITS = NUM_HASHES.bit_length() - 1
+_VALUE_BITS = 64 - _BIN_BITS
+_WORD_RE = re.compile(r"\w+")
+
+
+def _hash(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def features(thought: Thought) -> Set[str]:
+    """Returns the features of a thought: its tags, link targets and word shingles."""
+    result = {f"tag:{t.title}" for t in thought.tags}
+    result.update(f"link:{l.target}" for l in thought.links)
+    words = _WORD_RE.findall(" ".join([thought.title] + list(thought.content)).lower())
+    if 0 < len(words) < SHINGLE_SIZE:
+        result.add("words:" + " ".join(words))
+    for i in range(len(words) - SHINGLE_SIZE + 1):
+        result.add("words:" + " ".join(words[i : i + SHINGLE_SIZE]))
+    return result
+
+
+def signature(feature_set: Set[str]) -> array:
+    """Returns the MinHash signature of a set of features, NUM_HASHES unsigned integers.
+    Returns None for an empty set, which is not similar to anything.
+    """
+    if len(feature_set) == 0:
+        return None
+    bins = [None] * NUM_HASHES
+    mask = NUM_HASHES - 1
+    for f in feature_set:
+        h = _hash(f.encode())
+        i = h & mask
+        value = h >> _BIN_BITS
+        if bins[i] is None or value < bins[i]:
+            bins[i] = value
+
+    # Each empty bin takes the value of the next full one, marked with the distance to it.
+    sig = array("Q", [0]) * NUM_HASHES
+    for i in range(NUM_HASHES):
+        distance = 0
+        while bins[(i + distance) & mask] is None:
+            distance += 1
+        sig[i] = (distance << _VALUE_BITS) | bins[(i + distance) & mask]
+    return sig
+
+
+def buckets(sig: array) -> List[int]:
+    """Returns the LSH bucket of each band of a signature, as signed 64 bit integers (to store in
+    sqlite)."""
+    rows = len(sig) // BANDS
+    result = []
+    for band in range(BANDS):
+        data = band.to_bytes(2, "little") + sig[band * rows : (band + 1) * rows].tobytes()
+        result.append(
+            int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little", signed=True)
+        )
+    return result
+
+
+def similarity(a: array, b: array) -> float:
+    """Returns the estimated Jaccard similarity of the feature sets of two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def to_bytes(sig: array) -> bytes:
+    return sig.tobytes()
+
+
+def from_bytes(data: bytes) -> array:
+    sig = array("Q")
+    sig.frombytes(data)
+    return sig
@@ -0,0 +1,140 @@
+"""A small boolean language for selecting thoughts by their tags and links, compiled to SQL.
+
+    #cat            the thoughts tagged cat
+    ->4             the thoughts which link to thought 4
+    a & b           both a and b
+    a | b           either a or b
+    !a              not a
+    ( a )           grouping
+
+! binds tightest, then &, then |. So "#a & #b & !#c | ->4" is "((#a & #b) & !#c) | ->4".
+Tags and names end at white space or an operator; quote them ("#'two words'") to include those.
+"""
+
+from typing import List, Tuple
+
+_OPERATORS = "&|!()"
+
+
+def _tokens(expression: str) -> List[Tuple[int, str, str]]:
+    """Splits the expression into (position, kind, value) tokens.
+    kind is an operator, "tag" or "link".
+    """
+    tokens = []
+    i = 0
+    while i < len(expression):
+        c = expression[i]
+        if c.isspace():
+            i += 1
+        elif c in _OPERATORS:
+            tokens.append((i, c, c))
+            i += 1
+        elif c == "#" or expression.startswith("->", i):
+            start = i
+            kind = "tag" if c == "#" else "link"
+            i += 1 if c == "#" else 2
+            if i < len(expression) and expression[i] in "'\"":
+                end = expression.find(expression[i], i + 1)
+                if end < 0:
+                    raise ValueError(f"Unterminated quote at {i} in: {expression}")
+                value = expression[i + 1 : end]
+                i = end + 1
+            else:
+                end = i
+                while (
+                    end < len(expression)
+                    and not expression[end].isspace()
+                    and expression[end] not in _OPERATORS
+                ):
+                    end += 1
+                value = expression[i:end]
+                i = end
+            if len(value) == 0:
+                raise ValueError(f"Missing {kind} at {start} in: {expression}")
+            tokens.append((start, kind, value))
+        else:
+            raise ValueError(
+                f"Unexpected {c!r} at {i} in: {expression},"
+                " expected #tag, ->name, &, |, ! or brackets."
+            )
+    return tokens
+
+
+class _Parser:
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.tokens = _tokens(expression)
+        self.position = 0
+        # The tags and names, in the order of their ? in the SQL.
+        self.parameters: List[str] = []
+
+    def _peek(self) -> str:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][1]
+        return None
+
+    def _error(self, expected: str):
+        if self.position < len(self.tokens):
+            at, _, value = self.tokens[self.position]
+            found = f"{value!r} at {at}"
+        else:
+            found = "the end"
+        return ValueError(f"Expected {expected} but found {found} in: {self.expression}")
+
+    def parse(self) -> str:
+        if len(self.tokens) == 0:
+            raise ValueError("The query is empty.")
+        sql = self._or()
+        if self._peek() is not None:
+            raise self._error("& or |")
+        return sql
+
+    def _or(self) -> str:
+        terms = [self._and()]
+        while self._peek() == "|":
+            self.position += 1
+            terms.append(self._and())
+        return terms[0] if len(terms) == 1 else "(" + " OR ".join(terms) + ")"
+
+    def _and(self) -> str:
+        factors = [self._not()]
+        while self._peek() == "&":
+            self.position += 1
+            factors.append(self._not())
+        return factors[0] if len(factors) == 1 else "(" + " AND ".join(factors) + ")"
+
+    def _not(self) -> str:
+        kind = self._peek()
+        if kind == "!":
+            self.position += 1
+            return f"NOT {self._not()}"
+        if kind == "(":
+            self.position += 1
+            sql = self._or()
+            if self._peek() != ")":
+                raise self._error(")")
+            self.position += 1
+            return sql
+        # Terms are uncorrelated IN subqueries, which start from the tag_links_tag or links_target
+        # index, rather than a subquery run for every thought.
+        if kind == "tag":
+            self.parameters.append(self.tokens[self.position][2])
+            self.position += 1
+            return (
+                "thoughts.number IN (SELECT tag_links.thought FROM tag_links, tags"
+                " WHERE tag_links.tag=tags.number AND tags.title=?)"
+            )
+        if kind == "link":
+            self.parameters.append(self.tokens[self.position][2])
+            self.position += 1
+            return "thoughts.number IN (SELECT links.source FROM links WHERE links.target=?)"
+        raise self._error("#tag, ->name, ! or (")
+
+
+def to_sql(expression: str) -> Tuple[str, List[str]]:
+    """Returns the SQL condition, on the thoughts table, for a query expression, and its parameters.
+    Raises a ValueError if the expression is not valid.
+    """
+    parser = _Parser(expression)
+    sql = parser.parse()
+    return sql, parser.parameters
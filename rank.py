@@ -0,0 +1,190 @@
+"""Scores thoughts by how central they are in the graph of links between them.
+
+Each function takes a Graph and returns scores indexed by thought id (0..graph.thought_count-1).
+Only links between thoughts count, links to thoughts that do not exist are ignored.
+NumPy is used when it is installed, otherwise the scores are computed in pure Python.
+"""
+
+from array import array
+
+from typing import List, Sequence, Tuple
+
+from .Graph import Graph
+
+METHODS = ["pagerank", "in_degree", "hub", "authority"]
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _edges(graph: Graph) -> Tuple[array, array]:
+    """Returns the sources and targets of the links between thoughts, as parallel arrays."""
+    count = graph.thought_count
+    sources = array("i")
+    targets = array("i")
+    for i in range(count):
+        for j in graph.successors(i):
+            if j < count:
+                sources.append(i)
+                targets.append(j)
+    return sources, targets
+
+
+def _numpy_edges(numpy, graph: Graph):
+    arrays = graph.numpy()
+    offsets = arrays["out_offsets"]
+    sources = numpy.repeat(numpy.arange(len(offsets) - 1), numpy.diff(offsets))
+    targets = arrays["out_targets"]
+    keep = (sources < graph.thought_count) & (targets < graph.thought_count)
+    return sources[keep], targets[keep]
+
+
+def _start(initial: Sequence[float], count: int) -> List[float]:
+    """Returns the initial scores, normalised to sum to 1. Missing (None) values start at
+    1/count."""
+    if initial is None or len(initial) != count:
+        return [1.0 / count] * count
+    start = [1.0 / count if v is None else float(v) for v in initial]
+    total = sum(start)
+    if total <= 0:
+        return [1.0 / count] * count
+    return [v / total for v in start]
+
+
+def in_degree(graph: Graph) -> List[int]:
+    """Returns the number of thoughts linking to each thought."""
+    degrees = [0] * graph.thought_count
+    for i in range(graph.thought_count):
+        degrees[i] = sum(1 for j in graph.predecessors(i) if j < graph.thought_count)
+    return degrees
+
+
+def pagerank(
+    graph: Graph,
+    damping: float = 0.85,
+    tolerance: float = 1e-10,
+    max_iterations: int = 100,
+    initial: Sequence[float] = None,
+) -> List[float]:
+    """Returns the PageRank of each thought, by power iteration. The ranks sum to 1.
+
+    Thoughts without links out share their rank with every thought.
+    Iteration stops when the ranks change by less than tolerance (summed over the thoughts).
+    Passing the ranks from before a small change as initial makes this converge in far fewer
+    iterations.
+    """
+    count = graph.thought_count
+    if count == 0:
+        return []
+    rank = _start(initial, count)
+
+    numpy = _numpy()
+    if numpy is not None:
+        sources, targets = _numpy_edges(numpy, graph)
+        out_degree = numpy.bincount(sources, minlength=count).astype(float)
+        dangling = out_degree == 0
+        out_degree[dangling] = 1.0
+        rank = numpy.array(rank)
+        for _ in range(max_iterations):
+            share = rank / out_degree
+            new = numpy.bincount(targets, weights=share[sources], minlength=count)
+            base = (1 - damping) / count + damping * rank[dangling].sum() / count
+            new = base + damping * new
+            change = numpy.abs(new - rank).sum()
+            rank = new
+            if change < tolerance:
+                break
+        return rank.tolist()
+
+    sources, targets = _edges(graph)
+    out_degree = [0] * count
+    for s in sources:
+        out_degree[s] += 1
+    dangling = [i for i in range(count) if out_degree[i] == 0]
+    for _ in range(max_iterations):
+        share = [r / d if d else 0.0 for r, d in zip(rank, out_degree)]
+        new = [0.0] * count
+        for s, t in zip(sources, targets):
+            new[t] += share[s]
+        base = (1 - damping) / count + damping * sum(rank[i] for i in dangling) / count
+        new = [base + damping * v for v in new]
+        change = sum(abs(a - b) for a, b in zip(new, rank))
+        rank = new
+        if change < tolerance:
+            break
+    return rank
+
+
+def hits(
+    graph: Graph,
+    tolerance: float = 1e-10,
+    max_iterations: int = 100,
+    initial: Tuple[Sequence[float], Sequence[float]] = None,
+) -> Tuple[List[float], List[float]]:
+    """Returns the hub and authority scores of each thought, by power iteration. Each sums to 1.
+
+    Good hubs link to good authorities, and good authorities are linked to by good hubs.
+    initial can be the (hubs, authorities) from before a small change, to converge faster.
+    """
+    count = graph.thought_count
+    if count == 0:
+        return [], []
+    hub = _start(None if initial is None else initial[0], count)
+    authority = _start(None if initial is None else initial[1], count)
+
+    numpy = _numpy()
+    if numpy is not None:
+        sources, targets = _numpy_edges(numpy, graph)
+        hub = numpy.array(hub)
+        authority = numpy.array(authority)
+        for _ in range(max_iterations):
+            new_authority = numpy.bincount(targets, weights=hub[sources], minlength=count)
+            new_hub = numpy.bincount(sources, weights=new_authority[targets], minlength=count)
+            if new_authority.sum() == 0 or new_hub.sum() == 0:
+                return [0.0] * count, [0.0] * count
+            new_authority /= new_authority.sum()
+            new_hub /= new_hub.sum()
+            change = numpy.abs(new_hub - hub).sum() + numpy.abs(new_authority - authority).sum()
+            hub, authority = new_hub, new_authority
+            if change < tolerance:
+                break
+        return hub.tolist(), authority.tolist()
+
+    sources, targets = _edges(graph)
+    for _ in range(max_iterations):
+        new_authority = [0.0] * count
+        for s, t in zip(sources, targets):
+            new_authority[t] += hub[s]
+        new_hub = [0.0] * count
+        for s, t in zip(sources, targets):
+            new_hub[s] += new_authority[t]
+        authority_total = sum(new_authority)
+        hub_total = sum(new_hub)
+        if authority_total == 0 or hub_total == 0:
+            return [0.0] * count, [0.0] * count
+        new_authority = [v / authority_total for v in new_authority]
+        new_hub = [v / hub_total for v in new_hub]
+        change = sum(abs(a - b) for a, b in zip(new_hub, hub))
+        change += sum(abs(a - b) for a, b in zip(new_authority, authority))
+        hub, authority = new_hub, new_authority
+        if change < tolerance:
+            break
+    return hub, authority
+
+
+def scores(graph: Graph, method: str) -> List[float]:
+    """Returns the scores of each thought by one of the METHODS."""
+    if method == "pagerank":
+        return pagerank(graph)
+    if method == "in_degree":
+        return in_degree(graph)
+    if method == "hub":
+        return hits(graph)[0]
+    if method == "authority":
+        return hits(graph)[1]
+    raise ValueError(f"Unknown rank method {method}, use one of {', '.join(METHODS)}.")
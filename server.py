@@ -0,0 +1,171 @@
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+import traceback
+
+from contextlib import redirect_stdout, redirect_stderr
+from typing import Callable, List
+
+from .client import peer_uid
+
+# The protocol is one json object per line.
+# The client sends {"args": [...], "cwd": "..."}.
+# The server replies with any number of {"log": [level, message]}, {"stdout": text}
+# and {"stderr": text} objects, followed by {"exit": code}.
+# An exit code of null means the command returned normally.
+
+
+class _SendingHandler(logging.Handler):
+    """Sends log records from the handling thread back to the client."""
+
+    def __init__(self, send, streams):
+        super().__init__()
+        self.send = send
+        self.streams = streams
+        self.thread = threading.get_ident()
+
+    def emit(self, record):
+        if record.thread == self.thread:
+            # Keep the log messages in order with the output.
+            for stream in self.streams:
+                stream.flush()
+            self.send({"log": [record.levelno, record.getMessage()]})
+
+
+class _SendingStream(io.TextIOBase):
+    """Sends text written to stdout or stderr back to the client.
+    The text is sent in chunks, when it is flushed or enough has been written.
+    """
+
+    chunk_size = 1 << 16
+
+    def __init__(self, send, key):
+        self.send = send
+        self.key = key
+        self.buffer = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if text:
+            self.buffer.append(text)
+            self.size += len(text)
+            if self.size >= self.chunk_size:
+                self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.size > 0:
+            self.send({self.key: "".join(self.buffer)})
+            self.buffer = []
+            self.size = 0
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def send(self, message):
+        self.wfile.write((json.dumps(message) + "\n").encode())
+        self.wfile.flush()
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        request = json.loads(line)
+
+        stdout = _SendingStream(self.send, "stdout")
+        stderr = _SendingStream(self.send, "stderr")
+        root = logging.getLogger()
+        handler = _SendingHandler(self.send, [stdout, stderr])
+        old_level = root.level
+        old_handlers = root.handlers
+        root.handlers = [handler]
+        root.setLevel(logging.DEBUG)
+
+        code = None
+        try:
+            os.chdir(request["cwd"])
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                self.server.handle_command(request["args"])
+        except SystemExit as e:
+            code = e.code if e.code is not None else 0
+        except Exception:
+            self.send({"stderr": traceback.format_exc()})
+            code = 1
+        finally:
+            root.handlers = old_handlers
+            root.setLevel(old_level)
+            stdout.flush()
+            stderr.flush()
+        self.send({"exit": code})
+
+
+class Server(socketserver.UnixStreamServer):
+    """Runs commands sent over a unix socket, one at a time, in this process.
+
+    handle_command is called with the argument list of each command.
+    Only this user can connect: the socket file is readable and writable only by its owner,
+    and connections from processes run by other users are dropped.
+    The socket file is removed when the server is closed.
+    """
+
+    def __init__(self, path: str, handle_command: Callable[[List[str]], None]):
+        self.path = path
+        self.handle_command = handle_command
+        if os.path.exists(path):
+            if _is_listening(path):
+                raise FileExistsError(f"A server is already listening on {path}.")
+            os.remove(path)
+        super().__init__(path, _RequestHandler)
+
+    def server_bind(self):
+        # Create the socket without permissions for anyone else, rather than changing them
+        # afterwards.
+        old_umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.path, 0o600)
+
+    def verify_request(self, request, client_address) -> bool:
+        uid = peer_uid(request)
+        if uid is not None and uid != os.getuid():
+            logging.warning(f"Refused a connection from user {uid}.")
+            return False
+        return True
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _is_listening(path: str) -> bool:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def make_private_dir(directory: str):
+    """Creates directory, usable only by this user, for the socket.
+    Raises a PermissionError if it already exists and is not a directory only this user can use.
+    """
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{directory} must be a directory that only its owner can use.")
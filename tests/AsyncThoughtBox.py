@@ -0,0 +1,162 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from typing import List
+
+from ..AsyncThoughtBox import AsyncThoughtBox
+from ..Link import Link
+from ..Name import Name
+from ..Tag import Tag
+from ..Thought import Thought
+
+
+def _thought(name: str, title: str, tags: List[str], links: List[str]) -> Thought:
+    return Thought(
+        name=Name.fromStr(name),
+        title=title,
+        tags=[Tag.fromStr(t) for t in tags],
+        links=[Link.fromStr(name, l) for l in links],
+        content=[],
+        sources=[],
+    )
+
+
+class AsyncThoughtBoxTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.atb = AsyncThoughtBox(os.path.join(self.dir.name, "box.db"), readers=2)
+        await self.atb.addOrUpdateMany(
+            [
+                _thought("1", "first", ["first", "cat"], ["2", "3"]),
+                _thought("2", "second", ["second"], ["4"]),
+                _thought("3", "third", [], ["3"]),
+                _thought("4", "fourth", ["cat"], ["1"]),
+            ]
+        )
+
+    async def asyncTearDown(self):
+        await self.atb.close()
+        self.dir.cleanup()
+
+    async def test_list(self):
+        thoughts = await self.atb.listThoughts()
+        self.assertEqual([str(t.name) for t in thoughts], ["1", "2", "3", "4"])
+        thoughts = await self.atb.listThoughts(tags=[Tag.fromStr("cat")])
+        self.assertEqual([str(t.name) for t in thoughts], ["1", "4"])
+        self.assertEqual([t.title for t in await self.atb.listTags()], ["cat", "first", "second"])
+        by_tag = await self.atb.listNamesByTag()
+        self.assertEqual(by_tag["cat"], (2, ["1", "4"]))
+
+    async def test_search(self):
+        thoughts = await self.atb.search("#cat & !->2")
+        self.assertEqual([str(t.name) for t in thoughts], ["4"])
+        with self.assertRaises(ValueError):
+            await self.atb.search("#cat &")
+
+    async def test_iterThoughts(self):
+        names = [str(t.name) async for t in self.atb.iterThoughts(page_size=3)]
+        self.assertEqual(names, ["1", "2", "3", "4"])
+        names = [str(t.name) async for t in self.atb.iterThoughts(page_size=1, limit=3)]
+        self.assertEqual(names, ["1", "2", "3"])
+        after = Name.fromStr("2")
+        names = [str(t.name) async for t in self.atb.iterThoughts(page_size=2, after=after)]
+        self.assertEqual(names, ["3", "4"])
+
+    async def test_writes(self):
+        await self.atb.delete(Name.fromStr("3"))
+        linking = await self.atb.rename(Name.fromStr("2"), Name.fromStr("5"))
+        self.assertEqual([str(n) for n in linking], ["1"])
+        thoughts = await self.atb.listThoughts()
+        self.assertEqual([str(t.name) for t in thoughts], ["1", "4", "5"])
+
+    async def test_writes_in_order(self):
+        # Not awaiting each write: they still run in the order they were made.
+        await asyncio.gather(
+            *[self.atb.addOrUpdate(_thought("5", f"title {i}", [], [])) for i in range(20)]
+        )
+        thoughts = await self.atb.listThoughts(names=[Name.fromStr("5")])
+        self.assertEqual(thoughts[0].title, "title 19")
+
+    async def test_write_rolled_back(self):
+        def failing(tb):
+            tb.delete(Name.fromStr("1"))
+            raise RuntimeError("failed")
+
+        with self.assertRaises(RuntimeError):
+            await self.atb.write(failing)
+        self.assertEqual(len(await self.atb.listThoughts(names=[Name.fromStr("1")])), 1)
+
+    async def test_component(self):
+        await self.atb.write(lambda tb: tb.computeComponents())
+        thoughts = await self.atb.listThoughts(component=0)
+        self.assertEqual([str(t.name) for t in thoughts], ["1", "2", "3", "4"])
+
+    async def test_concurrent(self):
+        def slow_read(tb):
+            time.sleep(0.2)
+            return len(tb.listThoughts())
+
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        start = time.perf_counter()
+        counts = await asyncio.gather(
+            self.atb.read(slow_read),
+            self.atb.read(slow_read),
+            self.atb.addOrUpdate(_thought("5", "fifth", [], [])),
+        )
+        elapsed = time.perf_counter() - start
+        ticker.cancel()
+
+        self.assertIn(counts[0], (4, 5))
+        # The two reads ran at the same time, and the event loop kept running.
+        self.assertLess(elapsed, 0.39)
+        self.assertGreater(ticks, 5)
+        self.assertEqual(len(await self.atb.listThoughts()), 5)
+
+    async def test_read_only_readers(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            await self.atb.read(lambda tb: tb.delete(Name.fromStr("1")))
+
+        # A reader opened during a long write does not wait for it.
+        def slow_write(tb):
+            tb.delete(Name.fromStr("1"))
+            time.sleep(0.5)
+
+        writing = asyncio.ensure_future(self.atb.write(slow_write))
+        await asyncio.sleep(0.1)
+        start = time.perf_counter()
+        self.assertEqual(len(await self.atb.listThoughts()), 4)
+        self.assertLess(time.perf_counter() - start, 0.3)
+        await writing
+        self.assertEqual(len(await self.atb.listThoughts()), 3)
+
+    async def test_journal_mode(self):
+        path = os.path.join(self.dir.name, "box.db")
+
+        def mode():
+            conn = sqlite3.connect(path)
+            try:
+                return conn.execute("PRAGMA journal_mode").fetchone()[0]
+            finally:
+                conn.close()
+
+        await self.atb.close()
+        self.assertEqual(mode(), "delete")
+
+        self.atb = AsyncThoughtBox(path, wal=True)
+        self.assertEqual(len(await self.atb.listThoughts()), 4)
+        self.assertEqual(mode(), "wal")
+        await self.atb.close()
+        self.assertEqual(mode(), "delete")
+        self.atb = AsyncThoughtBox(path)
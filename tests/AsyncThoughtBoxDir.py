@@ -0,0 +1,44 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from ..AsyncThoughtBoxDir import AsyncThoughtBoxDir
+from ..Name import Name
+
+
+class AsyncThoughtBoxDirTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.atbd = AsyncThoughtBoxDir(self.dir.name, workers=4)
+        with open(os.path.join(self.dir.name, "1.tb"), "w") as f:
+            f.write("# first\n\nsee [[2]]\n\n# sources\n\n# tags\n#cat\n")
+
+    async def asyncTearDown(self):
+        await self.atbd.close()
+        self.dir.cleanup()
+
+    async def test_createNew(self):
+        names = await asyncio.gather(*[self.atbd.createNew(Name.fromStr("2")) for _ in range(5)])
+        self.assertEqual([str(n) for n in names], ["2", "3", "4", "5", "6"])
+        self.assertEqual(
+            [str(n) for n in await self.atbd.listNames()], ["1", "2", "3", "4", "5", "6"]
+        )
+
+    async def test_readMany(self):
+        results = await self.atbd.readMany([Name.fromStr("1"), Name.fromStr("9")])
+        self.assertEqual(results[0][1].title, "first")
+        self.assertEqual([t.title for t in results[0][1].tags], ["cat"])
+        self.assertIsInstance(results[1][1], FileNotFoundError)
+        with self.assertRaises(FileNotFoundError):
+            await self.atbd.read(Name.fromStr("9"))
+
+    async def test_changes(self):
+        await self.atbd.rename(Name.fromStr("1"), Name.fromStr("2"))
+        self.assertEqual(await self.atbd.findNames(["*"]), [Name.fromStr("2")])
+        mapping = await self.atbd.moveSubtree(Name.fromStr("2"), Name.fromStr("3"))
+        self.assertEqual(mapping, {"2": "3"})
+        self.assertEqual(await self.atbd.rewriteLinks(["3"], {"2": "3"}), ["3"])
+        self.assertEqual((await self.atbd.read(Name.fromStr("3"))).links[0].target, "3")
+        await self.atbd.delete(Name.fromStr("3"))
+        self.assertEqual(await self.atbd.listNames(), [])
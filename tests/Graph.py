@@ -0,0 +1,137 @@
+import unittest
+import tempfile
+import sys
+
+from typing import List
+from unittest import mock
+
+from ..Graph import Graph
+from ..ThoughtBox import ThoughtBox
+from ..Thought import Thought
+from ..Name import Name
+from ..Tag import Tag
+from ..Link import Link
+
+
+class GraphTests(unittest.TestCase):
+    def _addThought(self, name: str, links: List[str]) -> Thought:
+        t = Thought(
+            name=Name.fromStr(name),
+            title=name,
+            tags=[],
+            links=[Link.fromStr(name, l) for l in links],
+            content=[],
+            sources=[],
+        )
+        self.tb.addOrUpdate(t)
+        return t
+
+    def setUp(self):
+        """
+        links:
+        1 -> 2 -> 4 -> 1
+          -> 3 <>
+        5 -> 9 (which does not exist)
+        """
+        self.db_file = tempfile.NamedTemporaryFile()
+        self.tb = ThoughtBox(self.db_file.name, explicitly_create_tables=True)
+        self._addThought("1", ["2", "3"])
+        self._addThought("2", ["4"])
+        self._addThought("3", ["4"])
+        self._addThought("4", ["1", "3"])
+        self._addThought("5", ["9"])
+        self.graph = self.tb.graphSnapshot()
+
+    def tearDown(self):
+        self.db_file.close()
+
+    def names(self, ids) -> List[str]:
+        return sorted([self.graph.name(i) for i in ids])
+
+    def test_snapshot(self):
+        self.assertEqual(len(self.graph), 6)
+        self.assertEqual(self.graph.thought_count, 5)
+        self.assertEqual(self.graph.link_count, 7)
+        self.assertEqual(self.graph.names[:5], ["1", "2", "3", "4", "5"])
+        self.assertTrue(self.graph.exists(self.graph.id("5")))
+        self.assertFalse(self.graph.exists(self.graph.id("9")))
+
+    def test_successors_predecessors(self):
+        g = self.graph
+        self.assertEqual(self.names(g.successors(g.id("1"))), ["2", "3"])
+        self.assertEqual(self.names(g.successors(g.id("9"))), [])
+        self.assertEqual(self.names(g.predecessors(g.id("4"))), ["2", "3"])
+        self.assertEqual(self.names(g.predecessors(g.id("3"))), ["1", "4"])
+        self.assertEqual(g.outDegree(g.id("4")), 2)
+        self.assertEqual(g.inDegree(g.id("1")), 1)
+        self.assertEqual(g.inDegree(g.id("5")), 0)
+
+    def test_reachable(self):
+        self.assertEqual(self.graph.reachable("2"), {"1", "2", "3", "4"})
+        self.assertEqual(self.graph.reachable("5"), {"5", "9"})
+        self.assertEqual(self.graph.reachable("9", reverse=True), {"5", "9"})
+        with self.assertRaises(KeyError):
+            self.graph.reachable("7")
+
+    def test_duplicate_links(self):
+        graph = Graph(["1", "2"], [("1", "2"), ("2", "1"), ("1", "2")])
+        self.assertEqual(graph.outDegree(0), 2)
+        self.assertEqual(list(graph.out_offsets), [0, 2, 3])
+        self.assertEqual(list(graph.in_offsets), [0, 1, 3])
+
+    def test_shortestPaths(self):
+        g = self.graph
+        self.assertEqual(g.shortestPaths("1", "4"), [["1", "2", "4"]])
+        self.assertEqual(
+            sorted(g.shortestPaths("1", "4", all_paths=True)),
+            [["1", "2", "4"], ["1", "3", "4"]],
+        )
+        self.assertEqual(g.shortestPaths("2", "3"), [["2", "4", "3"]])
+        self.assertEqual(g.shortestPaths("1", "1"), [["1"]])
+        self.assertEqual(g.shortestPaths("1", "5"), [])
+        self.assertEqual(g.shortestPaths("1", "7"), [])
+
+    def test_shortestPaths_max_depth(self):
+        g = self.graph
+        self.assertEqual(g.shortestPaths("2", "3", max_depth=1), [])
+        self.assertEqual(g.shortestPaths("2", "3", max_depth=2), [["2", "4", "3"]])
+
+    def test_shortestPaths_undirected(self):
+        g = self.graph
+        self.assertEqual(g.shortestPaths("4", "2"), [["4", "1", "2"]])
+        self.assertEqual(g.shortestPaths("4", "2", directed=False), [["4", "2"]])
+        self.assertEqual(g.shortestPaths("9", "5", directed=False), [["9", "5"]])
+
+    def test_shortestPaths_long_chain(self):
+        names = [str(i) for i in range(1, 201)]
+        links = [(names[i], names[i + 1]) for i in range(len(names) - 1)]
+        links += [("1", "100"), ("50", "150")]
+        graph = Graph(names, links)
+        path = graph.shortestPaths("1", "200")[0]
+        self.assertEqual(path[49:52], ["50", "150", "151"])
+        self.assertEqual(len(path), 101)
+
+    def test_path(self):
+        self.assertEqual(
+            self.tb.path(Name.fromStr("2"), Name.fromStr("1")), [["2", "4", "1"]]
+        )
+
+    def test_path_matches_snapshot(self):
+        # path searches the database, and must find what the snapshot does.
+        names = ["1", "2", "3", "4", "5", "9", "7"]
+        for batch in [500, 1]:
+            with mock.patch.object(sys.modules[ThoughtBox.__module__], "_PATH_BATCH", batch):
+                for source in names:
+                    for target in names:
+                        for options in [
+                            {},
+                            {"directed": False},
+                            {"all_paths": True},
+                            {"directed": False, "all_paths": True},
+                            {"max_depth": 1},
+                        ]:
+                            self.assertEqual(
+                                self.tb.path(Name.fromStr(source), Name.fromStr(target), **options),
+                                self.graph.shortestPaths(source, target, **options),
+                                (source, target, options, batch),
+                            )
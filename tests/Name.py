@@ -110,3 +110,48 @@ class NameTests(unittest.TestCase):
         self.assertEqual(getSorted(["2a", "1a", "2b", "1b"]), ["1a", "1b", "2a", "2b"])
         self.assertEqual(getSorted(["2", "10", "1"]), ["1", "2", "10"])
         self.assertEqual(getSorted(["b", "aa", "a"]), ["a", "b", "aa"])
+
+    def test_key(self):
+        names = ["2", "10", "1", "1a", "1b", "1aa", "1a1", "1a10", "1a2", "a", "b", "aa"]
+        by_name = sorted([Name.fromStr(n) for n in names])
+        by_key = sorted([Name.fromStr(n) for n in names], key=lambda n: n.key())
+        self.assertEqual([str(n) for n in by_name], [str(n) for n in by_key])
+
+        self.assertEqual(Name.fromStr("").key(), "")
+        self.assertTrue(Name.fromStr("1a1").key().startswith(Name.fromStr("1a").key()))
+        self.assertFalse(Name.fromStr("10").key().startswith(Name.fromStr("1").key()))
+
+    def test_fromKey(self):
+        for n in ["", "1", "10", "1a", "1aa10b", "bb"]:
+            self.assertEqual(str(Name.fromKey(Name.fromStr(n).key())), n)
+
+    def test_keyRange(self):
+        low, high = Name.fromStr("1a").keyRange()
+        for n in ["1a", "1a1", "1a10", "1a1b"]:
+            self.assertTrue(low <= Name.fromStr(n).key() < high)
+        for n in ["1", "1b", "1aa", "2", "10a"]:
+            self.assertFalse(low <= Name.fromStr(n).key() < high)
+
+    def test_isUnder(self):
+        self.assertTrue(Name.fromStr("1a").isUnder(Name.fromStr("1a")))
+        self.assertTrue(Name.fromStr("1a1").isUnder(Name.fromStr("1a")))
+        self.assertTrue(Name.fromStr("1a1").isUnder(Name.fromStr("")))
+        self.assertFalse(Name.fromStr("1aa").isUnder(Name.fromStr("1a")))
+        self.assertFalse(Name.fromStr("10").isUnder(Name.fromStr("1")))
+
+    def test_moved(self):
+        src = Name.fromStr("2")
+        dst = Name.fromStr("5c1")
+        self.assertEqual(Name.fromStr("2").moved(src, dst), Name.fromStr("5c1"))
+        self.assertEqual(Name.fromStr("2a").moved(src, dst), Name.fromStr("5c1a"))
+        self.assertEqual(Name.fromStr("2a10").moved(src, dst), Name.fromStr("5c1a10"))
+
+    def test_checkMove(self):
+        Name.checkMove(Name.fromStr("2"), Name.fromStr("5c1"))
+        Name.checkMove(Name.fromStr("2a"), Name.fromStr("5c"))
+        with self.assertRaises(ValueError):
+            Name.checkMove(Name.fromStr("2"), Name.fromStr("5c"))
+        with self.assertRaises(ValueError):
+            Name.checkMove(Name.fromStr("2"), Name.fromStr("2a1"))
+        with self.assertRaises(ValueError):
+            Name.checkMove(Name.fromStr(""), Name.fromStr("1"))
@@ -0,0 +1,37 @@
+import unittest
+
+from ..QueryCache import QueryCache
+
+
+class QueryCacheTests(unittest.TestCase):
+    def test_get_put(self):
+        cache = QueryCache(2)
+        self.assertEqual(cache.get("a", 1), (False, None))
+        cache.put("a", 1, [1])
+        self.assertEqual(cache.get("a", 1), (True, [1]))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+        self.assertEqual(cache.stats()["hit_rate"], 0.5)
+
+    def test_lru_eviction(self):
+        cache = QueryCache(2)
+        for key in ["a", "b"]:
+            cache.get(key, 1)
+            cache.put(key, 1, key)
+        cache.get("a", 1)
+        cache.put("c", 1, "c")
+        self.assertEqual(cache.get("b", 1), (False, None))
+        self.assertEqual(cache.get("a", 1), (True, "a"))
+        self.assertEqual(cache.get("c", 1), (True, "c"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_version(self):
+        cache = QueryCache(2)
+        cache.get("a", 1)
+        cache.put("a", 1, "a")
+        self.assertEqual(cache.get("a", 2), (False, None))
+        self.assertEqual(cache.stats()["invalidations"], 1)
+        # Results read at an old version are not kept.
+        cache.put("a", 1, "a")
+        self.assertEqual(cache.get("a", 2), (False, None))
@@ -0,0 +1,73 @@
+import unittest
+import tempfile
+
+from ..SqlMonitor import SqlMonitor, normalize
+from ..ThoughtBox import ThoughtBox
+from ..Thought import Thought
+from ..Name import Name
+from ..Tag import Tag
+
+
+class SqlMonitorTests(unittest.TestCase):
+    def setUp(self):
+        self.db_file = tempfile.NamedTemporaryFile()
+        self.tb = ThoughtBox(self.db_file.name, explicitly_create_tables=True)
+        for name in ["1", "2", "3"]:
+            self.tb.addOrUpdate(
+                Thought(
+                    name=Name.fromStr(name),
+                    title=name,
+                    tags=[Tag.fromStr("cat")],
+                    links=[],
+                    content=[],
+                    sources=[],
+                )
+            )
+
+    def tearDown(self):
+        self.db_file.close()
+
+    def test_normalize(self):
+        self.assertEqual(
+            normalize("SELECT *  FROM t WHERE a='it''s' AND b=12 AND c1=2.5"),
+            "SELECT * FROM t WHERE a=? AND b=? AND c1=?",
+        )
+
+    def test_statements(self):
+        monitor = self.tb.instrument()
+        calls = []
+        monitor.addListener(lambda sql, seconds, rows: calls.append((sql, rows)))
+
+        self.assertEqual(len(self.tb.listThoughts()), 3)
+        self.assertEqual(len(self.tb.listTags()), 1)
+        self.tb.delete(Name.fromStr("3"))
+
+        self.assertIn(("SELECT title FROM tags ORDER BY title", 1), calls)
+        stats = monitor.statements["DELETE FROM thoughts WHERE number IS ?"]
+        self.assertEqual((stats.calls, stats.rows), (1, 1))
+        self.assertTrue(any(rows == 3 for sql, rows in calls if "json_group_array" in sql))
+        self.assertIn("DELETE FROM thoughts WHERE number IS ?", monitor.summary())
+
+        self.tb.stopInstrumenting()
+        self.tb.listTags()
+        self.assertEqual(monitor.statements["SELECT title FROM tags ORDER BY title"].calls, 1)
+
+    def test_slow_queries(self):
+        monitor = self.tb.instrument(SqlMonitor(slow_seconds=0))
+        with self.assertLogs(level="WARNING") as logs:
+            self.tb.listThoughts(tags=[Tag.fromStr("cat")])
+        self.assertTrue(logs.output[0].startswith("WARNING:root:Slow query"))
+        slow = monitor.slow_queries[-1]
+        self.assertIn("json_group_array", slow.sql)
+        self.assertEqual(slow.rows, 3)
+        self.assertTrue(any("SCAN" in line or "SEARCH" in line for line in slow.plan))
+
+    def test_stop_with_open_cursor(self):
+        monitor = self.tb.instrument()
+        cur = self.tb.conn.cursor()
+        cur.execute("SELECT number FROM thoughts")
+        self.assertIsNotNone(cur.fetchone())
+        self.tb.stopInstrumenting()
+        self.assertEqual(len(cur.fetchall()), 2)
+        cur.close()
+        self.assertNotIn("SELECT number FROM thoughts", monitor.statements)
@@ -1,5 +1,7 @@
 import unittest
 import tempfile
+import math
+import sqlite3
 
 from typing import List, Dict
 
@@ -74,6 +76,69 @@ class ThoughtBoxTests(unittest.TestCase):
 
         self.assertNotIn("house", tag_strs)
 
+    def test_tagPairs(self):
+        self.assertEqual(
+            self.tb.tagPairs(),
+            [("cat", "first", 1), ("cat", "mouse", 1), ("dog", "mouse", 1), ("dog", "second", 1)],
+        )
+        self.assertEqual(self.tb.tagPairs("jaccard")[0], ("cat", "first", 0.5))
+
+    def test_relatedTags(self):
+        cat = Tag.fromStr("cat")
+        self.assertEqual(self.tb.relatedTags(cat), [("first", 1), ("mouse", 1)])
+        self.assertEqual(self.tb.relatedTags(cat, k=1), [("first", 1)])
+        related = self.tb.relatedTags(cat, score="jaccard")
+        self.assertEqual(related[0], ("first", 0.5))
+        self.assertAlmostEqual(related[1][1], 1 / 3)
+        related = self.tb.relatedTags(cat, score="pmi")
+        self.assertAlmostEqual(related[0][1], math.log(2))
+        self.assertAlmostEqual(related[1][1], 0.0)
+        self.assertEqual(self.tb.relatedTags(Tag.fromStr("house")), [])
+        with self.assertRaises(ValueError):
+            self.tb.relatedTags(cat, score="bogus")
+
+    def test_tagPairs_updated(self):
+        self.tb.tagPairs()
+        self._addThought(name="5", title="fifth", tags=["cat", "mouse", "new"], links=[])
+        self.assertEqual(
+            self.tb.relatedTags(Tag.fromStr("mouse")), [("cat", 2), ("dog", 1), ("new", 1)]
+        )
+        self._addThought(name="3", title="third", tags=["dog"], links=[])
+        self.tb.delete(Name.fromStr("4"))
+        self.tb.delete(Name.fromStr("1"))
+        kept = self.tb.tagPairs()
+        self.assertEqual(
+            kept,
+            [("cat", "mouse", 1), ("cat", "new", 1), ("dog", "second", 1), ("mouse", "new", 1)],
+        )
+
+        self.tb._setMeta("tag_pairs_valid", 0)
+        self.assertEqual(self.tb.tagPairs(), kept)
+
+    def test_similar(self):
+        self._addThought(name="5", title="forth", tags=["cat", "mouse"], links=["1", "3"])
+        self._addThought(name="6", title="sixth", tags=["cat", "mouse", "dog"], links=["1", "3"])
+        similar = self.tb.similar(Name.fromStr("4"))
+        self.assertEqual([s[0] for s in similar[:2]], ["5", "6"])
+        self.assertEqual(similar[0][1], 1.0)
+        self.assertGreater(similar[1][1], 0.3)
+        self.assertEqual(len(self.tb.similar(Name.fromStr("4"), k=1)), 1)
+        self.assertEqual(self.tb.similar(Name.fromStr("9")), [])
+
+        self.tb.rename(Name.fromStr("5"), Name.fromStr("7"))
+        self.tb.delete(Name.fromStr("6"))
+        self.assertEqual(self.tb.similar(Name.fromStr("4"))[0], ("7", 1.0))
+        self.assertNotIn("6", [s[0] for s in self.tb.similar(Name.fromStr("4"))])
+
+        # A thought with no features is similar to nothing.
+        self._addThought(name="8", title="", tags=[], links=[])
+        self.assertEqual(self.tb.similar(Name.fromStr("8")), [])
+
+        # A box made before signatures were added has none, which needs parsing again.
+        self.tb.conn.execute("DELETE FROM signatures WHERE thought='4'")
+        with self.assertRaisesRegex(ValueError, "parse --all"):
+            self.tb.similar(Name.fromStr("4"))
+
     def test_listThoughts(self):
         thoughts = self.tb.listThoughts()
         thought_strs = [(str(t.name), t.title) for t in thoughts]
@@ -83,6 +148,17 @@ class ThoughtBoxTests(unittest.TestCase):
             [("1", "first"), ("2", "second"), ("3", "third"), ("4", "forth")],
         )
 
+    def test_listThoughts_commas(self):
+        self._addThought(
+            name="5", title="a, b", tags=["one, two", "cat"], links=["1", "1,2"]
+        )
+        thought = self.tb.listThoughts(names=[Name.fromStr("5")])[0]
+        self.assertEqual(thought.title, "a, b")
+        self.assertEqual([t.title for t in thought.tags], ["cat", "one, two"])
+        self.assertEqual([l.target for l in thought.links], ["1", "1,2"])
+        self.assertEqual(thought.links[0].source, Name.fromStr("5"))
+        self.assertIn("one, two", [t.title for t in self.tb.listTags()])
+
     def test_listThoughts_with_name(self):
         thoughts = self.tb.listThoughts(names=[Name.fromStr(n) for n in ["1", "3"]])
         thought_strs = [(str(t.name), t.title) for t in thoughts]
@@ -113,6 +189,31 @@ class ThoughtBoxTests(unittest.TestCase):
             thought_strs, [("2", "second"), ("3", "third"), ("4", "forth")]
         )
 
+    def test_listThoughts_where(self):
+        def names(where, **kwargs):
+            return [str(t.name) for t in self.tb.listThoughts(where=where, **kwargs)]
+
+        self.assertEqual(names("#dog"), ["2", "3"])
+        self.assertEqual(names("#dog & #mouse"), ["3"])
+        self.assertEqual(names("#cat | #dog & !#mouse"), ["1", "2", "4"])
+        self.assertEqual(names("(#cat | #dog) & !#mouse"), ["1", "2"])
+        self.assertEqual(names("->4"), ["2", "3"])
+        self.assertEqual(names("#mouse & ->4"), ["3"])
+        self.assertEqual(names("!->3"), ["2", "3"])
+        self.assertEqual(names("#cat", under=Name.fromStr("4")), ["4"])
+        self.assertEqual(names("#house"), [])
+        with self.assertRaises(ValueError):
+            names("#cat &")
+        self.assertEqual(names("#\"it's\""), [])
+
+    def test_listThoughts_where_plan(self):
+        # The tag is looked up in the tag_links_tag index, not checked for every thought.
+        query, parameters = self.tb._selectThoughts(where="#cat & !->3")
+        self.assertEqual(parameters, ["cat", "3"])
+        plan = [row[3] for row in self.tb.conn.execute("EXPLAIN QUERY PLAN " + query, parameters)]
+        self.assertTrue(any("tag_links_tag" in line for line in plan))
+        self.assertFalse(any("CORRELATED" in line for line in plan))
+
     def test_listThoughtsByTags(self):
         d = self.tb.listThoughtsByTag()
         d_comp = {tag.title: [(str(t.name), t.title) for t in d[tag]] for tag in d}
@@ -127,6 +228,27 @@ class ThoughtBoxTests(unittest.TestCase):
 
         self.assertEqual(d_comp["mouse"], [("3", "third"), ("4", "forth")])
 
+    def test_listNamesByTag(self):
+        self._addThought(name="1a", title="sub", tags=["cat"], links=[])
+        self.assertEqual(
+            self.tb.listNamesByTag(),
+            {
+                "cat": (3, ["1", "1a", "4"]),
+                "dog": (2, ["2", "3"]),
+                "first": (1, ["1"]),
+                "mouse": (2, ["3", "4"]),
+                "second": (1, ["2"]),
+            },
+        )
+        self.assertEqual(
+            list(self.tb.listNamesByTag(tags=[Tag.fromStr("cat")], per_tag=2).items()),
+            [("cat", (3, ["1", "1a"])), ("first", (1, ["1"])), ("mouse", (1, ["4"]))],
+        )
+        self.assertEqual(
+            self.tb.listNamesByTag(under=Name.fromStr("1"), where="!#first"),
+            {"cat": (1, ["1a"])},
+        )
+
     def test_listThoughtsByTags_with_name(self):
         d = self.tb.listThoughtsByTag(names=[Name.fromStr(n) for n in ["1", "3"]])
         d_comp = {tag.title: [(str(t.name), t.title) for t in d[tag]] for tag in d}
@@ -340,6 +462,274 @@ class ThoughtBoxTests(unittest.TestCase):
         self.assertIn("dog", tag_strs)
         self.assertIn("mouse", tag_strs)
 
+    def test_iterThoughts(self):
+        thoughts = self.tb.iterThoughts(tags=[Tag.fromStr("dog")])
+        self.assertEqual(next(thoughts).title, "second")
+        self.assertEqual([t.title for t in thoughts], ["third"])
+
+    def test_listThoughts_paged(self):
+        for name in ["1a", "2a", "10"]:
+            self._addThought(name=name, title=name, tags=["cat"], links=[])
+
+        thoughts = self.tb.listThoughts(limit=3)
+        self.assertEqual([str(t.name) for t in thoughts], ["1", "1a", "2"])
+
+        thoughts = self.tb.listThoughts(after=Name.fromStr("2"), limit=3)
+        self.assertEqual([str(t.name) for t in thoughts], ["2a", "3", "4"])
+
+        thoughts = self.tb.listThoughts(after=Name.fromStr("4"), limit=3)
+        self.assertEqual([str(t.name) for t in thoughts], ["10"])
+
+        thoughts = self.tb.listThoughts(
+            tags=[Tag.fromStr("cat")], after=Name.fromStr("1"), limit=2
+        )
+        self.assertEqual([str(t.name) for t in thoughts], ["1a", "2a"])
+        self.assertEqual([t.title for t in thoughts[0].tags], ["cat"])
+
+        # Thoughts matching several of the tags or links are listed once.
+        thoughts = self.tb.listThoughts(
+            tags=[Tag.fromStr("cat"), Tag.fromStr("mouse")], linked_to=["1", "3"]
+        )
+        self.assertEqual([str(t.name) for t in thoughts], ["1", "4"])
+
+    def test_listThoughts_paged_plan(self):
+        # A page is read from the sort_key index, not by scanning and sorting all the thoughts.
+        query, parameters = self.tb._selectThoughts(after=Name.fromStr("2"), limit=3)
+        plan = [row[3] for row in self.tb.conn.execute("EXPLAIN QUERY PLAN " + query, parameters)]
+        self.assertEqual(len(plan), 1)
+        self.assertIn("USING INDEX thoughts_sort_key", plan[0])
+
+    def test_listThoughts_under(self):
+        for name in ["2a", "2a1", "2b", "20", "3a1"]:
+            self._addThought(name=name, title=name, tags=[], links=[])
+
+        thoughts = self.tb.listThoughts(under=Name.fromStr("2"))
+        self.assertEqual(
+            [str(t.name) for t in thoughts], ["2", "2a", "2a1", "2b"]
+        )
+
+        thoughts = self.tb.subtree(Name.fromStr("2a"))
+        self.assertEqual([str(t.name) for t in thoughts], ["2a", "2a1"])
+
+        thoughts = self.tb.listThoughts(
+            under=Name.fromStr("2"), tags=[Tag.fromStr("dog")]
+        )
+        self.assertEqual([str(t.name) for t in thoughts], ["2"])
+
+    def test_listThoughts_sorted(self):
+        for name in ["10", "1a", "2b", "2a"]:
+            self._addThought(name=name, title=name, tags=[], links=[])
+
+        thoughts = self.tb.listThoughts()
+        self.assertEqual(
+            [str(t.name) for t in thoughts],
+            ["1", "1a", "2", "2a", "2b", "3", "4", "10"],
+        )
+
+    def test_subtreeCounts(self):
+        for name in ["2a", "2a1", "2a2", "2b", "2c1", "3a1"]:
+            self._addThought(name=name, title=name, tags=[], links=[])
+
+        self.assertEqual(
+            self.tb.subtreeCounts(Name.fromStr("2")), {"2a": 3, "2b": 1, "2c": 1}
+        )
+        self.assertEqual(
+            self.tb.subtreeCounts(), {"1": 1, "2": 6, "3": 2, "4": 1}
+        )
+        self.assertEqual(self.tb.subtreeCounts(Name.fromStr("4")), {})
+
+    def test_rename_subtree_key(self):
+        self._addThought(name="2a", title="2a", tags=[], links=[])
+        self.tb.rename(Name.fromStr("2a"), Name.fromStr("3a"))
+
+        thoughts = self.tb.subtree(Name.fromStr("3"))
+        self.assertEqual([str(t.name) for t in thoughts], ["3", "3a"])
+        thoughts = self.tb.subtree(Name.fromStr("2"))
+        self.assertEqual([str(t.name) for t in thoughts], ["2"])
+
+    def test_moveSubtree(self):
+        self._addThought(name="2a", title="2a", tags=["dog"], links=["2a1"])
+        self._addThought(name="2a1", title="2a1", tags=["kitten"], links=["1"])
+
+        mapping, needs_updating = self.tb.moveSubtree(
+            Name.fromStr("2"), Name.fromStr("5c1")
+        )
+        self.assertEqual(mapping, {"2": "5c1", "2a": "5c1a", "2a1": "5c1a1"})
+        self.assertEqual(needs_updating, ["1", "5c1a"])
+
+        thoughts = self.tb.listThoughts()
+        self.assertEqual(
+            [str(t.name) for t in thoughts], ["1", "3", "4", "5c1", "5c1a", "5c1a1"]
+        )
+        thoughts = self.tb.subtree(Name.fromStr("5c1a"))
+        self.assertEqual(
+            [(str(t.name), [t.title for t in t.tags]) for t in thoughts],
+            [("5c1a", ["dog"]), ("5c1a1", ["kitten"])],
+        )
+
+        # Links out are moved, links in are left as is.
+        thoughts = self.tb.listThoughts(linked_to=["1"])
+        self.assertEqual([str(t.name) for t in thoughts], ["4", "5c1a1"])
+        thoughts = self.tb.listThoughts(linked_to=["2"])
+        self.assertEqual([str(t.name) for t in thoughts], ["1"])
+
+    def test_moveSubtree_update_links(self):
+        self._addThought(name="2a", title="2a", tags=[], links=["2"])
+
+        mapping, needs_updating = self.tb.moveSubtree(
+            Name.fromStr("2"), Name.fromStr("5"), update_links=True
+        )
+        self.assertEqual(needs_updating, ["1", "5a"])
+        thoughts = self.tb.listThoughts(linked_to=["5"])
+        self.assertEqual([str(t.name) for t in thoughts], ["1", "5a"])
+        thoughts = self.tb.listThoughts(linked_to=["2"])
+        self.assertEqual(thoughts, [])
+
+    def test_moveSubtree_raise(self):
+        self._addThought(name="4a", title="4a", tags=[], links=[])
+        with self.assertRaises(ValueError):
+            self.tb.moveSubtree(Name.fromStr("2"), Name.fromStr("4"))
+        with self.assertRaises(ValueError):
+            self.tb.moveSubtree(Name.fromStr("2"), Name.fromStr("2a1"))
+
+        thoughts = self.tb.listThoughts()
+        self.assertEqual(
+            [str(t.name) for t in thoughts], ["1", "2", "3", "4", "4a"]
+        )
+
+    def test_stats(self):
+        self._addThought(name="2a1", title="deep", tags=["cat"], links=["9", "1"])
+
+        stats = self.tb.stats(top_tags=2)
+        self.assertEqual(stats["thoughts"], 5)
+        self.assertEqual(stats["tags"], 5)
+        self.assertEqual(stats["links"], 8)
+        self.assertEqual(stats["tag_links"], 9)
+        self.assertEqual(stats["broken_links"], 1)
+        self.assertEqual(stats["out_degree"], {1: 2, 2: 3})
+        self.assertEqual(stats["in_degree"], {0: 1, 1: 1, 2: 3})
+        self.assertEqual(stats["top_tags"], [["cat", 3], ["dog", 2]])
+        self.assertEqual(stats["deepest"], {"name": "2a1", "depth": 3})
+
+    def test_brokenLinks_and_orphans(self):
+        self._addThought(name="2a1", title="deep", tags=[], links=["9", "1"])
+        self._addThought(name="5", title="alone", tags=[], links=["5", "10"])
+        self.assertEqual(self.tb.brokenLinks(), [("2a1", "9"), ("5", "10")])
+        self.assertEqual(self.tb.orphans(), ["2a1", "5"])
+
+        self.tb.delete(Name.fromStr("1"))
+        self.assertEqual(
+            self.tb.brokenLinks(), [("2a1", "1"), ("2a1", "9"), ("4", "1"), ("5", "10")]
+        )
+
+    def test_computeComponents(self):
+        self._addThought(name="5", title="fifth", tags=["lonely"], links=["9"])
+        self._addThought(name="6", title="sixth", tags=["lonely"], links=[])
+        self._addThought(name="7", title="seventh", tags=[], links=["7"])
+        self.assertEqual(self.tb.computeComponents(), {0: 4, 1: 2, 2: 1})
+        self.assertEqual(
+            [str(t.name) for t in self.tb.listThoughts(component=1)], ["5", "6"]
+        )
+
+        # The components are recomputed after a change.
+        self._addThought(name="7", title="seventh", tags=["lonely"], links=[])
+        self.assertEqual(
+            [str(t.name) for t in self.tb.listThoughts(component=1)], ["5", "6", "7"]
+        )
+
+    def test_stats_empty(self):
+        db_file = tempfile.NamedTemporaryFile()
+        tb = ThoughtBox(db_file.name, explicitly_create_tables=True)
+        stats = tb.stats()
+        self.assertEqual(stats["thoughts"], 0)
+        self.assertEqual(stats["out_degree"], {})
+        self.assertEqual(stats["top_tags"], [])
+        self.assertIsNone(stats["deepest"])
+        db_file.close()
+
+    def test_cache(self):
+        tb = ThoughtBox(self.db_file.name, cache_size=8)
+        self.assertIsNone(self.tb.cacheStats())
+        first = tb.listThoughts(tags=[Tag.fromStr("dog"), Tag.fromStr("cat")])
+        self.assertEqual(tb.listThoughts(tags=[Tag.fromStr("cat"), Tag.fromStr("dog")]), first)
+        tb.listTags()
+        tb.listTags()
+        stats = tb.cacheStats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+
+        # Writes through this box.
+        tb.delete(Name.fromStr("4"))
+        self.assertEqual(
+            [str(t.name) for t in tb.listThoughts(tags=[Tag.fromStr("cat")])], ["1"]
+        )
+        # Writes through another connection.
+        self._addThought(name="5", title="fifth", tags=["cat"], links=[])
+        self.assertEqual(
+            [str(t.name) for t in tb.listThoughts(tags=[Tag.fromStr("cat")])], ["1", "5"]
+        )
+        self.assertEqual(tb.listNamesByTag(tags=[Tag.fromStr("cat")])["cat"], (2, ["1", "5"]))
+
+        # A rolled back write.
+        with self.assertRaises(KeyError):
+            with tb.transaction():
+                tb.delete(Name.fromStr("5"))
+                self.assertEqual(len(tb.listThoughts(tags=[Tag.fromStr("cat")])), 1)
+                raise KeyError()
+        self.assertEqual(len(tb.listThoughts(tags=[Tag.fromStr("cat")])), 2)
+
+    def test_cache_components(self):
+        for name, links in [("5", ["6", "7"]), ("6", ["5", "7"]), ("7", ["5", "6"])]:
+            self._addThought(name=name, title=name, tags=["bird", "fish"], links=links)
+        self._addThought(name="4", title="forth", tags=["cat", "mouse"], links=["1", "3", "5"])
+        tb = ThoughtBox(self.db_file.name, cache_size=8)
+
+        tb.computeComponents()
+        self.assertEqual(len(tb.listThoughts(component=0)), 7)
+        # Recomputing the components changes the results, though the thoughts have not changed.
+        tb.computeComponents(clusters=True)
+        self.assertEqual(
+            [str(t.name) for t in tb.listThoughts(component=0)],
+            [str(t.name) for t in self.tb.listThoughts(component=0)],
+        )
+        self.assertLess(len(tb.listThoughts(component=0)), 7)
+
+    def test_transaction(self):
+        other = ThoughtBox(self.db_file.name)
+        with self.tb.transaction():
+            self._addThought(name="5", title="fifth", tags=["new"], links=["1"])
+            with self.tb.transaction():
+                self.tb.delete(Name.fromStr("2"))
+            # Not visible to other connections until the transaction is committed.
+            self.assertEqual(len(other.listThoughts()), 4)
+        self.assertEqual(
+            [str(t.name) for t in other.listThoughts()], ["1", "3", "4", "5"]
+        )
+
+    def test_transaction_rollback(self):
+        with self.assertRaises(KeyError):
+            with self.tb.transaction():
+                self._addThought(name="5", title="fifth", tags=[], links=[])
+                raise KeyError()
+        self.assertEqual(
+            [str(t.name) for t in self.tb.listThoughts()], ["1", "2", "3", "4"]
+        )
+
+    def test_transaction_nested_rollback(self):
+        with self.tb.transaction():
+            self._addThought(name="5", title="fifth", tags=[], links=[])
+            with self.assertRaises(KeyError):
+                with self.tb.transaction():
+                    self.tb.delete(Name.fromStr("2"))
+                    raise KeyError()
+            # Only the nested block's writes are rolled back.
+            self.assertEqual(
+                [str(t.name) for t in self.tb.listThoughts()], ["1", "2", "3", "4", "5"]
+            )
+        other = ThoughtBox(self.db_file.name)
+        self.assertEqual(
+            [str(t.name) for t in other.listThoughts()], ["1", "2", "3", "4", "5"]
+        )
+
 
 class ThoughtBox_PersistenceTests(unittest.TestCase):
     def _addThought(
@@ -430,3 +820,47 @@ class ThoughtBox_PersistenceTests(unittest.TestCase):
             thought_strs,
             [("1", "first"), ("2", "second"), ("3", "third"), ("4", "forth"), ("5","linkless")],
         )
+
+    def test_upgrade_old_tables(self):
+        old_file = tempfile.NamedTemporaryFile()
+        conn = sqlite3.connect(old_file.name)
+        conn.execute("CREATE TABLE thoughts (number TEXT PRIMARY KEY, title TEXT)")
+        conn.execute(
+            "CREATE TABLE tags (number INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT UNIQUE)"
+        )
+        conn.execute("CREATE TABLE links (source TEXT, target TEXT)")
+        conn.execute("CREATE TABLE tag_links (thought TEXT, tag INTEGER)")
+        conn.execute(
+            "INSERT INTO thoughts (number, title) "
+            "VALUES ('10', 'ten'), ('1a', 'one a'), ('1', 'one')"
+        )
+        conn.commit()
+        conn.close()
+
+        tb = ThoughtBox(old_file.name)
+        thoughts = tb.listThoughts()
+        self.assertEqual([str(t.name) for t in thoughts], ["1", "1a", "10"])
+        self.assertEqual(
+            [str(t.name) for t in tb.subtree(Name.fromStr("1"))], ["1", "1a"]
+        )
+        old_file.close()
+
+    def test_open_writes_nothing(self):
+        ThoughtBox(self.db_file.name).conn.close()
+        tb = ThoughtBox(self.db_file.name)
+        self.assertEqual(tb.conn.total_changes, 0)
+
+        # Another connection holding the write lock does not stop the database being opened and
+        # read.
+        other = sqlite3.connect(self.db_file.name, timeout=0.1)
+        other.execute("BEGIN IMMEDIATE")
+        tb = ThoughtBox(self.db_file.name)
+        self.assertEqual(len(tb.listThoughts()), 4)
+        other.rollback()
+        other.close()
+
+    def test_read_only(self):
+        tb = ThoughtBox(self.db_file.name, read_only=True)
+        self.assertEqual(len(tb.listThoughts()), 4)
+        with self.assertRaises(sqlite3.OperationalError):
+            tb.delete(Name.fromStr("1"))
@@ -2,6 +2,8 @@ import unittest
 import tempfile
 import os
 
+from unittest import mock
+
 from typing import List, Dict
 
 from ..ThoughtBoxDir import ThoughtBoxDir
@@ -245,3 +247,95 @@ class ThoughtBoxDirTests(unittest.TestCase):
         self.assertEqual(name_1, self.tbd.createNew(name_1))
 
         self.tbd.delete(name_1)
+
+    def test_listNames(self):
+        for n in ["2", "10", "1a", "1"]:
+            self.tbd.createNew(Name.fromStr(n), force_override=True)
+        with open(os.path.join(self.dir_name, "notes.txt"), "w") as f:
+            f.write("not a thought")
+
+        self.assertEqual(
+            [str(n) for n in self.tbd.listNames()], ["1", "1a", "2", "10"]
+        )
+
+    def test_moveSubtree(self):
+        for n in ["1", "2", "2a", "2a1", "2b"]:
+            self.tbd.createNew(Name.fromStr(n), force_override=True)
+
+        mapping = self.tbd.moveSubtree(Name.fromStr("2a"), Name.fromStr("1c"))
+        self.assertEqual(mapping, {"2a": "1c", "2a1": "1c1"})
+        self.assertEqual(
+            [str(n) for n in self.tbd.listNames()], ["1", "1c", "1c1", "2", "2b"]
+        )
+
+    def test_moveSubtree_raise(self):
+        for n in ["1", "1a", "2", "2a"]:
+            self.tbd.createNew(Name.fromStr(n), force_override=True)
+
+        with self.assertRaises(FileNotFoundError):
+            self.tbd.moveSubtree(Name.fromStr("3"), Name.fromStr("4"))
+        with self.assertRaises(FileExistsError):
+            self.tbd.moveSubtree(Name.fromStr("2"), Name.fromStr("1"))
+        with self.assertRaises(ValueError):
+            self.tbd.moveSubtree(Name.fromStr("2"), Name.fromStr("1a"))
+
+        self.assertEqual(
+            [str(n) for n in self.tbd.listNames()], ["1", "1a", "2", "2a"]
+        )
+
+    def test_moveSubtree_undo(self):
+        for n in ["1", "2", "2a", "2b"]:
+            self.tbd.createNew(Name.fromStr(n), force_override=True)
+
+        rename = os.rename
+        calls = []
+
+        def failing_rename(src, dst):
+            calls.append(src)
+            if len(calls) == 3:
+                raise PermissionError()
+            rename(src, dst)
+
+        with mock.patch("os.rename", failing_rename):
+            with self.assertRaises(PermissionError):
+                self.tbd.moveSubtree(Name.fromStr("2"), Name.fromStr("3"))
+        self.assertEqual(
+            [str(n) for n in self.tbd.listNames()], ["1", "2", "2a", "2b"]
+        )
+
+    def test_rewriteLinks(self):
+        path = self.tbd.getPath(self.tbd.createNew(Name.fromStr("1")))
+        with open(path, "w") as tf:
+            tf.write("# one\n")
+            tf.write("links to [[2]], [[2a]] and [[3]]\n")
+
+        changed = self.tbd.rewriteLinks(["1", "4"], {"2": "5", "2a": "5a"})
+        self.assertEqual(changed, ["1"])
+        self.assertEqual(
+            [str(l.target) for l in self.tbd.read(Name.fromStr("1")).links],
+            ["3", "5", "5a"],
+        )
+
+    def test_findNames(self):
+        for n in ["1", "2", "2a", "2b", "3", "10", "21"]:
+            self.tbd.createNew(Name.fromStr(n), force_override=True)
+
+        def find(patterns):
+            return [str(n) for n in self.tbd.findNames(patterns)]
+
+        self.assertEqual(find(["3", "1", "7"]), ["1", "3", "7"])
+        self.assertEqual(find(["2*"]), ["2", "2a", "2b", "21"])
+        self.assertEqual(find(["2?"]), ["2a", "2b", "21"])
+        self.assertEqual(find(["2a..3"]), ["2a", "2b", "3"])
+        self.assertEqual(find(["2a..3", "3", "1?"]), ["2a", "2b", "3", "10"])
+
+    def test_readMany(self):
+        for n in ["1", "2", "3"]:
+            self.tbd.createNew(Name.fromStr(n), force_override=True)
+
+        names = [Name.fromStr(n) for n in ["1", "4", "2", "3"]]
+        results = self.tbd.readMany(names, workers=2)
+        self.assertEqual([str(n) for n, r in results], ["1", "4", "2", "3"])
+        self.assertEqual(results[0][1].title, "<+title+>")
+        self.assertIsInstance(results[1][1], FileNotFoundError)
+        self.assertEqual(results[3][1].name, Name.fromStr("3"))
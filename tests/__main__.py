@@ -1,9 +1,21 @@
 import unittest
 
+from pythoughts.tests.AsyncThoughtBox import *
+from pythoughts.tests.AsyncThoughtBoxDir import *
+from pythoughts.tests.Graph import *
 from pythoughts.tests.Name import *
+from pythoughts.tests.QueryCache import *
+from pythoughts.tests.SqlMonitor import *
 from pythoughts.tests.Thought import *
 from pythoughts.tests.ThoughtBox import *
 from pythoughts.tests.ThoughtBoxDir import *
+from pythoughts.tests.benchmarks import *
 from pythoughts.tests.cli import *
+from pythoughts.tests.clusters import *
+from pythoughts.tests.minhash import *
+from pythoughts.tests.query import *
+from pythoughts.tests.rank import *
+from pythoughts.tests.server import *
+from pythoughts.tests.timing import *
 
 unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import tempfile
+
+from ..benchmarks import harness, memory, suite, synthetic
+from ..Thought import Thought
+
+
+class SyntheticTests(unittest.TestCase):
+    def test_names(self):
+        names = [str(n) for n in synthetic.names(200, seed=3)]
+        self.assertEqual(names, [str(n) for n in synthetic.names(200, seed=3)])
+        self.assertNotEqual(names, [str(n) for n in synthetic.names(200, seed=4)])
+        self.assertEqual(len(set(names)), 200)
+        self.assertEqual(names[0], "1")
+        self.assertTrue(any(len(n) > 3 for n in names))
+
+    def test_thoughts_round_trip(self):
+        for thought in synthetic.thoughts(50, seed=1):
+            parsed = Thought.parse(synthetic.to_text(thought).split("\n"), thought.name)
+            self.assertEqual(parsed.title, thought.title)
+            self.assertEqual([t.title for t in parsed.tags], [t.title for t in thought.tags])
+            self.assertEqual(
+                sorted(set(l.target for l in parsed.links)), [l.target for l in thought.links]
+            )
+
+
+class HarnessTests(unittest.TestCase):
+    def test_box(self):
+        thoughts = list(synthetic.thoughts(50, seed=2))
+        with tempfile.TemporaryDirectory() as directory:
+            box = harness.Box(directory, 50, seed=2)
+            self.assertEqual(len(box.tb.listThoughts()), 50)
+            self.assertEqual([str(t.name) for t in box.sample], [str(t.name) for t in thoughts])
+            self.assertEqual(str(box.middle), str(thoughts[25].name))
+            self.assertTrue(box.tb.listThoughts(tags=[box.common_tag]))
+            box.tb.conn.close()
+
+
+class SuiteTests(unittest.TestCase):
+    def test_run_scale(self):
+        results = suite.run_scale(50, ["listThoughts", "Thought.parse"], repeat=1)
+        self.assertEqual(results["listThoughts"]["items"], 50)
+        self.assertGreater(results["Thought.parse"]["seconds"], 0)
+
+    def test_compare(self):
+        baseline = {"results": {"10": {"a": {"seconds": 1.0}, "b": {"seconds": 1.0}}}}
+        results = {
+            "results": {"10": {"a": {"seconds": 1.1}, "b": {"seconds": 1.5}, "c": {"seconds": 1}}}
+        }
+        report = suite.compare(results, baseline, 0.2)
+        self.assertEqual(len(report), 2)
+        self.assertTrue(report[0].endswith("ok"))
+        self.assertTrue(report[1].endswith("REGRESSION"))
+
+
+class MemoryTests(unittest.TestCase):
+    def test_footprint(self):
+        shared = "shared"
+        types = memory.footprint([shared, shared, ("a", 1), {"b": [2.0]}])
+        self.assertEqual(types["list"]["count"], 2)
+        self.assertEqual(types["str"]["count"], 3)
+        self.assertEqual(types["tuple"]["count"], 1)
+        self.assertEqual(types["dict"]["count"], 1)
+        self.assertEqual(types["float"]["count"], 1)
+
+    def test_run_scale(self):
+        results = memory.run_scale(50, ["listThoughts", "Thought.parse"])
+        self.assertEqual(results["listThoughts"]["items"], 50)
+        self.assertIn("Thought", results["listThoughts"]["types"])
+        self.assertEqual(results["Thought.parse"]["types"]["Thought"]["count"], 50)
+        parse = results["Thought.parse"]
+        self.assertGreaterEqual(parse["peak"], parse["retained"])
+        self.assertGreater(results["Thought.parse"]["retained"], 0)
+
+    def test_compare(self):
+        baseline = {"results": {"10": {"a": {"peak": 100, "retained": 100}}}}
+        results = {"results": {"10": {"a": {"peak": 110, "retained": 150}}}}
+        report = memory.compare(results, baseline, 0.2)
+        self.assertEqual(len(report), 2)
+        self.assertTrue(report[0].endswith("ok"))
+        self.assertTrue(report[1].endswith("REGRESSION"))
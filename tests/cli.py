@@ -2,16 +2,23 @@ import unittest
 import tempfile
 import os
 import shutil
+import io
+import json
+
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
 
 from typing import List, Dict
 
-from ..cli import parse
+from ..cli import parse, COMMANDS, _name
+from ..client import COMMAND_NAMES
 from ..Name import Name
 from ..Tag import Tag
 from ..Link import Link
 from ..ThoughtBoxDir import ThoughtBoxDir
 from ..ThoughtBox import ThoughtBox
 from ..Thought import Thought
+from ..benchmarks.startup import imported_modules, PACKAGE
 
 class CliTests(unittest.TestCase):
     def _addThought(
@@ -68,9 +75,17 @@ class CliTests(unittest.TestCase):
         self.db_file = tempfile.NamedTemporaryFile()
         self.tb = ThoughtBox(self.db_file.name, explicitly_create_tables=True)
 
+        # Run the commands here, not on a server the user may have running.
+        self.old_socket = os.environ.get("PYTHOUGHTS_SOCKET")
+        os.environ["PYTHOUGHTS_SOCKET"] = ""
+
     def tearDown(self):
         self.dir.cleanup()
         self.db_file.close()
+        if self.old_socket is None:
+            del os.environ["PYTHOUGHTS_SOCKET"]
+        else:
+            os.environ["PYTHOUGHTS_SOCKET"] = self.old_socket
 
     def test_create(self):
         name_1 = Name.fromStr("1")
@@ -195,6 +210,22 @@ class CliTests(unittest.TestCase):
                          'INFO:root:second: 2'
                          ])
 
+    def test_read_by_tags_per_tag(self):
+        self._createFourThoughts()
+        self._addThought(name="5", title="fifth", tags=["cat"], links=[])
+
+        args = ['read','--by=tag','--per-tag','1','--where','#cat | #dog',
+                '--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                         'INFO:root:cat: 1, ... (3 in all)',
+                         'INFO:root:dog: 2, ... (2 in all)',
+                         'INFO:root:first: 1',
+                         'INFO:root:mouse: 3, ... (2 in all)',
+                         'INFO:root:second: 2'
+                         ])
+
     def test_read_by_detail(self):
         self._createFourThoughts()
 
@@ -266,6 +297,81 @@ class CliTests(unittest.TestCase):
                          'INFO:root:3: third'
                          ])
 
+    def test_read_under(self):
+        self._createFourThoughts()
+        self._addThought(name="2a", title="second a", tags=[], links=[])
+        self._addThought(name="2a1", title="second a one", tags=[], links=[])
+        self._addThought(name="2b", title="second b", tags=[], links=[])
+
+        args = ['read','--by=name','--under','2a', '--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                         'INFO:root:2a: second a',
+                         'INFO:root:2a1: second a one'
+                         ])
+
+        args = ['read','--by=count','--under','2', '--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                         'INFO:root:2a: 2',
+                         'INFO:root:2b: 1'
+                         ])
+
+    def test_read_paged(self):
+        self._createFourThoughts()
+
+        args = ['read','--by=name','--limit','2','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                         'INFO:root:1: first',
+                         'INFO:root:2: second'
+                         ])
+
+        args = ['read','--by=name','--after','2','--limit','1','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                         'INFO:root:3: third'
+                         ])
+
+    def test_read_jsonl(self):
+        self._createFourThoughts()
+
+        args = ['read','--by=detail','--format','jsonl','--tags','mouse',
+                '--database',self.db_file.name]
+        with redirect_stdout(io.StringIO()) as out, self.assertNoLogs(level='INFO'):
+            parse(args)
+        self.assertEqual(out.getvalue().splitlines(), [
+                         '{"name": "3", "title": "third", "tags": ["dog", "mouse"], '
+                         '"links": ["4"]}',
+                         '{"name": "4", "title": "fourth", "tags": ["cat", "mouse"], '
+                         '"links": ["1", "3"]}',
+                         ])
+
+        args = ['read','--by=tag','--format','jsonl','--tags','mouse',
+                '--database',self.db_file.name]
+        with redirect_stdout(io.StringIO()) as out:
+            parse(args)
+        self.assertEqual(out.getvalue().splitlines()[-1], '{"tag": "mouse", "names": ["3", "4"]}')
+
+    def test_read_tsv(self):
+        self._createFourThoughts()
+        self._addThought(name="5", title="a\ttab", tags=[], links=[])
+
+        args = ['read','--by=detail','--format','tsv','--names','1','5',
+                '--database',self.db_file.name]
+        with redirect_stdout(io.StringIO()) as out:
+            parse(args)
+        self.assertEqual(out.getvalue(), "1\tfirst\tcat,first\t2,3\n5\ta tab\t\t\n")
+
+        args = ['read','--by=name','--format','tsv','--database',self.db_file.name]
+        with redirect_stdout(io.StringIO()) as out:
+            parse(args)
+        self.assertEqual(out.getvalue().splitlines()[0], "1\tfirst")
+
     def test_write_full(self):
         self._createFourThoughts()
 
@@ -328,6 +434,60 @@ class CliTests(unittest.TestCase):
 
         test_db_file.close()
 
+    def test_parse_many(self):
+        self._createFourThoughts()
+
+        test_db_file = tempfile.NamedTemporaryFile()
+        test_tb = ThoughtBox(test_db_file.name, explicitly_create_tables=True)
+
+        args = ['parse','1','2..3','4*',
+                '--database',test_db_file.name, '--directory',self.files_path]
+        with self.assertNoLogs(level='INFO') as logs:
+            parse(args)
+
+        self.assertEqual(self.tb.listThoughts(), test_tb.listThoughts())
+        test_db_file.close()
+
+    def test_parse_all(self):
+        self._createFourThoughts()
+
+        test_db_file = tempfile.NamedTemporaryFile()
+        test_tb = ThoughtBox(test_db_file.name, explicitly_create_tables=True)
+
+        args = ['parse','--all','--database',test_db_file.name, '--directory',self.files_path]
+        with self.assertNoLogs(level='INFO') as logs:
+            parse(args)
+
+        self.assertEqual(self.tb.listThoughts(), test_tb.listThoughts())
+        test_db_file.close()
+
+    def test_parse_failures(self):
+        shutil.copytree(self.files_path, self.dir.name, dirs_exist_ok=True)
+        with open(os.path.join(self.dir.name, "5.tb"), "wb") as f:
+            f.write(b"# bad\n\xff\xfe\n")
+
+        args = ['parse','1','5','6','--database',self.db_file.name, '--directory',self.dir.name]
+        with self.assertLogs(level='INFO') as logs:
+            with self.assertRaises(SystemExit) as cm:
+                parse(args)
+        self.assertEqual(cm.exception.code, 1)
+        self.assertEqual(len(logs.output), 3)
+        self.assertTrue(logs.output[0].startswith('ERROR:root:Failed to parse 5:'))
+        self.assertEqual(logs.output[1:], [
+                             'ERROR:root:Failed to parse 6, file not found.',
+                             'ERROR:root:Parsed 1 of 3 thoughts.',
+                         ])
+
+        thoughts = self.tb.listThoughts()
+        self.assertEqual([str(t.name) for t in thoughts], ["1"])
+
+        args = ['parse','7*','--database',self.db_file.name, '--directory',self.dir.name]
+        with self.assertLogs(level='INFO') as logs:
+            with self.assertRaises(SystemExit) as cm:
+                parse(args)
+        self.assertEqual(cm.exception.code, 1)
+        self.assertEqual(logs.output, ['ERROR:root:No thoughts to parse.'])
+
     def test_rename(self):
         self._createFourThoughts()
         shutil.copytree(self.files_path, self.dir.name, dirs_exist_ok=True)
@@ -441,6 +601,89 @@ class CliTests(unittest.TestCase):
         dir_list_after = os.listdir(self.dir_name)
         self.assertEqual(dir_list,dir_list_after)
 
+    def test_rename_subtree(self):
+        self._createFourThoughts()
+        shutil.copytree(self.files_path, self.dir.name, dirs_exist_ok=True)
+        self.tbd.createNew(Name.fromStr("2a"), force_override=True)
+        self._addThought(name="2a", title="<+title+>", tags=[], links=[])
+
+        args = ['rename','--from','2','--to','5','--subtree',
+                '--database',self.db_file.name, '--directory',self.dir.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                             'INFO:root:Successfully moved 2 thoughts from 2 to 5.',
+                             'INFO:root:The following thoughts need updating:',
+                             'INFO:root:1',
+                         ])
+
+        thoughts = self.tb.listThoughts()
+        self.assertEqual(
+            [str(t.name) for t in thoughts], ["1", "3", "4", "5", "5a"]
+        )
+        self.assertEqual(
+            [str(n) for n in self.tbd.listNames()], ["1", "3", "4", "5", "5a"]
+        )
+
+    def test_rename_subtree_conflict(self):
+        self._createFourThoughts()
+        shutil.copytree(self.files_path, self.dir.name, dirs_exist_ok=True)
+
+        # 4 is taken in the database, so no file is moved.
+        args = ['rename','--from','2','--to','4','--subtree',
+                '--database',self.db_file.name, '--directory',self.dir.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                             'ERROR:root:Failed to move 2: Can not move 2 to 4, 4 already exists.',
+                         ])
+        self.assertEqual([str(n) for n in self.tbd.listNames()], ["1", "2", "3", "4"])
+
+        # 5 is taken on disk, so the move in the database is rolled back.
+        self.tbd.createNew(Name.fromStr("5"))
+        args = ['rename','--from','2','--to','5','--subtree',
+                '--database',self.db_file.name, '--directory',self.dir.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                             'ERROR:root:Failed to move 2 to 5, file already exists.',
+                         ])
+        self.assertEqual([str(t.name) for t in self.tb.listThoughts()], ["1", "2", "3", "4"])
+        self.assertEqual([str(n) for n in self.tbd.listNames()], ["1", "2", "3", "4", "5"])
+
+    def test_rename_subtree_update_links(self):
+        self._createFourThoughts()
+        shutil.copytree(self.files_path, self.dir.name, dirs_exist_ok=True)
+
+        args = ['rename','--from','2','--to','5','--subtree','--update-links',
+                '--database',self.db_file.name, '--directory',self.dir.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                             'INFO:root:Successfully moved 1 thoughts from 2 to 5.',
+                             'INFO:root:Updated the links in:',
+                             'INFO:root:1',
+                         ])
+
+        links = [str(l.target) for l in self.tbd.read(Name.fromStr("1")).links]
+        self.assertEqual(links, ["3", "5"])
+        thoughts = self.tb.listThoughts(linked_to=["5"])
+        self.assertEqual([str(t.name) for t in thoughts], ["1"])
+
+        args = ['rename','--from','5','--to','6','--subtree','--update-links',
+                '--database',self.db_file.name, '--directory',self.dir.name]
+        denied = PermissionError("denied")
+        with mock.patch.object(ThoughtBoxDir, "rewriteLinks", side_effect=denied):
+            with self.assertLogs(level='INFO') as logs:
+                parse(args)
+        self.assertEqual(logs.output, [
+                             'INFO:root:Successfully moved 1 thoughts from 5 to 6.',
+                             'ERROR:root:Failed to update the links in the files: denied.'
+                             ' The links in the database point at the new names,'
+                             ' so the links in these thoughts need updating:',
+                             'ERROR:root:1',
+                         ])
+
     def test_delete_success(self):
         self._createFourThoughts()
         shutil.copytree(self.files_path, self.dir.name, dirs_exist_ok=True)
@@ -530,3 +773,266 @@ class CliTests(unittest.TestCase):
             thought_strs,
             [],
         )
+
+    def test_stats(self):
+        self._createFourThoughts()
+
+        args = ['stats','--top','2','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                             'INFO:root:thoughts: 4',
+                             'INFO:root:tags: 5',
+                             'INFO:root:links: 6',
+                             'INFO:root:tag_links: 8',
+                             'INFO:root:broken_links: 0',
+                             'INFO:root:out_degree: 1: 2, 2: 2',
+                             'INFO:root:in_degree: 1: 2, 2: 2',
+                             'INFO:root:top_tags: cat (2), dog (2)',
+                             'INFO:root:deepest: 1 (1)',
+                         ])
+
+        args = ['stats','--json','--database',self.db_file.name]
+        with redirect_stdout(io.StringIO()) as out:
+            parse(args)
+        stats = json.loads(out.getvalue())
+        self.assertEqual(stats["thoughts"], 4)
+        self.assertEqual(stats["in_degree"], {"1": 2, "2": 2})
+
+    def test_read_where(self):
+        self._createFourThoughts()
+
+        args = ['read','--by','name','--where','#dog & !->4 | #cat & ->2',
+                '--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, ['INFO:root:1: first'])
+
+        args = ['read','--by','name','--where','#dog &','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            with self.assertRaises(SystemExit) as cm:
+                parse(args)
+        self.assertEqual(cm.exception.code, 1)
+        self.assertEqual(len(logs.output), 1)
+        self.assertTrue(logs.output[0].startswith('ERROR:root:Invalid --where query: Expected'))
+
+    def test_slow_sql(self):
+        self._createFourThoughts()
+
+        args = ['--slow-sql','0','read','--by','name','--names','1','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertIn('INFO:root:1: first', logs.output)
+        self.assertTrue(any(line.startswith('WARNING:root:Slow query') for line in logs.output))
+
+    def test_tags(self):
+        self._createFourThoughts()
+
+        args = ['tags','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                             'INFO:root:cat',
+                             'INFO:root:dog',
+                             'INFO:root:first',
+                             'INFO:root:mouse',
+                             'INFO:root:second',
+                         ])
+
+        args = ['tags','--related','cat','--score','jaccard','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, ['INFO:root:0.5 first', 'INFO:root:0.3333 mouse'])
+
+    def test_similar(self):
+        self._createFourThoughts()
+        self._addThought(name="5", title="fourth", tags=["cat", "mouse"], links=["1", "3"])
+
+        args = ['similar','4','--limit','1','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, ['INFO:root:1 5'])
+
+        self.tb.conn.execute("DELETE FROM signatures")
+        self.tb.conn.commit()
+        with self.assertLogs(level='INFO') as logs:
+            with self.assertRaises(SystemExit) as cm:
+                parse(args)
+        self.assertEqual(cm.exception.code, 1)
+        self.assertEqual(len(logs.output), 1)
+        self.assertTrue(logs.output[0].startswith('ERROR:root:4 has no similarity signature'))
+
+    def test_rank(self):
+        self._createFourThoughts()
+
+        args = ['rank','--by','in_degree','--limit','2','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, ['INFO:root:2 3', 'INFO:root:2 4'])
+
+        args = ['rank','--cached','--format','jsonl','--database',self.db_file.name]
+        with redirect_stdout(io.StringIO()) as out:
+            parse(args)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(list(rows[0].keys()), ["name", "pagerank"])
+        self.assertAlmostEqual(sum(row["pagerank"] for row in rows), 1.0)
+
+    def test_components(self):
+        self._createFourThoughts()
+        self._addThought(name="5", title="fifth", tags=["lonely"], links=[])
+
+        args = ['components','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, ['INFO:root:0: 4', 'INFO:root:1: 1'])
+
+        args = ['read','--by','name','--component','1','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, ['INFO:root:5: fifth'])
+
+    def test_check_links(self):
+        self._createFourThoughts()
+
+        args = ['check-links','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, ['INFO:root:0 broken links, 0 orphans.'])
+
+        self._addThought(name="5", title="fifth", tags=[], links=["7"])
+        with self.assertLogs(level='INFO') as logs:
+            with self.assertRaises(SystemExit) as cm:
+                parse(args)
+        self.assertEqual(cm.exception.code, 1)
+        self.assertEqual(logs.output, [
+                             'WARNING:root:Broken link: 5 -> 7',
+                             'INFO:root:Orphan: 5',
+                             'INFO:root:1 broken links, 1 orphans.',
+                         ])
+
+        with redirect_stdout(io.StringIO()) as out:
+            with self.assertRaises(SystemExit):
+                parse(args + ['--json'])
+        self.assertEqual(
+            json.loads(out.getvalue()),
+            {"broken_links": [["5", "7"]], "orphans": ["5"]},
+        )
+
+    def test_path(self):
+        self._createFourThoughts()
+
+        args = ['path','1','4','--all','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                             'INFO:root:1 -> 2 -> 4',
+                             'INFO:root:1 -> 3 -> 4',
+                         ])
+
+        args = ['path','1','4','--max-depth','1','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, ['INFO:root:No path from 1 to 4.'])
+
+    def test_profile_summary(self):
+        self._createFourThoughts()
+
+        args = ['--profile', 'summary', 'read','--by=name','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs, redirect_stderr(io.StringIO()) as err:
+            parse(args)
+        self.assertEqual(len(logs.output), 4)
+        phases = [line.split()[0] for line in err.getvalue().splitlines()]
+        self.assertIn("sql", phases)
+        self.assertIn("arguments", phases)
+        self.assertEqual(phases[-1], "total")
+
+    def test_profile_cprofile(self):
+        self._createFourThoughts()
+        output = os.path.join(self.dir.name, "out.prof")
+
+        args = ['--profile', 'cprofile', '--profile-output', output, 'read','--by=name',
+                '--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs, redirect_stderr(io.StringIO()):
+            parse(args)
+        self.assertTrue(os.path.exists(output))
+
+    def test_batch(self):
+        self._createFourThoughts()
+        shutil.copytree(self.files_path, self.dir.name, dirs_exist_ok=True)
+
+        batch_file = os.path.join(self.dir.name, "commands.txt")
+        with open(batch_file, "w") as f:
+            f.write(f"# a comment\n")
+            f.write(f"write 5 fifth --tag cat --database {self.db_file.name}\n")
+            f.write(f'["write", "6", "sixth thought", "--database", "{self.db_file.name}"]\n')
+            f.write(f"\n")
+            f.write(f"read --by=nothing --database {self.db_file.name}\n")
+            f.write(f"delete 2 --database {self.db_file.name} --directory {self.dir.name}\n")
+            f.write(f"read --by=name --tags cat --database {self.db_file.name}\n")
+
+        args = ['batch', batch_file, '--transaction-size', '2']
+        with self.assertLogs(level='INFO') as logs, redirect_stderr(io.StringIO()):
+            parse(args)
+        self.assertEqual(logs.output, [
+                             'ERROR:root:Line 5: failed with exit code 2.',
+                             'INFO:root:Successfully deleted 2.',
+                             'INFO:root:The following thoughts pointed at it:',
+                             'INFO:root:1',
+                             'INFO:root:1: first',
+                             'INFO:root:4: fourth',
+                             'INFO:root:5: fifth',
+                         ])
+
+        thoughts = self.tb.listThoughts()
+        thought_strs = [(str(t.name), t.title) for t in thoughts]
+        self.assertEqual(
+            thought_strs,
+            [
+                ("1", "first"),
+                ("3", "third"),
+                ("4", "fourth"),
+                ("5", "fifth"),
+                ("6", "sixth thought"),
+            ],
+        )
+
+    def test_batch_failed_command(self):
+        self._createFourThoughts()
+        shutil.copytree(self.files_path, self.dir.name, dirs_exist_ok=True)
+        self.tbd.createNew(Name.fromStr("2a"), force_override=True)
+        self._addThought(name="2a", title="<+title+>", tags=[], links=[])
+        # 5 exists on disk only, so moving 2 to 5 fails after the database has been moved.
+        self.tbd.createNew(Name.fromStr("5"))
+
+        batch_file = os.path.join(self.dir.name, "commands.txt")
+        with open(batch_file, "w") as f:
+            f.write(f"write 6 sixth --database {self.db_file.name}\n")
+            f.write(f"rename --from 2 --to 5 --subtree -d {self.db_file.name} -b {self.dir.name}\n")
+            f.write(f"write 7 seventh --database {self.db_file.name}\n")
+
+        with self.assertLogs(level='INFO') as logs:
+            parse(['batch', batch_file])
+        self.assertEqual(logs.output, [
+                             'ERROR:root:Failed to move 2 to 5, file already exists.',
+                         ])
+        self.assertEqual(
+            [str(t.name) for t in self.tb.listThoughts()], ["1", "2", "2a", "3", "4", "6", "7"]
+        )
+        self.assertEqual(
+            [str(n) for n in self.tbd.listNames()], ["1", "2", "2a", "3", "4", "5"]
+        )
+
+
+class StartupTests(unittest.TestCase):
+    def test_lazy_imports(self):
+        with tempfile.TemporaryDirectory() as box_dir:
+            modules = imported_modules(["create", "--box", box_dir])
+        self.assertIn("pythoughts.cli", [m.replace(PACKAGE, "pythoughts") for m in modules])
+        self.assertNotIn("sqlite3", modules)
+        self.assertNotIn(PACKAGE + ".ThoughtBox", modules)
+        self.assertNotIn(PACKAGE + ".Thought", modules)
+
+    def test_command_names(self):
+        # The client finds the command without importing the cli.
+        self.assertEqual(COMMAND_NAMES, [_name(cmd) for cmd in COMMANDS] + ["help"])
@@ -0,0 +1,26 @@
+import unittest
+
+from .. import clusters
+
+
+class ClustersTests(unittest.TestCase):
+    def test_components(self):
+        edges = [(0, 1), (2, 1), (3, 4), (5, 5)]
+        self.assertEqual(clusters.components(6, edges), [0, 0, 0, 3, 3, 5])
+        self.assertEqual(clusters.components(0, []), [])
+
+    def test_components_long_chain(self):
+        count = 10000
+        edges = [(i + 1, i) for i in range(count - 1)]
+        self.assertEqual(set(clusters.components(count, edges)), {0})
+
+    def test_label_propagation(self):
+        """
+        Two triangles joined by one edge, and a lone node.
+        0 - 1 - 2 - 0   3 - 4 - 5 - 3   2 - 3   6
+        """
+        edges = [(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3), (2, 3)]
+        self.assertEqual(
+            clusters.label_propagation(7, edges), [0, 0, 0, 3, 3, 3, 6]
+        )
+        self.assertEqual(clusters.components(7, edges), [0, 0, 0, 0, 0, 0, 6])
@@ -0,0 +1,51 @@
+import unittest
+
+from .. import minhash
+from ..Thought import Thought
+from ..Name import Name
+from ..Tag import Tag
+from ..Link import Link
+
+
+def _thought(name: str, tags=[], links=[], content=[]) -> Thought:
+    return Thought(
+        name=Name.fromStr(name),
+        title=name,
+        tags=[Tag.fromStr(t) for t in tags],
+        links=[Link.fromStr(name, l) for l in links],
+        content=content,
+        sources=[],
+    )
+
+
+class MinHashTests(unittest.TestCase):
+    def test_features(self):
+        thought = _thought("1", tags=["cat"], links=["2"], content=["The cat sat", "down."])
+        self.assertEqual(
+            minhash.features(thought),
+            {"tag:cat", "link:2", "words:1 the cat", "words:the cat sat", "words:cat sat down"},
+        )
+        self.assertEqual(minhash.features(_thought("1")), {"words:1"})
+
+    def test_signature(self):
+        a = minhash.signature({"x", "y", "z"})
+        self.assertEqual(len(a), minhash.NUM_HASHES)
+        self.assertEqual(a, minhash.signature({"z", "y", "x"}))
+        self.assertEqual(minhash.from_bytes(minhash.to_bytes(a)), a)
+        self.assertIsNone(minhash.signature(set()))
+
+    def test_similarity(self):
+        features = {str(i) for i in range(100)}
+        a = minhash.signature(features)
+        self.assertEqual(minhash.similarity(a, a), 1.0)
+        half = minhash.signature({str(i) for i in range(50, 150)})
+        self.assertAlmostEqual(minhash.similarity(a, half), 1 / 3, delta=0.2)
+        other = minhash.signature({str(i) for i in range(100, 200)})
+        self.assertLess(minhash.similarity(a, other), 0.1)
+
+    def test_buckets(self):
+        a = minhash.signature({"x", "y", "z"})
+        b = minhash.signature({"p", "q"})
+        self.assertEqual(len(minhash.buckets(a)), minhash.BANDS)
+        self.assertEqual(minhash.buckets(a), minhash.buckets(minhash.signature({"x", "y", "z"})))
+        self.assertEqual(set(minhash.buckets(a)) & set(minhash.buckets(b)), set())
@@ -0,0 +1,27 @@
+import unittest
+
+from .. import query
+
+
+class QueryTests(unittest.TestCase):
+    def test_to_sql(self):
+        tag = (
+            "thoughts.number IN (SELECT tag_links.thought FROM tag_links, tags"
+            " WHERE tag_links.tag=tags.number AND tags.title=?)"
+        )
+        link = "thoughts.number IN (SELECT links.source FROM links WHERE links.target=?)"
+        self.assertEqual(query.to_sql("#cat"), (tag, ["cat"]))
+        self.assertEqual(query.to_sql(" ->4a "), (link, ["4a"]))
+        self.assertEqual(
+            query.to_sql("#a & !#b | ->4"),
+            (f"(({tag} AND NOT {tag}) OR {link})", ["a", "b", "4"]),
+        )
+        self.assertEqual(
+            query.to_sql("#a&(#b|#c)"), (f"({tag} AND ({tag} OR {tag}))", ["a", "b", "c"])
+        )
+        self.assertEqual(query.to_sql("#\"it's here\""), (tag, ["it's here"]))
+
+    def test_to_sql_invalid(self):
+        for expression in ["", "#", "cat", "#a &", "#a #b", "(#a", "#a)", "!", "#'a"]:
+            with self.assertRaises(ValueError, msg=expression):
+                query.to_sql(expression)
@@ -0,0 +1,108 @@
+import unittest
+import tempfile
+
+from typing import List
+
+from .. import rank
+from ..Graph import Graph
+from ..ThoughtBox import ThoughtBox
+from ..Thought import Thought
+from ..Name import Name
+from ..Link import Link
+
+
+class RankTests(unittest.TestCase):
+    def setUp(self):
+        """
+        links:
+        1 -> 2 -> 4 -> 1
+          -> 3 <>
+        5 -> 9 (which does not exist)
+        """
+        self.graph = Graph(
+            ["1", "2", "3", "4", "5"],
+            [("1", "2"), ("1", "3"), ("2", "4"), ("3", "4"), ("4", "1"), ("4", "3"), ("5", "9")],
+        )
+
+    def test_in_degree(self):
+        self.assertEqual(rank.in_degree(self.graph), [1, 1, 2, 2, 0])
+
+    def test_pagerank(self):
+        ranks = rank.pagerank(self.graph)
+        self.assertAlmostEqual(sum(ranks), 1.0)
+        order = sorted(range(5), key=lambda i: -ranks[i])
+        self.assertEqual([self.graph.name(i) for i in order], ["4", "3", "1", "2", "5"])
+        self.assertAlmostEqual(ranks[4], 0.15 / 5 + 0.85 * ranks[4] / 5)
+
+    def test_pagerank_warm_start(self):
+        ranks = rank.pagerank(self.graph)
+        for a, b in zip(rank.pagerank(self.graph, max_iterations=1, initial=ranks), ranks):
+            self.assertAlmostEqual(a, b)
+        for a, b in zip(rank.pagerank(self.graph, initial=[1, None, 1, 1, 1]), ranks):
+            self.assertAlmostEqual(a, b)
+
+    def test_hits(self):
+        hubs, authorities = rank.hits(self.graph)
+        self.assertAlmostEqual(sum(hubs), 1.0)
+        self.assertAlmostEqual(sum(authorities), 1.0)
+        self.assertEqual(max(range(5), key=lambda i: hubs[i]), 0)
+        self.assertEqual(max(range(5), key=lambda i: authorities[i]), 2)
+        self.assertEqual(hubs[4], 0.0)
+
+    def test_empty(self):
+        graph = Graph([], [])
+        self.assertEqual(rank.pagerank(graph), [])
+        self.assertEqual(rank.hits(graph), ([], []))
+
+    def test_scores_unknown(self):
+        with self.assertRaises(ValueError):
+            rank.scores(self.graph, "bogus")
+
+
+class ThoughtBox_RankTests(unittest.TestCase):
+    def _addThought(self, name: str, links: List[str]) -> Thought:
+        t = Thought(
+            name=Name.fromStr(name),
+            title=name,
+            tags=[],
+            links=[Link.fromStr(name, l) for l in links],
+            content=[],
+            sources=[],
+        )
+        self.tb.addOrUpdate(t)
+        return t
+
+    def setUp(self):
+        self.db_file = tempfile.NamedTemporaryFile()
+        self.tb = ThoughtBox(self.db_file.name, explicitly_create_tables=True)
+        self._addThought("1", ["2", "3"])
+        self._addThought("2", ["4"])
+        self._addThought("3", ["4"])
+        self._addThought("4", ["1", "3"])
+        self._addThought("5", ["9"])
+
+    def tearDown(self):
+        self.db_file.close()
+
+    def test_rank(self):
+        self.assertEqual(
+            self.tb.rank("in_degree", limit=3), [("3", 2), ("4", 2), ("1", 1)]
+        )
+        self.assertEqual([n for n, _ in self.tb.rank()], ["4", "3", "1", "2", "5"])
+        with self.assertRaises(ValueError):
+            self.tb.rank("bogus")
+
+    def test_rank_cached(self):
+        ranked = self.tb.rank(cached=True)
+        self.assertEqual([n for n, _ in ranked], ["4", "3", "1", "2", "5"])
+        for (_, a), (_, b) in zip(ranked, self.tb.rank()):
+            self.assertAlmostEqual(a, b)
+        self.assertEqual(self.tb._meta("ranks_version"), self.tb._meta("version"))
+
+        self._addThought("5", ["2"])
+        self.assertNotEqual(self.tb._meta("ranks_version"), self.tb._meta("version"))
+        self.assertEqual(self.tb.rank("in_degree", limit=1, cached=True), [("2", 2)])
+        self.tb.delete(Name.fromStr("2"))
+        self.assertEqual(
+            [n for n, _ in self.tb.rank("in_degree", cached=True)], ["3", "1", "4", "5"]
+        )
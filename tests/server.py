@@ -0,0 +1,195 @@
+import unittest
+import tempfile
+import subprocess
+import sys
+import time
+import os
+import io
+import socket
+import stat
+
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+
+from typing import List
+
+from .. import server as server_module
+from ..cli import parse
+from ..client import server_socket_path
+from ..server import Server, make_private_dir
+from ..Name import Name
+from ..Tag import Tag
+from ..Link import Link
+from ..ThoughtBox import ThoughtBox
+from ..Thought import Thought
+
+
+class ServerTests(unittest.TestCase):
+    def _addThought(
+        self, name: str, title: str, tags: List[str], links: List[str]
+    ) -> Thought:
+
+        t = Thought(
+            name=Name.fromStr(name),
+            title=title,
+            tags=[Tag.fromStr(t) for t in tags],
+            links=[Link.fromStr(name, l) for l in links],
+            content=[],
+            sources=[],
+        )
+        self.tb.addOrUpdate(t)
+        return t
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.dir.name, "test.sock")
+        self.old_socket = os.environ.get("PYTHOUGHTS_SOCKET")
+        os.environ["PYTHOUGHTS_SOCKET"] = self.socket_path
+
+        self.db_file = tempfile.NamedTemporaryFile()
+        self.tb = ThoughtBox(self.db_file.name, explicitly_create_tables=True)
+        self._addThought(name="1", title="first", tags=["cat"], links=["2"])
+        self._addThought(name="2", title="second", tags=["dog"], links=[])
+
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.server = subprocess.Popen(
+            [sys.executable, "-m", os.path.basename(package_dir), "serve"],
+            cwd=os.path.dirname(package_dir),
+        )
+        for i in range(200):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        self.server.terminate()
+        self.server.wait()
+        if self.old_socket is None:
+            del os.environ["PYTHOUGHTS_SOCKET"]
+        else:
+            os.environ["PYTHOUGHTS_SOCKET"] = self.old_socket
+        self.db_file.close()
+        self.dir.cleanup()
+
+    def test_forward(self):
+        args = ['read','--by=name','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                         'INFO:root:1: first',
+                         'INFO:root:2: second',
+                         ])
+
+    def test_forward_write(self):
+        args = ['write','3','third','--tag','cat','--database',self.db_file.name]
+        with self.assertNoLogs(level='INFO') as logs:
+            parse(args)
+
+        thoughts = self.tb.listThoughts(tags=[Tag.fromStr("cat")])
+        thought_strs = [(str(t.name), t.title) for t in thoughts]
+        self.assertEqual(thought_strs, [("1", "first"), ("3", "third")])
+
+        args = ['read','--by=name','--tags','cat','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(logs.output, [
+                         'INFO:root:1: first',
+                         'INFO:root:3: third',
+                         ])
+
+    def test_forward_stdout(self):
+        args = ['read','--by=name','--format','tsv','--database',self.db_file.name]
+        with redirect_stdout(io.StringIO()) as out:
+            parse(args)
+        self.assertEqual(out.getvalue(), "1\tfirst\n2\tsecond\n")
+
+    def test_forward_exit(self):
+        with self.assertRaises(SystemExit) as check, redirect_stderr(io.StringIO()) as err:
+            parse(['read', '--by=nothing', '--database', self.db_file.name])
+        self.assertIn("invalid choice: 'nothing'", err.getvalue())
+        self.assertEqual(check.exception.code, 2)
+
+    def test_not_running(self):
+        os.environ["PYTHOUGHTS_SOCKET"] = os.path.join(self.dir.name, "other.sock")
+        args = ['read','--by=name','--database',self.db_file.name]
+        with self.assertLogs(level='INFO') as logs:
+            parse(args)
+        self.assertEqual(len(logs.output), 2)
+
+    def test_already_listening(self):
+        with self.assertRaises(FileExistsError):
+            Server(self.socket_path, lambda args: None)
+
+    def test_socket_private(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o600)
+
+    def test_other_user(self):
+        # The client refuses a server run by another user.
+        with mock.patch.object(server_module.os, "getuid", return_value=os.getuid() + 1):
+            with self.assertRaises(PermissionError):
+                parse(["read", "--by=name", "--database", self.db_file.name])
+
+        # The server refuses clients run by another user.
+        a, b = socket.socketpair(socket.AF_UNIX)
+        with a, b:
+            self.assertTrue(Server.verify_request(None, a, None))
+            with mock.patch.object(server_module.os, "getuid", return_value=os.getuid() + 1):
+                with self.assertLogs(level="WARNING"):
+                    self.assertFalse(Server.verify_request(None, a, None))
+
+    def test_make_private_dir(self):
+        directory = os.path.join(self.dir.name, "private")
+        make_private_dir(directory)
+        self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode), 0o700)
+        make_private_dir(directory)
+        os.chmod(directory, 0o755)
+        with self.assertRaises(PermissionError):
+            make_private_dir(directory)
+
+    def test_server_socket_path(self):
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": "/run/user/7"}):
+            del os.environ["PYTHOUGHTS_SOCKET"]
+            self.assertEqual(server_socket_path(), "/run/user/7/pythoughts.sock")
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": "", "TMPDIR": "/tmp"}):
+            del os.environ["PYTHOUGHTS_SOCKET"]
+            self.assertEqual(
+                server_socket_path(), f"/tmp/pythoughts-{os.getuid()}/pythoughts.sock"
+            )
+
+    def test_forward_profile(self):
+        args = ["read", "--by=name", "--database", self.db_file.name]
+        with mock.patch.dict(os.environ, {"PYTHOUGHTS_PROFILE": "summary"}):
+            with self.assertLogs(level="INFO"), redirect_stderr(io.StringIO()) as err:
+                parse(args)
+        self.assertIn("phase", err.getvalue())
+        self.assertIn("sql", err.getvalue())
+
+        output = os.path.join(self.dir.name, "forwarded.prof")
+        with mock.patch.dict(os.environ, {"PYTHOUGHTS_PROFILE": f"cprofile:{output}"}):
+            with self.assertLogs(level="INFO"), redirect_stderr(io.StringIO()):
+                parse(args)
+        self.assertTrue(os.path.exists(output))
+
+    def test_forward_slow_sql(self):
+        args = ["read", "--by=name", "--database", self.db_file.name]
+        with mock.patch.dict(os.environ, {"PYTHOUGHTS_SLOW_SQL": "0"}):
+            with self.assertLogs(level="INFO") as logs:
+                parse(args)
+        self.assertTrue(any(line.startswith("WARNING:root:Slow query") for line in logs.output))
+
+    def test_forward_imports(self):
+        # The client that forwards a command imports neither the cli nor the server.
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        package = os.path.basename(package_dir)
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", package]
+            + ["read", "--by=name", "--format", "tsv", "--database", self.db_file.name],
+            cwd=os.path.dirname(package_dir),
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.stdout, "1\tfirst\n2\tsecond\n")
+        modules = [line.split("|")[-1].strip() for line in result.stderr.splitlines()]
+        self.assertIn(package + ".client", modules)
+        for module in [package + ".cli", package + ".server", "argparse", "logging"]:
+            self.assertNotIn(module, modules)
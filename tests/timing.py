@@ -0,0 +1,62 @@
+import unittest
+import time
+
+from .. import timing
+
+
+class TimingTests(unittest.TestCase):
+    def setUp(self):
+        timing.enable()
+
+    def tearDown(self):
+        timing.disable()
+
+    def test_disabled(self):
+        timing.disable()
+        with timing.phase("sql"):
+            pass
+        self.assertFalse(timing.enabled())
+        self.assertEqual(timing.totals(), {})
+
+    def test_phase(self):
+        with timing.phase("sql"):
+            time.sleep(0.01)
+        with timing.phase("sql"):
+            pass
+        totals = timing.totals()
+        self.assertEqual(totals["sql"][1], 2)
+        self.assertGreaterEqual(totals["sql"][0], 0.01)
+
+    def test_nested_phase(self):
+        with timing.phase("file io"):
+            with timing.phase("parse"):
+                time.sleep(0.02)
+        totals = timing.totals()
+        self.assertGreaterEqual(totals["parse"][0], 0.02)
+        self.assertLess(totals["file io"][0], 0.02)
+        self.assertEqual(totals["file io"][1], 1)
+
+    def test_timed(self):
+        @timing.timed("sql")
+        def function(x):
+            return x + 1
+
+        @timing.timed("sql")
+        def generator(n):
+            for i in range(n):
+                yield i
+
+        self.assertEqual(function(1), 2)
+        self.assertEqual(list(generator(3)), [0, 1, 2])
+        self.assertEqual(timing.totals()["sql"][1], 5)
+
+        timing.disable()
+        self.assertEqual(list(generator(2)), [0, 1])
+
+    def test_summary(self):
+        with timing.phase("sql"):
+            pass
+        lines = timing.summary(1.0).splitlines()
+        self.assertEqual(lines[0].split(), ["phase", "seconds", "calls"])
+        self.assertEqual(lines[1].split()[0], "sql")
+        self.assertEqual(lines[-1].split(), ["total", "1.0000"])
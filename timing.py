@@ -0,0 +1,160 @@
+"""Measures the time spent in each phase of a command (for pythoughts --profile).
+
+Timing is off unless enable() has been called, in which case phase() and timed()
+record the wall clock time spent in each named phase. Nested phases are not double
+counted: time spent in an inner phase is only added to the inner phase.
+Only the thread that enabled timing is recorded.
+"""
+import time
+
+from _thread import get_ident
+from typing import Dict, List
+
+# The seconds spent in, and number of entries to, each phase. None when disabled.
+_totals: Dict[str, List[float]] = None
+# The phases currently entered, innermost last, with the time each was last resumed.
+_stack: List[List] = []
+# The time taken to import the command line tools, see record_import.
+_import_seconds = None
+# The thread that is being timed.
+_thread = None
+
+
+class _NoPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+class _Phase:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        now = time.perf_counter()
+        if len(_stack) > 0:
+            _add(_stack[-1][0], now - _stack[-1][1], 0)
+        _stack.append([self.name, now])
+        return self
+
+    def __exit__(self, *exc):
+        now = time.perf_counter()
+        name, resumed = _stack.pop()
+        _add(name, now - resumed, 1)
+        if len(_stack) > 0:
+            _stack[-1][1] = now
+        return False
+
+
+def _add(name: str, seconds: float, calls: int):
+    if _totals is None:
+        return
+    if name not in _totals:
+        _totals[name] = [0.0, 0]
+    _totals[name][0] += seconds
+    _totals[name][1] += calls
+
+
+def enable():
+    """Starts recording, clearing anything previously recorded."""
+    global _totals, _thread
+    _totals = {}
+    _thread = get_ident()
+    del _stack[:]
+    if _import_seconds is not None:
+        _add("import", _import_seconds, 1)
+
+
+def disable():
+    global _totals
+    _totals = None
+    del _stack[:]
+
+
+def enabled() -> bool:
+    return _totals is not None
+
+
+def record_import(seconds: float):
+    """Records how long importing the command line tools took, before timing could be enabled.
+    None forgets it, in processes such as the server where it is not part of the commands run.
+    """
+    global _import_seconds
+    _import_seconds = seconds
+    if seconds is not None:
+        _add("import", seconds, 1)
+
+
+def add(name: str, seconds: float):
+    """Adds time measured elsewhere to a phase."""
+    _add(name, seconds, 1)
+
+
+def phase(name: str):
+    """Returns a context manager that records the time spent inside it against the named phase."""
+    if _totals is None or get_ident() != _thread:
+        return _NO_PHASE
+    return _Phase(name)
+
+
+def timed(name: str):
+    """Decorates a function so that its calls are recorded against the named phase.
+    For generator functions the time spent producing each item is recorded.
+    """
+
+    def decorate(func):
+        if func.__code__.co_flags & 0x20:  # CO_GENERATOR
+
+            def timed_generator(*args, **kwargs):
+                if _totals is None or get_ident() != _thread:
+                    yield from func(*args, **kwargs)
+                    return
+                items = func(*args, **kwargs)
+                while True:
+                    with _Phase(name):
+                        try:
+                            item = next(items)
+                        except StopIteration:
+                            return
+                    yield item
+
+            wrapper = timed_generator
+        else:
+
+            def timed_function(*args, **kwargs):
+                if _totals is None or get_ident() != _thread:
+                    return func(*args, **kwargs)
+                with _Phase(name):
+                    return func(*args, **kwargs)
+
+            wrapper = timed_function
+
+        wrapper.__name__ = func.__name__
+        wrapper.__qualname__ = func.__qualname__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    return decorate
+
+
+def totals() -> Dict[str, List[float]]:
+    """Returns the seconds and calls recorded for each phase."""
+    return {name: list(value) for name, value in (_totals or {}).items()}
+
+
+def summary(total_seconds: float) -> str:
+    """Formats the recorded phases as a table. Time not in any phase is shown as other."""
+    rows = totals()
+    other = total_seconds - sum([seconds for seconds, calls in rows.values()])
+    lines = [f"{'phase':<12} {'seconds':>10} {'calls':>8}"]
+    for name, (seconds, calls) in sorted(rows.items(), key=lambda r: -r[1][0]):
+        lines.append(f"{name:<12} {seconds:>10.4f} {calls:>8}")
+    lines.append(f"{'other':<12} {max(other, 0.0):>10.4f}")
+    lines.append(f"{'total':<12} {total_seconds:>10.4f}")
+    return "\n".join(lines) + "\n"